@@ -0,0 +1,47 @@
+"""
+Rutas y lectura de los archivos de configuración de la aplicación.
+
+No depende de Qt: lo usan tanto la interfaz como el modo por lotes (batch.py).
+"""
+import os
+import sys
+import json
+
+
+GRID_CONFIG_FILE = 'grid_config.json'
+STYLES_CONFIG_FILE = 'styles_config.json'
+GRID_PROFILES_FILE = 'grid_profiles.json'
+
+
+def get_app_path():
+    """Obtiene la ruta de la aplicación (funciona como script y como .exe)"""
+    if getattr(sys, 'frozen', False):
+        # Ejecutando como .exe (PyInstaller)
+        return os.path.dirname(sys.executable)
+    else:
+        # Ejecutando como script de Python
+        return os.path.dirname(os.path.abspath(__file__))
+
+
+def load_json_config(config_path):
+    """Lee un archivo de configuración JSON; devuelve {} si no existe o no es válido"""
+    if not config_path or not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f'Error al cargar {config_path}: {e}')
+        return {}
+
+
+def save_json_config(config_path, data):
+    """
+    Escribe un archivo de configuración JSON de forma atómica: primero en un
+    archivo temporal y después lo reemplaza, así un corte a medias nunca deja
+    el archivo vacío o truncado. Lanza la excepción si no se puede escribir.
+    """
+    temp_path = config_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, config_path)
@@ -0,0 +1,369 @@
+"""
+Modo por lotes (sin interfaz): detecta las referencias y genera los PDFs
+interactivos desde la línea de comandos.
+
+No importa PyQt5, así que arranca rápido y funciona sin pantalla (por ejemplo
+en un servidor de integración continua después de exportar los esquemas).
+Usa grid_config.json y styles_config.json de la carpeta de la aplicación, o
+los indicados con --grid-config / --styles-config, y las opciones explícitas
+tienen prioridad sobre ellos.
+
+Ejemplos:
+    python batch.py planos/*.pdf -o salida --summary resumen.json
+    python batch.py planos/ --pattern "Estilo 25-A.0" --workers 4
+    python batch.py planos/ --pattern "Estilo /1.0-A" --pattern "Estilo A1/25"
+    python batch.py esquema.pdf --custom-pattern "{PAG}.{FILA}-{COL}" --detect-only
+    python batch.py planos/ --auto-pattern --detect-only
+    python batch.py planos/ -o salida --retarget --grid-config cuadricula_nueva.json
+    python batch.py planos/ -o salida --link-layout compact
+    python batch.py salida/ --restyle --styles-config estilo_rojo.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from contextlib import redirect_stdout
+
+# PyMuPDF escribe sus avisos en stdout, que es del resumen JSON: se envían a
+# stderr (los procesos del pool heredan la variable de entorno)
+os.environ.setdefault('PYMUPDF_MESSAGE', 'fd:2')
+
+from app_config import (GRID_CONFIG_FILE, GRID_PROFILES_FILE, STYLES_CONFIG_FILE,
+                        get_app_path, load_json_config)
+from detection_cache import CACHE_FILE_NAME
+from detection_engine import count_pages, iter_page_references, resolve_worker_count
+from grid_model import GridModel, grid_settings_from_config
+from grid_profiles import GridProfiles
+from page_analysis import PageAnalysis
+from pdf_generation import (BACKEND_INCREMENTAL, GENERATION_BACKENDS, LINK_LAYOUT_INLINE, LINK_LAYOUTS,
+                            build_javascript_code, interactive_output_path, iter_generate_pdfs,
+                            iter_restyle_pdfs)
+from pattern_compiler import compile_reference_styles
+from reference_patterns import (REFERENCE_PATTERNS, CUSTOM_PATTERN_NAME, DEFAULT_PATTERN_NAME,
+                                resolve_pattern, resolve_patterns, uses_raw_regex)
+from reference_store import ReferenceStore
+from regex_guard import (DEFAULT_PAGE_BUDGET, GuardedReferencePattern, preflight_pattern,
+                         preflight_warning, stress_texts)
+from style_sampling import best_style, format_ranking, sample_page_texts, score_styles
+from text_regions import text_regions_from_config
+
+
+def collect_pdf_paths(inputs):
+    """Expande las carpetas de la lista en sus PDFs (ordenados) y quita duplicados"""
+    pdf_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith('.pdf'))
+            candidates = [os.path.join(path, name) for name in names]
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            candidate = os.path.abspath(candidate)
+            if candidate not in pdf_paths:
+                pdf_paths.append(candidate)
+    return pdf_paths
+
+
+def warn_slow_pattern(pdf_paths, custom_pattern, regions, budget, analysis=None):
+    """Prueba previa del regex personalizado (ver regex_guard); solo avisa por stderr"""
+    regex, groups_order = resolve_pattern(CUSTOM_PATTERN_NAME, custom_pattern)
+    samples = list(sample_page_texts(pdf_paths, regions, max_pdfs=4, pages_per_pdf=4, analysis=analysis))
+    texts = [text for _, _, _, text in samples] + stress_texts(regex)
+    warning = preflight_warning(preflight_pattern(regex, groups_order, texts, budget), samples, budget)
+    if warning:
+        print(f'Aviso: {warning}', file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='batch.py',
+        description='Detecta referencias y genera PDFs interactivos sin interfaz gráfica.'
+    )
+    parser.add_argument('inputs', nargs='+', metavar='PDF',
+                        help='PDFs o carpetas con PDFs')
+    parser.add_argument('-o', '--output-dir',
+                        help='Carpeta para los PDFs generados (por defecto, junto a cada PDF)')
+    parser.add_argument('--in-place', action='store_true',
+                        help='Sobrescribir los PDFs originales')
+    parser.add_argument('--detect-only', action='store_true',
+                        help='Solo detectar las referencias, sin generar PDFs')
+    parser.add_argument('--retarget', action='store_true',
+                        help='No generar: detectar de nuevo las referencias (las páginas sin cambios salen de '
+                             'la caché de detección) y actualizar con la cuadrícula actual los destinos de '
+                             'los enlaces de los PDFs interactivos ya generados en la ruta de salida')
+    parser.add_argument('--restyle', action='store_true',
+                        help='No detectar ni generar: aplicar el estilo de styles_config.json a los PDFs '
+                             'interactivos indicados sustituyendo solo su JavaScript de documento')
+    parser.add_argument('--pattern', choices=list(REFERENCE_PATTERNS.keys()), action='append',
+                        help='Patrón de referencia; se puede repetir para buscar varios estilos en una '
+                             'sola pasada (por defecto, los de styles_config.json)')
+    parser.add_argument('--auto-pattern', action='store_true',
+                        help='Elegir el estilo con más referencias válidas en una muestra de páginas')
+    parser.add_argument('--custom-pattern',
+                        help='Patrón personalizado, p. ej. "/{P}.{C}-{F}" (implica --pattern Personalizado)')
+    parser.add_argument('--pattern-budget', type=float,
+                        help=f'Tiempo límite (s) por página de un patrón personalizado escrito como regex '
+                             f'(por defecto, pattern_time_budget de styles_config.json o {DEFAULT_PAGE_BUDGET:g})')
+    parser.add_argument('--grid-config',
+                        help=f'Ruta de la configuración de cuadrícula (por defecto, {GRID_CONFIG_FILE} de la aplicación)')
+    parser.add_argument('--styles-config',
+                        help=f'Ruta de la configuración de estilos (por defecto, {STYLES_CONFIG_FILE} de la aplicación)')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='Procesos de detección y de generación (0 = uno por núcleo)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help=f'No usar la caché de detección ({CACHE_FILE_NAME})')
+    parser.add_argument('--no-grid-profiles', action='store_true',
+                        help=f'Usar solo la cuadrícula global, sin detectar la de cada plantilla '
+                             f'de página ({GRID_PROFILES_FILE})')
+    parser.add_argument('--backend', choices=GENERATION_BACKENDS, default=BACKEND_INCREMENTAL,
+                        help='Forma de escribir los enlaces: actualización incremental (PyMuPDF) '
+                             'o reescritura completa (PyPDF2)')
+    parser.add_argument('--link-layout', choices=LINK_LAYOUTS,
+                        help='Forma de guardar los destinos: en cada enlace (inline) o en una tabla '
+                             'de documento compartida (compact); por defecto, la de styles_config.json')
+    parser.add_argument('--summary', default='-',
+                        help='Archivo JSON con el resumen ("-" = salida estándar)')
+    return parser
+
+
+def run_restyle(args):
+    """
+    Aplica el estilo del resaltado a PDFs interactivos ya generados y
+    devuelve el resumen (diccionario serializable a JSON).
+    """
+    styles = load_json_config(args.styles_config or os.path.join(get_app_path(), STYLES_CONFIG_FILE))
+    workers = args.workers if args.workers is not None else styles.get('detection_workers', 0)
+    pdf_paths = collect_pdf_paths(args.inputs)
+
+    start_time = time.perf_counter()
+    results = {}
+    for result in iter_restyle_pdfs(pdf_paths, build_javascript_code(styles), workers=workers):
+        results[result['pdf']] = result
+        if result['error']:
+            print(f'Error al procesar {result["pdf"]}: {result["error"]}', file=sys.stderr)
+        elif result['skipped']:
+            print(f'{os.path.basename(result["pdf"])}: no es un PDF interactivo, se omite', file=sys.stderr)
+
+    summary = {
+        'restyle': True,
+        'workers': resolve_worker_count(workers),
+        'restyle_seconds': round(time.perf_counter() - start_time, 3),
+        'pdfs': [results[pdf_path] for pdf_path in pdf_paths]
+    }
+    summary['totals'] = {
+        'pdfs': len(pdf_paths),
+        'restyled': sum(1 for result in summary['pdfs'] if result['output']),
+        'skipped': sum(1 for result in summary['pdfs'] if result['skipped']),
+        'failed': sum(1 for result in summary['pdfs'] if result['error'])
+    }
+    return summary
+
+
+def run_batch(args):
+    """
+    Ejecuta la detección y la generación y devuelve el resumen (diccionario
+    serializable a JSON).
+    """
+    app_dir = get_app_path()
+    grid_config = load_json_config(args.grid_config or os.path.join(app_dir, GRID_CONFIG_FILE))
+    styles = load_json_config(args.styles_config or os.path.join(app_dir, STYLES_CONFIG_FILE))
+    grid = GridModel(grid_settings_from_config(grid_config))
+    regions = text_regions_from_config(styles)
+
+    # Patrones: opciones explícitas > styles_config.json > patrón por defecto
+    custom_pattern = args.custom_pattern if args.custom_pattern is not None else styles.get('custom_pattern', '')
+    if args.pattern:
+        pattern_names = args.pattern
+    elif args.custom_pattern:
+        pattern_names = [CUSTOM_PATTERN_NAME]
+    else:
+        pattern_names = [styles.get('pattern', DEFAULT_PATTERN_NAME)] + list(styles.get('combined_patterns', []))
+
+    pdf_paths = collect_pdf_paths(args.inputs)
+    # Lo extraído de cada página en una etapa lo reutilizan las siguientes
+    analysis = PageAnalysis()
+    pattern_scores = None
+    if args.auto_pattern:
+        # Muestreo rápido: el estilo detectado sustituye a los configurados
+        pattern_scores, sampled_pages = score_styles(pdf_paths, grid, regions=regions, analysis=analysis)
+        detected = best_style(pattern_scores)
+        print(f'Estilo detectado en {sampled_pages} páginas de muestra: {detected or "ninguno"} '
+              f'({format_ranking(pattern_scores)})', file=sys.stderr)
+        if detected:
+            pattern_names = [detected]
+
+    pattern_styles = resolve_patterns(pattern_names, custom_pattern)
+    if not pattern_styles:
+        raise ValueError('El patrón personalizado está vacío')
+    try:
+        # Varios estilos se buscan a la vez en una sola pasada por página
+        pattern, groups_order = compile_reference_styles(pattern_styles)
+    except re.error as e:
+        raise ValueError(f'Patrón no válido: {e}')
+
+    # Un regex escrito a mano se prueba antes y se ejecuta con tiempo límite por página
+    budget = args.pattern_budget or styles.get('pattern_time_budget', DEFAULT_PAGE_BUDGET)
+    if uses_raw_regex(pattern_names, custom_pattern):
+        warn_slow_pattern(pdf_paths, custom_pattern, regions, budget, analysis)
+        pattern = GuardedReferencePattern(pattern, budget)
+
+    workers = args.workers if args.workers is not None else styles.get('detection_workers', 0)
+    link_layout = args.link_layout or styles.get('link_layout', LINK_LAYOUT_INLINE)
+    cache_path = None if args.no_cache else os.path.join(app_dir, CACHE_FILE_NAME)
+    profiles_path = None
+    if not args.no_grid_profiles and styles.get('grid_profiles', True):
+        profiles_path = os.path.join(app_dir, GRID_PROFILES_FILE)
+
+    summary = {
+        'pattern_name': ' + '.join(name for name, _, _ in pattern_styles),
+        'pattern': pattern.pattern,
+        'groups_order': list(groups_order),
+        'pattern_scores': pattern_scores,
+        'workers': resolve_worker_count(workers),
+        'backend': args.backend,
+        'link_layout': link_layout,
+        'grid': 'exacta' if grid.exact else 'manual',
+        'grid_profiles': profiles_path is not None,
+        'text_regions': 'página' if regions.whole_page else regions.cache_suffix()[1:],
+        'pdfs': []
+    }
+
+    # Detección
+    start_time = time.perf_counter()
+    page_counts = count_pages(pdf_paths, analysis)
+    store = ReferenceStore(analysis)
+    store.text_regions = regions
+    timeouts = {pdf_path: [] for pdf_path in pdf_paths}
+    failures = {pdf_path: [] for pdf_path in pdf_paths}
+
+    # Páginas en las que el regex personalizado superó el tiempo límite (el motor ya las informa)
+    def on_timeout(pdf_path, page_num, message):
+        timeouts[pdf_path].append(page_num + 1)
+
+    # Bloques de páginas que no se pudieron analizar (el motor ya los informa)
+    def on_error(pdf_path, start, end, message):
+        failures[pdf_path].append((start, end, message))
+
+    for pdf_path, page_num, page_refs in iter_page_references(
+            page_counts, pattern, groups_order, workers=workers, cache_path=cache_path,
+            regions=regions, on_timeout=on_timeout, analysis=analysis, on_error=on_error):
+        store.add_page(pdf_path, page_num, page_refs)
+    summary['detection_seconds'] = round(time.perf_counter() - start_time, 3)
+
+    results = {}
+    for pdf_path in pdf_paths:
+        num_pages = page_counts[pdf_path]
+        error = None if num_pages is not None else 'No se pudo abrir el PDF'
+        if failures[pdf_path]:
+            # Sin todas sus páginas el PDF interactivo quedaría incompleto: no se genera
+            start, end, message = failures[pdf_path][0]
+            error = f'No se pudieron analizar las páginas {start + 1}-{end}: {message}'
+        results[pdf_path] = {
+            'pdf': pdf_path,
+            'pages': num_pages,
+            'references': len(store.rows_for_pdf(pdf_path)),
+            'pattern_timeouts': timeouts[pdf_path],
+            'failed_pages': [page_num + 1 for start, end, _ in failures[pdf_path] for page_num in range(start, end)],
+            'output': None,
+            'links': 0,
+            'error': error,
+            'seconds': None
+        }
+        print(f'{os.path.basename(pdf_path)}: {results[pdf_path]["references"]} referencias', file=sys.stderr)
+
+    # Generación
+    start_time = time.perf_counter()
+    if not args.detect_only:
+        javascript_code = build_javascript_code(styles)
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+
+        # Un trabajo por PDF con referencias, repartidos entre procesos
+        jobs = [
+            (pdf_path,
+             pdf_path if args.in_place else interactive_output_path(pdf_path, args.output_dir),
+             store.link_sources(pdf_path))
+            for pdf_path in store.detected_pdfs()
+            if results[pdf_path]['references'] and not results[pdf_path]['error']
+        ]
+        profiles = None
+        if profiles_path:
+            profiles = GridProfiles.load(profiles_path, grid, grid_config.get('template'))
+            if args.retarget and profiles.template is None:
+                print('Aviso: la cuadrícula no tiene tipo de hoja (clave "template"); las hojas con marco '
+                      'con marcas usarán la cuadrícula de su plantilla. Usa --no-grid-profiles para '
+                      'aplicar la cuadrícula indicada en todas las hojas.', file=sys.stderr)
+        page_sizes = {pdf_path: analysis.page_sizes(pdf_path) for pdf_path, _, _ in jobs}
+        for job_result in iter_generate_pdfs(jobs, javascript_code, grid, backend=args.backend,
+                                             workers=workers, profiles=profiles, page_sizes=page_sizes,
+                                             retarget=args.retarget, layout=link_layout):
+            pdf_path = job_result['pdf']
+            result = results[pdf_path]
+            result.update(job_result)
+            if result['error']:
+                print(f'Error al procesar {pdf_path}: {result["error"]}', file=sys.stderr)
+            else:
+                print(f'{os.path.basename(pdf_path)}: {result["links"]} enlaces -> {result["output"]}', file=sys.stderr)
+        if profiles is not None and profiles.new_profiles:
+            profiles.save(profiles_path)
+    summary['generation_seconds'] = round(time.perf_counter() - start_time, 3)
+    summary['page_analysis'] = analysis.summary()
+
+    summary['pdfs'] = [results[pdf_path] for pdf_path in pdf_paths]
+    summary['totals'] = {
+        'pdfs': len(pdf_paths),
+        'pages': sum(result['pages'] or 0 for result in summary['pdfs']),
+        'references': sum(result['references'] for result in summary['pdfs']),
+        'links': sum(result['links'] for result in summary['pdfs']),
+        'generated': sum(1 for result in summary['pdfs'] if result['output']),
+        'failed': sum(1 for result in summary['pdfs'] if result['error'])
+    }
+    return summary
+
+
+def main(argv=None):
+    """
+    Punto de entrada del modo por lotes.
+
+    Código de salida: 0 si todo fue bien, 1 si algún PDF falló, 2 si los
+    argumentos o el patrón no son válidos.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.in_place and args.output_dir:
+        parser.error('--in-place y --output-dir son incompatibles')
+    if args.retarget and args.detect_only:
+        parser.error('--retarget y --detect-only son incompatibles')
+    if args.restyle and (args.retarget or args.detect_only or args.in_place or args.output_dir):
+        parser.error('--restyle modifica los PDFs indicados y no admite --retarget, --detect-only, '
+                     '--in-place ni --output-dir')
+
+    run = run_restyle if args.restyle else run_batch
+    try:
+        if args.summary == '-':
+            # Los mensajes van a stderr para que stdout sea solo el JSON
+            with redirect_stdout(sys.stderr):
+                summary = run(args)
+        else:
+            summary = run(args)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+    summary_json = json.dumps(summary, indent=2, ensure_ascii=False)
+    if args.summary == '-':
+        print(summary_json)
+    else:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(summary_json)
+
+    return 1 if summary['totals']['failed'] else 0
+
+
+if __name__ == '__main__':
+    # Necesario para el pool de procesos en el ejecutable (PyInstaller)
+    multiprocessing.freeze_support()
+    sys.exit(main())
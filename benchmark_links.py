@@ -0,0 +1,133 @@
+"""
+Compara las dos formas de guardar los destinos de los enlaces (ver
+pdf_generation.LINK_LAYOUTS) con PDFs reales, sin interfaz gráfica.
+
+Para cada PDF detecta las referencias una vez y genera el PDF interactivo con
+cada forma en una carpeta temporal. Mide el tiempo de generación, el tamaño
+del archivo y el tiempo de abrirlo y cargar los enlaces de todas las páginas
+(lo que hace un visor al mostrarlas).
+
+Ejemplos:
+    python benchmark_links.py planos/*.pdf
+    python benchmark_links.py esquema.pdf --pattern "Estilo 25-A.0" --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import fitz  # PyMuPDF para leer PDFs
+
+from app_config import GRID_CONFIG_FILE, STYLES_CONFIG_FILE, get_app_path, load_json_config
+from detection_engine import count_pages, iter_page_references
+from grid_model import GridModel, grid_settings_from_config
+from pdf_generation import (BACKEND_INCREMENTAL, GENERATION_BACKENDS, LINK_LAYOUTS,
+                            build_javascript_code, generate_interactive_pdf)
+from reference_patterns import DEFAULT_PATTERN_NAME, REFERENCE_PATTERNS, resolve_pattern
+from reference_store import ReferenceStore
+
+
+def open_links(path):
+    """Abre el PDF y carga los enlaces de todas sus páginas; devuelve cuántos hay"""
+    doc = fitz.open(path)
+    try:
+        return sum(len(page.get_links()) for page in doc)
+    finally:
+        doc.close()
+
+
+def benchmark_layout(pdf_path, output_path, references, javascript_code, grid, backend, layout, repeat):
+    """
+    Genera el PDF interactivo con una forma de guardar los enlaces y lo mide.
+
+    Returns:
+        dict con los tiempos (mejor de repeat), el tamaño y los enlaces
+    """
+    generation_time = open_time = float('inf')
+    links = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generate_interactive_pdf(pdf_path, output_path, references, javascript_code, grid,
+                                 backend, layout=layout)
+        generation_time = min(generation_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        links = open_links(output_path)
+        open_time = min(open_time, time.perf_counter() - start)
+
+    return {
+        'generation_time': generation_time,
+        'open_time': open_time,
+        'size': os.path.getsize(output_path),
+        'links': links
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='benchmark_links.py',
+        description='Compara el tamaño y el tiempo de apertura de los PDFs interactivos '
+                    'con los enlaces completos y compactos.'
+    )
+    parser.add_argument('inputs', nargs='+', metavar='PDF', help='PDFs a generar')
+    parser.add_argument('--pattern', choices=list(REFERENCE_PATTERNS.keys()), default=DEFAULT_PATTERN_NAME,
+                        help='Estilo de referencia')
+    parser.add_argument('--custom-pattern', default='',
+                        help='Patrón personalizado (con --pattern "Personalizado")')
+    parser.add_argument('--grid-config',
+                        help=f'Configuración de la cuadrícula (por defecto, {GRID_CONFIG_FILE})')
+    parser.add_argument('--backend', choices=GENERATION_BACKENDS, default=BACKEND_INCREMENTAL,
+                        help='Forma de escribir los enlaces')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Repeticiones de cada medida (se toma la mejor)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    app_dir = get_app_path()
+    grid_config = load_json_config(args.grid_config or os.path.join(app_dir, GRID_CONFIG_FILE))
+    styles = load_json_config(os.path.join(app_dir, STYLES_CONFIG_FILE))
+    grid = GridModel(grid_settings_from_config(grid_config))
+    javascript_code = build_javascript_code(styles)
+    pattern, groups_order = resolve_pattern(args.pattern, args.custom_pattern)
+
+    store = ReferenceStore()
+    for pdf_path, page_num, page_refs in iter_page_references(count_pages(args.inputs), pattern,
+                                                               groups_order, workers=1):
+        store.add_page(pdf_path, page_num, page_refs)
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for pdf_path in args.inputs:
+            references = store.link_sources(pdf_path)
+            print(f'\n{os.path.basename(pdf_path)}: {len(references)} referencias')
+            if not references:
+                continue
+            results = {}
+            for layout in LINK_LAYOUTS:
+                output_path = os.path.join(temp_dir, f'{layout}.pdf')
+                try:
+                    results[layout] = result = benchmark_layout(
+                        pdf_path, output_path, references, javascript_code, grid,
+                        args.backend, layout, max(1, args.repeat)
+                    )
+                except Exception as e:
+                    failures += 1
+                    print(f'  {layout}: error: {e}')
+                    continue
+                print(f'  {layout}: {result["size"] / 1024:.1f} KB, generación {result["generation_time"]:.3f} s, '
+                      f'apertura {result["open_time"]:.3f} s ({result["links"]} enlaces)')
+            if len(results) == len(LINK_LAYOUTS):
+                inline, compact = (results[layout] for layout in LINK_LAYOUTS)
+                print(f'  Tamaño: x{compact["size"] / inline["size"]:.2f}, '
+                      f'apertura: x{compact["open_time"] / max(inline["open_time"], 1e-9):.2f}')
+                if inline['links'] != compact['links']:
+                    failures += 1
+                    print('  ¡Atención! Las dos formas no tienen los mismos enlaces')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Mide la ganancia del prefiltro de literales (ver pattern_compiler) con PDFs
+reales, sin interfaz gráfica.
+
+Para cada patrón predefinido (y el personalizado, si se indica) recorre las
+páginas de los PDFs dos veces: como antes (cajas de todos los caracteres y
+regex) y con el prefiltro (texto plano y regex, y cajas solo en las páginas
+con coincidencias). Comprueba que las dos pasadas encuentran lo mismo.
+
+Ejemplos:
+    python benchmark_patterns.py planos/*.pdf
+    python benchmark_patterns.py esquema.pdf --custom-pattern "/{P}.{C}-{F}" --repeat 3
+"""
+import sys
+import time
+import argparse
+
+import fitz  # PyMuPDF para leer PDFs
+
+from detection_engine import build_page_char_map, scan_page_references
+from pattern_compiler import compile_reference_pattern
+from reference_patterns import CUSTOM_PATTERN_NAME, REFERENCE_PATTERNS, resolve_pattern
+
+
+def baseline_scan(page, regex):
+    """Detección sin prefiltro: cajas de todos los caracteres y regex"""
+    text, _ = build_page_char_map(page)
+    return sum(1 for _ in regex.finditer(text))
+
+
+def benchmark_pattern(docs, pattern, groups_order, repeat):
+    """
+    Mide una pasada sin prefiltro y otra con él sobre todas las páginas.
+
+    Returns:
+        dict con los tiempos (mejor de repeat), coincidencias y páginas descartadas
+    """
+    compiled = compile_reference_pattern(pattern)
+    baseline_time = prefilter_time = float('inf')
+    baseline_matches = prefilter_matches = skipped = 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        baseline_matches = sum(baseline_scan(page, compiled.regex) for doc in docs for page in doc)
+        baseline_time = min(baseline_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        prefilter_matches = skipped = 0
+        for doc in docs:
+            for page in doc:
+                found = len(scan_page_references(page, compiled, groups_order))
+                prefilter_matches += found
+                skipped += not found
+        prefilter_time = min(prefilter_time, time.perf_counter() - start)
+
+    return {
+        'literals': compiled.literals,
+        'baseline_time': baseline_time,
+        'prefilter_time': prefilter_time,
+        'baseline_matches': baseline_matches,
+        'prefilter_matches': prefilter_matches,
+        'skipped_pages': skipped
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='benchmark_patterns.py',
+        description='Compara la detección con y sin el prefiltro de literales de los patrones.'
+    )
+    parser.add_argument('inputs', nargs='+', metavar='PDF', help='PDFs a analizar')
+    parser.add_argument('--custom-pattern',
+                        help='Patrón personalizado a medir además de los predefinidos, p. ej. "/{P}.{C}-{F}"')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Repeticiones de cada medida (se toma la mejor)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    docs = []
+    for path in args.inputs:
+        try:
+            docs.append(fitz.open(path))
+        except Exception as e:
+            print(f'Error al abrir {path}: {e}')
+            return 1
+    total_pages = sum(len(doc) for doc in docs)
+    print(f'{len(docs)} PDF(s), {total_pages} páginas')
+
+    patterns = [name for name in REFERENCE_PATTERNS if name != CUSTOM_PATTERN_NAME]
+    if args.custom_pattern:
+        patterns.append(CUSTOM_PATTERN_NAME)
+
+    mismatches = 0
+    for name in patterns:
+        pattern, groups_order = resolve_pattern(name, args.custom_pattern or '')
+        result = benchmark_pattern(docs, pattern, groups_order, max(1, args.repeat))
+        speedup = result['baseline_time'] / max(result['prefilter_time'], 1e-9)
+        literals = ', '.join(repr(literal) for literal in result['literals']) or '(ninguno)'
+        print(f'\n{name}')
+        print(f'  Literales: {literals}')
+        print(f'  Páginas descartadas: {result["skipped_pages"]}/{total_pages}')
+        print(f'  Sin prefiltro: {result["baseline_time"]:.3f} s ({result["baseline_matches"]} coincidencias)')
+        print(f'  Con prefiltro: {result["prefilter_time"]:.3f} s ({result["prefilter_matches"]} referencias)')
+        print(f'  Aceleración: x{speedup:.2f}')
+        if result['baseline_matches'] != result['prefilter_matches']:
+            mismatches += 1
+            print('  ¡Atención! Las dos pasadas no encuentran lo mismo')
+
+    for doc in docs:
+        doc.close()
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
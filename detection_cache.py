@@ -0,0 +1,103 @@
+"""
+Caché persistente de resultados de detección por página.
+
+Guarda en una base SQLite (junto a grid_config.json) las referencias
+encontradas en cada página, indexadas por el hash del contenido de la página,
+el patrón regex y el orden de los grupos. Así, al volver a detectar sobre
+PDFs que no han cambiado, solo se extrae el texto de las páginas nuevas o
+modificadas.
+
+Las filas de referencia del motor no contienen la ruta del PDF ni el número
+de página, así que sirven para cualquier página con el mismo contenido.
+"""
+import json
+import sqlite3
+import hashlib
+
+
+# Incrementar si cambia el formato de las referencias guardadas o la forma de
+# obtenerlas (3: prioridad de estilos en MultiReferencePattern)
+CACHE_VERSION = 3
+
+CACHE_FILE_NAME = 'detection_cache.sqlite'
+
+
+def page_content_hash(doc, page):
+    """
+    Calcula un hash del contenido de la página: flujos de contenido, XObjects
+    de formulario que usa, tamaño y rotación. Se leen los flujos tal como están
+    en el archivo (sin descomprimir), así que es mucho más barato que extraer
+    el texto.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f'{tuple(page.rect)}|{page.rotation}|'.encode())
+    for xref in page.get_contents():
+        digest.update(doc.xref_stream_raw(xref) or b'')
+    for xobject in page.get_xobjects():
+        xref = xobject[0]
+        try:
+            digest.update(doc.xref_stream_raw(xref) or b'')
+        except Exception:
+            digest.update(str(xref).encode())
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """Acceso a la base SQLite de la caché de detección"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != CACHE_VERSION:
+            # Formato antiguo: descartar lo guardado
+            self.conn.execute('DROP TABLE IF EXISTS page_refs')
+            self.conn.execute(f'PRAGMA user_version = {CACHE_VERSION}')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_refs (
+                content_hash TEXT NOT NULL,
+                pattern TEXT NOT NULL,
+                groups_order TEXT NOT NULL,
+                refs TEXT NOT NULL,
+                PRIMARY KEY (content_hash, pattern, groups_order)
+            )
+        ''')
+        self.conn.commit()
+
+    def lookup(self, content_hash, pattern, groups_order):
+        """Devuelve la lista de filas de referencia guardada o None"""
+        row = self.conn.execute(
+            'SELECT refs FROM page_refs WHERE content_hash = ? AND pattern = ? AND groups_order = ?',
+            (content_hash, pattern, '|'.join(groups_order))
+        ).fetchone()
+        if row is None:
+            return None
+        return [tuple(ref) for ref in json.loads(row[0])]
+
+    def store_many(self, entries, pattern, groups_order):
+        """Guarda [(content_hash, referencias)] en una sola transacción"""
+        if not entries:
+            return
+        groups_key = '|'.join(groups_order)
+        rows = [
+            (content_hash, pattern, groups_key, json.dumps(page_refs))
+            for content_hash, page_refs in entries
+        ]
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO page_refs VALUES (?, ?, ?, ?)', rows
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def open_cache(path):
+    """Abre la caché; si no es posible devuelve None y la detección sigue sin ella"""
+    if not path:
+        return None
+    try:
+        return DetectionCache(path)
+    except Exception as e:
+        print(f'Error al abrir la caché de detección: {e}')
+        return None
@@ -0,0 +1,540 @@
+"""
+Motor de detección de referencias sin dependencias de Qt.
+
+Contiene la lógica de búsqueda por página y un motor que reparte los PDFs
+en bloques de páginas entre varios procesos. Cada proceso abre su propio
+documento con PyMuPDF (los documentos de fitz no se pueden compartir entre
+procesos ni hilos) y los resultados se devuelven en orden determinista:
+primero por PDF (orden de la lista) y después por número de página.
+"""
+import os
+import sys
+import multiprocessing
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF para leer PDFs
+
+from detection_cache import open_cache, page_content_hash
+from page_analysis import page_geometry
+from pattern_compiler import compile_reference_pattern
+from regex_guard import GuardedReferencePattern, PatternTimeout, close_guards
+
+
+# Páginas por bloque cuando no se indica un tamaño explícito
+MAX_CHUNK_PAGES = 50
+# Separador entre los textos de las páginas en la búsqueda de un bloque
+# entero (ver pages_with_matches); ningún patrón útil lo atraviesa
+PAGE_SEPARATOR = '\n\x00\n'
+# Documentos abiertos que conserva cada proceso del pool
+MAX_POOL_DOCS = 2
+
+_pool_docs = OrderedDict()   # ruta -> documento (solo en los procesos del pool)
+
+
+def page_textpage(page, regions=None):
+    """
+    Página de texto de PyMuPDF (con el recorte del área de dibujo, si hay
+    zonas). Construirla es la parte cara de la extracción común a todos los
+    formatos: de ella salen tanto el texto plano como el rawdict.
+    """
+    clip = regions.reference_clip(page) if regions is not None else None
+    # Mismos flags que el modo "text" (sin imágenes); el recorte se aplica
+    # al extraer, así que los caracteres de fuera no llegan a construirse
+    return page.get_textpage(clip=clip, flags=fitz.TEXTFLAGS_TEXT)
+
+
+def build_page_char_map(page, regions=None, textpage=None):
+    """
+    Extrae el texto de la página una sola vez junto con la caja de cada carácter.
+
+    El texto resultante es idéntico al de page.get_text() (un salto de línea al
+    final de cada línea), y boxes[i] es la caja (x0, y0, x1, y1) del carácter
+    text[i], o None para los saltos de línea añadidos.
+
+    Con regions (ver text_regions.TextRegions) solo se extrae el área de
+    dibujo y se descartan los caracteres del cajetín. textpage permite
+    reutilizar la página de texto ya construida (ver page_textpage).
+
+    Returns:
+        (text, boxes)
+    """
+    excluded = regions.excluded_rect(page) if regions is not None else None
+    if excluded is not None:
+        ex0, ey0, ex1, ey1 = excluded
+
+    chars = []
+    boxes = []
+    if textpage is None:
+        textpage = page_textpage(page, regions)
+    raw = textpage.extractRAWDICT()
+    for block in raw['blocks']:
+        if block.get('type', 0) != 0:
+            continue
+        for line in block['lines']:
+            line_start = len(chars)
+            for span in line['spans']:
+                for char in span['chars']:
+                    bbox = char['bbox']
+                    if excluded is not None:
+                        # Descartar los caracteres cuyo centro cae en el cajetín
+                        x = (bbox[0] + bbox[2]) / 2
+                        y = (bbox[1] + bbox[3]) / 2
+                        if ex0 <= x <= ex1 and ey0 <= y <= ey1:
+                            continue
+                    chars.append(char['c'])
+                    boxes.append(bbox)
+            if len(chars) > line_start or excluded is None:
+                chars.append('\n')
+                boxes.append(None)
+    return ''.join(chars), boxes
+
+
+def match_rect(boxes, start, end):
+    """Devuelve la unión [x0, y0, x1, y1] de las cajas de los caracteres start..end"""
+    x0 = y0 = float('inf')
+    x1 = y1 = float('-inf')
+    for box in boxes[start:end]:
+        if box is None:
+            continue
+        x0 = min(x0, box[0])
+        y0 = min(y0, box[1])
+        x1 = max(x1, box[2])
+        y1 = max(y1, box[3])
+    if x0 == float('inf'):
+        return None
+    return [x0, y0, x1, y1]
+
+
+def scan_page_references(page, pattern, groups_order, regions=None, textpage=None,
+                          prefiltered=False):
+    """
+    Busca las referencias de una página.
+
+    Las coordenadas de cada coincidencia salen directamente de las cajas de
+    sus caracteres (match.start()..match.end()), sin volver a buscar el texto
+    en la página. El contexto no se copia: se devuelven sus desplazamientos
+    en el texto de la página (30 caracteres antes y después).
+
+    regions (ver text_regions.TextRegions) limita la búsqueda al área de
+    dibujo sin el cajetín.
+
+    Antes de construir las cajas de los caracteres (lo más caro) se mira el
+    texto plano: si no tiene los literales del patrón o el patrón no
+    encuentra nada, la página se descarta (ver pattern_compiler).
+    textpage reutiliza la página de texto ya construida, y prefiltered
+    indica que ya se sabe que el patrón encuentra algo en ella.
+
+    Returns:
+        Lista de tuplas (full, page, column, row, x0, y0, x1, y1, instance,
+        context_start, context_end), ver reference_store.ReferenceStore
+    """
+    page_references = []
+    pattern = compile_reference_pattern(pattern)
+    if textpage is None:
+        textpage = page_textpage(page, regions)
+
+    # El texto plano es idéntico al del mapa de caracteres, salvo si se
+    # descartan los caracteres del cajetín (entonces no se prefiltra)
+    if not prefiltered and plain_text_matches_char_map(regions):
+        if not pattern.has_match(textpage.extractText()):
+            return page_references
+
+    text, boxes = build_page_char_map(page, regions, textpage)
+
+    # Número de apariciones de cada referencia en la página (para "#2", "#3"...)
+    ref_instances = {}
+
+    # Página, columna y fila según el orden de los grupos (con varios
+    # estilos, el de cada uno; ver pattern_compiler.MultiReferencePattern)
+    for start, end, page_ref, column_ref, row_ref in pattern.iter_references(text, groups_order):
+        full_ref = text[start:end]
+
+        coordinates = match_rect(boxes, start, end)
+        if coordinates is None:
+            continue
+
+        # Desplazamientos del contexto (30 caracteres antes y después)
+        context_start = max(0, start - 30)
+        context_end = min(len(text), end + 30)
+
+        ref_instances[full_ref] = ref_instances.get(full_ref, 0) + 1
+
+        page_references.append((
+            full_ref, page_ref, column_ref, row_ref, *coordinates,
+            ref_instances[full_ref], context_start, context_end
+        ))
+
+    return page_references
+
+
+def plain_text_matches_char_map(regions):
+    """True si el texto plano de la página es el mismo que el de build_page_char_map"""
+    return regions is None or regions.excluded is None
+
+
+def pages_with_matches(pattern, texts, groups_order=()):
+    """
+    Índices de los textos en los que el patrón encuentra alguna coincidencia,
+    con una sola búsqueda sobre todos ellos unidos por PAGE_SEPARATOR.
+
+    Cada coincidencia se asigna a su página con una búsqueda binaria en los
+    desplazamientos de inicio de cada texto. Si una coincidencia atraviesa
+    el separador, las páginas que toca se comprueban por separado.
+    """
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + len(PAGE_SEPARATOR)
+
+    matched = set()
+    for match_start, match_end, *_ in pattern.iter_references(PAGE_SEPARATOR.join(texts), groups_order):
+        first = bisect_right(starts, match_start) - 1
+        last = bisect_right(starts, max(match_start, match_end - 1)) - 1
+        if first == last and match_end <= starts[first] + len(texts[first]):
+            matched.add(first)
+            continue
+        for index in range(first, last + 1):
+            if index not in matched and pattern.has_match(texts[index]):
+                matched.add(index)
+    return matched
+
+
+def count_pages(pdf_paths, analysis=None):
+    """
+    Devuelve {pdf_path: número de páginas}, con None si el PDF no se puede abrir.
+
+    Con analysis (ver page_analysis.PageAnalysis) los PDFs ya contados y sin
+    cambios no se vuelven a abrir.
+    """
+    page_counts = {}
+    for pdf_path in pdf_paths:
+        try:
+            if analysis is not None:
+                page_counts[pdf_path] = analysis.page_count(pdf_path)
+                continue
+            doc = fitz.open(pdf_path)
+            page_counts[pdf_path] = len(doc)
+            doc.close()
+        except Exception as e:
+            print(f"Error al abrir {pdf_path}: {e}")
+            page_counts[pdf_path] = None
+    return page_counts
+
+
+def init_pool_worker():
+    """
+    Prepara cada proceso del pool: sus mensajes (print) van a stderr, como
+    diagnósticos, y la salida estándar queda para el proceso principal (el
+    resumen JSON del modo por lotes)
+    """
+    sys.stdout = sys.stderr
+
+
+def resolve_worker_count(workers):
+    """Convierte el valor configurado (0 = automático) en un número de procesos"""
+    if not workers or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+def split_page_ranges(page_counts, workers, chunk_size=0):
+    """
+    Divide cada PDF en bloques (pdf_path, inicio, fin) de páginas consecutivas.
+
+    Si no se indica chunk_size se eligen bloques que den unas cuatro tareas
+    por proceso, para repartir bien la carga entre PDFs de distinto tamaño.
+    """
+    total_pages = sum(count for count in page_counts.values() if count)
+    if chunk_size < 1:
+        chunk_size = -(-total_pages // (workers * 4)) if total_pages else 1
+        chunk_size = max(1, min(chunk_size, MAX_CHUNK_PAGES))
+
+    chunks = []
+    for pdf_path, count in page_counts.items():
+        if not count:
+            continue
+        for start in range(0, count, chunk_size):
+            chunks.append((pdf_path, start, min(start + chunk_size, count)))
+    return chunks
+
+
+def pool_document(pdf_path):
+    """
+    Documento abierto de un proceso del pool. Los bloques seguidos de un
+    mismo PDF lo reutilizan: con miles de páginas pequeñas, reabrir el PDF
+    (y volver a cargar su árbol de páginas) en cada bloque costaba más que
+    la propia búsqueda.
+    """
+    doc = _pool_docs.pop(pdf_path, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        while len(_pool_docs) >= MAX_POOL_DOCS:
+            _pool_docs.popitem(last=False)[1].close()
+    _pool_docs[pdf_path] = doc
+    return doc
+
+
+def scan_pooled_chunk(pdf_path, start, end, pattern, groups_order, cache_path=None, regions=None):
+    """scan_pdf_chunk en un proceso del pool, con el documento de pool_document"""
+    return scan_pdf_chunk(pdf_path, start, end, pattern, groups_order, cache_path,
+                          regions=regions, doc=pool_document(pdf_path))
+
+
+def scan_pdf_chunk(pdf_path, start, end, pattern, groups_order, cache_path=None, cache=None,
+                   regions=None, doc=None, analysis=None):
+    """
+    Analiza las páginas [start, end) de un PDF. Se ejecuta en un proceso
+    del pool, así que abre su propio documento (salvo que se pase doc, que
+    entonces no se cierra).
+
+    Si hay caché (objeto abierto o ruta a la base SQLite), las páginas cuyo
+    contenido ya se analizó con el mismo patrón (y las mismas zonas de
+    extracción) se leen de ella sin extraer el texto.
+
+    El patrón se busca una sola vez en el texto plano de todas las páginas
+    nuevas del bloque (ver pages_with_matches) y las cajas de los caracteres
+    solo se construyen en las páginas con coincidencias. Con un regex
+    personalizado vigilado o si se descartan los caracteres del cajetín, la
+    búsqueda sigue siendo página a página.
+
+    Las páginas en las que un regex personalizado supera su tiempo límite
+    (ver regex_guard) quedan sin referencias, no se guardan en la caché y se
+    devuelven aparte.
+
+    Con analysis (ver page_analysis.PageAnalysis; solo en el propio hilo, no
+    en el pool) el texto de las páginas con referencias queda guardado para
+    mostrar sus contextos sin volver a extraerlo.
+
+    Returns:
+        (lista con las referencias de cada página del bloque (en orden),
+         [(hash de contenido, referencias)] de las páginas nuevas para la caché,
+         [(página, mensaje)] de las páginas que superaron el tiempo límite,
+         (ancho, alto, rotación) de cada página del bloque, o None si falló)
+    """
+    own_cache = cache is None and cache_path is not None
+    if own_cache:
+        cache = open_cache(cache_path)
+
+    compiled = compile_reference_pattern(pattern)
+    cache_pattern, cache_groups = compiled.cache_key(groups_order)
+    region_suffix = regions.cache_suffix() if regions is not None else ''
+    # El tiempo límite de los regex vigilados es por página
+    chunk_search = plain_text_matches_char_map(regions) and not isinstance(compiled, GuardedReferencePattern)
+    pdf_name = os.path.basename(pdf_path)
+    results = []
+    new_entries = []
+    timeouts = []
+    geometry = []
+    own_doc = doc is None
+    try:
+        if own_doc:
+            doc = fitz.open(pdf_path)
+
+        # Páginas que no están en la caché:
+        # (posición en results, página, página de PyMuPDF, hash, página de texto, texto plano)
+        pending = []
+        for page_num in range(start, end):
+            try:
+                page = doc[page_num]
+                geometry.append(page_geometry(page))
+                content_hash = None
+                if cache is not None:
+                    content_hash = page_content_hash(doc, page) + region_suffix
+                    cached_refs = cache.lookup(content_hash, cache_pattern, cache_groups)
+                    if cached_refs is not None:
+                        results.append(cached_refs)
+                        continue
+
+                textpage = page_textpage(page, regions)
+                text = textpage.extractText() if chunk_search else None
+                pending.append((len(results), page_num, page, content_hash, textpage, text))
+            except Exception as page_error:
+                # Si hay error en una página, continuar con las demás
+                print(f"Error procesando página {page_num + 1} de {pdf_name}: {page_error}")
+                if len(geometry) == len(results):
+                    geometry.append(None)
+            results.append([])
+
+        matched = None
+        if chunk_search and pending:
+            try:
+                matched = pages_with_matches(compiled, [item[-1] for item in pending], groups_order)
+            except Exception:
+                # Los errores del patrón se informan página a página
+                matched = None
+
+        for position, (index, page_num, page, content_hash, textpage, text) in enumerate(pending):
+            try:
+                if matched is not None and position not in matched:
+                    page_refs = []
+                else:
+                    page_refs = scan_page_references(page, compiled, groups_order, regions,
+                                                     textpage=textpage, prefiltered=matched is not None)
+                    if page_refs and text is not None and analysis is not None:
+                        # Mismo texto que el del mapa de caracteres (chunk_search)
+                        analysis.store_text(pdf_path, page_num, regions, text)
+                if content_hash is not None:
+                    new_entries.append((content_hash, page_refs))
+            except PatternTimeout as timeout:
+                print(f"Página {page_num + 1} de {pdf_name}: {timeout}")
+                timeouts.append((page_num, str(timeout)))
+                page_refs = []
+            except Exception as page_error:
+                print(f"Error procesando página {page_num + 1} de {pdf_name}: {page_error}")
+                page_refs = []
+            results[index] = page_refs
+    finally:
+        if own_doc and doc is not None:
+            doc.close()
+        if own_cache and cache is not None:
+            cache.close()
+    return results, new_entries, timeouts, geometry
+
+
+def store_in_cache(cache, new_entries, pattern, groups_order):
+    """Guarda las páginas nuevas en la caché sin interrumpir la detección si falla"""
+    if cache is None or not new_entries:
+        return
+    try:
+        cache.store_many(new_entries, pattern, groups_order)
+    except Exception as e:
+        print(f'Error al guardar en la caché de detección: {e}')
+
+
+def iter_page_references(page_counts, pattern, groups_order, workers=0,
+                         chunk_size=0, cancel_event=None, cache_path=None, regions=None,
+                         on_timeout=None, analysis=None, on_error=None):
+    """
+    Detecta las referencias de todos los PDFs y las devuelve página a página.
+
+    Genera tuplas (pdf_path, page_num, referencias) en orden determinista
+    (orden de page_counts y después por página), aunque los bloques terminen
+    en otro orden en el pool de procesos. Las páginas de un bloque que falla
+    (por ejemplo, si un proceso del pool termina de forma anómala) no se
+    devuelven: se informan con on_error.
+
+    Args:
+        page_counts: {pdf_path: número de páginas} (ver count_pages)
+        pattern: Patrón regex (texto) o compilado con pattern_compiler (varios
+            estilos a la vez con MultiReferencePattern)
+        groups_order: Orden de los grupos ('página', 'columna', 'fila')
+        workers: Número de procesos (0 = uno por núcleo)
+        chunk_size: Páginas por bloque (0 = automático)
+        cancel_event: threading.Event opcional para cancelar
+        cache_path: Ruta de la caché SQLite por página (None = sin caché)
+        regions: Zonas de extracción (ver text_regions.TextRegions; None = página entera)
+        on_timeout: Función opcional (pdf_path, page_num, mensaje) a la que se
+            llama, en este hilo, por cada página en la que un regex
+            personalizado superó su tiempo límite (ver regex_guard)
+        analysis: page_analysis.PageAnalysis opcional en el que se guardan el
+            tamaño y la rotación de cada página (y, sin pool, el texto de las
+            páginas con referencias) para las etapas siguientes
+        on_error: Función opcional (pdf_path, start, end, mensaje) a la que se
+            llama, en este hilo y en el mismo orden que las páginas, por cada
+            bloque de páginas [start, end) que no se pudo analizar
+    """
+    pattern = compile_reference_pattern(pattern)
+    cache_pattern, cache_groups = pattern.cache_key(groups_order)
+    workers = resolve_worker_count(workers)
+    chunks = split_page_ranges(page_counts, workers, chunk_size)
+    workers = min(workers, len(chunks))
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def report_timeouts(pdf_path, timeouts):
+        if on_timeout is not None:
+            for page_num, message in timeouts:
+                on_timeout(pdf_path, page_num, message)
+
+    def report_error(pdf_path, start, end, error):
+        print(f"Error procesando páginas {start + 1}-{end} de {os.path.basename(pdf_path)}: {error}")
+        if on_error is not None:
+            on_error(pdf_path, start, end, str(error) or type(error).__name__)
+
+    def record_geometry(pdf_path, start, geometry):
+        if analysis is not None:
+            analysis.record_geometry(pdf_path, start, geometry)
+
+    # Solo este hilo escribe en la caché; los procesos del pool solo leen
+    cache = open_cache(cache_path)
+    try:
+        if workers <= 1:
+            # Un solo proceso: analizar en el propio hilo sin crear el pool,
+            # con un solo documento abierto para todos los bloques de cada PDF
+            doc = doc_path = None
+            try:
+                for pdf_path, start, end in chunks:
+                    if cancelled():
+                        return
+                    try:
+                        if pdf_path != doc_path:
+                            if doc is not None:
+                                doc.close()
+                                doc = None
+                            doc, doc_path = fitz.open(pdf_path), pdf_path
+                        results, new_entries, timeouts, geometry = scan_pdf_chunk(
+                            pdf_path, start, end, pattern, groups_order, cache=cache, regions=regions,
+                            doc=doc, analysis=analysis
+                        )
+                    except Exception as e:
+                        report_error(pdf_path, start, end, e)
+                        continue
+                    store_in_cache(cache, new_entries, cache_pattern, cache_groups)
+                    record_geometry(pdf_path, start, geometry)
+                    report_timeouts(pdf_path, timeouts)
+                    for page_num, page_refs in enumerate(results, start):
+                        yield pdf_path, page_num, page_refs
+            finally:
+                if doc is not None:
+                    doc.close()
+            return
+
+        # 'spawn' evita heredar por fork el estado de Qt y de los hilos del proceso padre
+        context = multiprocessing.get_context('spawn')
+        worker_cache_path = cache_path if cache is not None else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_pool_worker) as executor:
+            futures = {
+                executor.submit(scan_pooled_chunk, pdf_path, start, end, pattern,
+                                groups_order, worker_cache_path, regions=regions): index
+                for index, (pdf_path, start, end) in enumerate(chunks)
+            }
+
+            # Los bloques terminados se guardan hasta que les toca salir en orden
+            finished = {}
+            next_index = 0
+            for future in as_completed(futures):
+                if cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    return
+
+                index = futures[future]
+                pdf_path, start, end = chunks[index]
+                try:
+                    results, new_entries, timeouts, geometry = future.result()
+                    store_in_cache(cache, new_entries, cache_pattern, cache_groups)
+                    record_geometry(pdf_path, start, geometry)
+                    finished[index] = (results, timeouts, None)
+                except Exception as e:
+                    # Con BrokenProcessPool fallan también todos los bloques pendientes
+                    finished[index] = ([], [], e)
+
+                while next_index in finished:
+                    pdf_path, start, end = chunks[next_index]
+                    results, timeouts, error = finished.pop(next_index)
+                    if error is not None:
+                        report_error(pdf_path, start, end, error)
+                    report_timeouts(pdf_path, timeouts)
+                    for page_num, page_refs in enumerate(results, start):
+                        yield pdf_path, page_num, page_refs
+                    next_index += 1
+    finally:
+        if cache is not None:
+            cache.close()
+        # El proceso vigilado de un regex personalizado (sin pool) no sigue vivo tras la detección
+        close_guards()
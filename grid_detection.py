@@ -0,0 +1,259 @@
+"""
+Detección de la cuadrícula a partir de la geometría vectorial de la página.
+
+Los esquemas eléctricos tienen un marco doble (exterior e interior) y, en la
+franja entre ambos, pequeñas marcas que separan las columnas (arriba o abajo)
+y las filas (a la derecha o a la izquierda). En lugar de buscar los números y
+letras del borde en zonas fijas, aquí se leen los trazos de la página con
+page.get_drawings(), se agrupan las coordenadas con NumPy y se obtienen los
+bordes exactos de cada columna y fila. El texto solo se usa para poner nombre
+a las celdas ('0', '1', ... / 'A', 'B', ...).
+
+El resultado tiene el mismo formato que grid_config.json.
+"""
+import numpy as np
+
+
+# Tolerancia (en puntos) para considerar un trazo horizontal/vertical y
+# para agrupar coordenadas cercanas
+LINE_TOLERANCE = 1.0
+# Un trazo del marco ocupa al menos esta fracción del ancho o alto de la página
+FRAME_MIN_FRACTION = 0.5
+# La franja entre el marco exterior y el interior no supera esta fracción
+STRIP_MAX_FRACTION = 0.1
+
+
+def extract_segments(page):
+    """
+    Devuelve los trazos rectos de la página como dos arrays:
+    verticales [x, y0, y1] y horizontales [y, x0, x1].
+    """
+    # get_cdrawings (si existe) devuelve lo mismo sin crear objetos Point/Rect
+    get_paths = getattr(page, 'get_cdrawings', None) or page.get_drawings
+    segments = []
+    for path in get_paths():
+        for item in path['items']:
+            kind = item[0]
+            if kind == 'l':
+                (x0, y0), (x1, y1) = item[1][:2], item[2][:2]
+                segments.append((x0, y0, x1, y1))
+            elif kind == 're':
+                x0, y0, x1, y1 = item[1][:4]
+                segments.extend((
+                    (x0, y0, x1, y0), (x0, y1, x1, y1),
+                    (x0, y0, x0, y1), (x1, y0, x1, y1)
+                ))
+
+    if not segments:
+        empty = np.empty((0, 3))
+        return empty, empty
+
+    seg = np.asarray(segments, dtype=float)
+    dx = np.abs(seg[:, 2] - seg[:, 0])
+    dy = np.abs(seg[:, 3] - seg[:, 1])
+
+    is_vertical = (dx <= LINE_TOLERANCE) & (dy > LINE_TOLERANCE)
+    is_horizontal = (dy <= LINE_TOLERANCE) & (dx > LINE_TOLERANCE)
+
+    v = seg[is_vertical]
+    vertical = np.column_stack((
+        (v[:, 0] + v[:, 2]) / 2, np.minimum(v[:, 1], v[:, 3]), np.maximum(v[:, 1], v[:, 3])
+    ))
+    h = seg[is_horizontal]
+    horizontal = np.column_stack((
+        (h[:, 1] + h[:, 3]) / 2, np.minimum(h[:, 0], h[:, 2]), np.maximum(h[:, 0], h[:, 2])
+    ))
+    return vertical, horizontal
+
+
+def cluster_positions(values, tolerance=LINE_TOLERANCE):
+    """Agrupa coordenadas que distan menos que la tolerancia y devuelve la media de cada grupo"""
+    values = np.sort(np.asarray(values, dtype=float))
+    if values.size == 0:
+        return values
+    breaks = np.flatnonzero(np.diff(values) > tolerance) + 1
+    return np.array([group.mean() for group in np.split(values, breaks)])
+
+
+def frame_pair(positions, extent, from_end):
+    """
+    Busca el marco doble en un lado: la línea exterior (la más cercana al
+    borde de la página) y la interior, si está dentro de la franja máxima.
+
+    Returns:
+        (exterior, interior) o None
+    """
+    if positions.size < 2:
+        return None
+    ordered = positions[::-1] if from_end else positions
+    outer, inner = ordered[0], ordered[1]
+    if abs(inner - outer) > extent * STRIP_MAX_FRACTION:
+        return None
+    return outer, inner
+
+
+def strip_ticks(segments, strip, span):
+    """
+    Posiciones de las marcas perpendiculares contenidas en una franja del marco.
+
+    Args:
+        segments: Trazos perpendiculares a la franja [posición, inicio, fin]
+        strip: (límite 1, límite 2) de la franja en el eje de los trazos
+        span: (mínimo, máximo) admitido para la posición de las marcas
+    """
+    low, high = sorted(strip)
+    inside = (
+        (segments[:, 1] >= low - LINE_TOLERANCE) &
+        (segments[:, 2] <= high + LINE_TOLERANCE) &
+        (segments[:, 0] > span[0] + LINE_TOLERANCE) &
+        (segments[:, 0] < span[1] - LINE_TOLERANCE)
+    )
+    return cluster_positions(segments[inside, 0])
+
+
+def label_cells(page, edges, clip, axis):
+    """
+    Nombra las celdas con el texto de la franja: cada palabra se asigna a la
+    celda que contiene su centro.
+
+    Args:
+        edges: Bordes de las celdas (ordenados)
+        clip: Rectángulo (x0, y0, x1, y1) de la franja con las etiquetas
+        axis: 0 para columnas (x), 1 para filas (y)
+    """
+    labels = [''] * (len(edges) - 1)
+    if clip is None:
+        return labels
+    for word in page.get_text('words', clip=clip):
+        text = word[4].strip()
+        if not text:
+            continue
+        center = (word[axis] + word[axis + 2]) / 2
+        cell = int(np.searchsorted(edges, center)) - 1
+        if 0 <= cell < len(labels) and not labels[cell]:
+            labels[cell] = text
+    return labels
+
+
+def trim_unlabeled(edges, labels):
+    """Quita las celdas sin nombre de los extremos (restos entre el marco y la primera marca)"""
+    if not any(labels):
+        return edges, labels
+    first = next(i for i, label in enumerate(labels) if label)
+    last = max(i for i, label in enumerate(labels) if label)
+    return edges[first:last + 2], labels[first:last + 1]
+
+
+def frame_lines(vertical, horizontal, width, height):
+    """Posiciones (x, y) de las líneas largas del marco, agrupadas y ordenadas"""
+    frame_xs = cluster_positions(vertical[vertical[:, 2] - vertical[:, 1] >= height * FRAME_MIN_FRACTION, 0])
+    frame_ys = cluster_positions(horizontal[horizontal[:, 2] - horizontal[:, 1] >= width * FRAME_MIN_FRACTION, 0])
+    return frame_xs, frame_ys
+
+
+def frame_strips(frame_xs, frame_ys, width, height):
+    """
+    Franjas del marco doble y área interior.
+
+    Returns:
+        ((superior, inferior, izquierda, derecha), (izquierda, derecha,
+        arriba, abajo) del área interior); cada franja es (exterior,
+        interior) o None
+    """
+    top, bottom = frame_pair(frame_ys, height, False), frame_pair(frame_ys, height, True)
+    left, right = frame_pair(frame_xs, width, False), frame_pair(frame_xs, width, True)
+    inner_left = left[1] if left else frame_xs[0]
+    inner_right = right[1] if right else frame_xs[-1]
+    inner_top = top[1] if top else frame_ys[0]
+    inner_bottom = bottom[1] if bottom else frame_ys[-1]
+    return (top, bottom, left, right), (inner_left, inner_right, inner_top, inner_bottom)
+
+
+def frame_ticks(vertical, horizontal, frame_xs, frame_ys, width, height):
+    """
+    Marcas de las cuatro franjas del marco (superior, inferior, izquierda y
+    derecha), vacías si falta la franja. Las usa la huella de la plantilla
+    (ver grid_profiles.page_fingerprint).
+    """
+    if frame_xs.size < 2 or frame_ys.size < 2:
+        return [np.empty(0)] * 4
+    (top, bottom, left, right), (inner_left, inner_right, inner_top, inner_bottom) = frame_strips(
+        frame_xs, frame_ys, width, height
+    )
+    ticks = [strip_ticks(vertical, strip, (inner_left, inner_right)) if strip else np.empty(0)
+             for strip in (top, bottom)]
+    ticks += [strip_ticks(horizontal, strip, (inner_top, inner_bottom)) if strip else np.empty(0)
+              for strip in (left, right)]
+    return ticks
+
+
+def detect_grid_from_drawings(page, segments=None):
+    """
+    Detecta la cuadrícula de la página a partir de las marcas del marco.
+
+    Args:
+        page: Página de PyMuPDF
+        segments: Resultado de extract_segments(page), si ya se calculó
+
+    Returns:
+        Diccionario con el formato de grid_config.json ('column_lines',
+        'row_lines', 'column_labels', 'row_labels', 'page_width',
+        'page_height'), o None si no se encuentra un marco con marcas
+    """
+    width, height = page.rect.width, page.rect.height
+    vertical, horizontal = segments if segments is not None else extract_segments(page)
+    if vertical.size == 0 or horizontal.size == 0:
+        return None
+
+    # Líneas largas del marco
+    frame_xs, frame_ys = frame_lines(vertical, horizontal, width, height)
+    if frame_ys.size < 2 or frame_xs.size < 2:
+        return None
+
+    # Área interior del marco (si no hay marco doble, la del marco simple)
+    (top, bottom, left, right), (inner_left, inner_right, inner_top, inner_bottom) = frame_strips(
+        frame_xs, frame_ys, width, height
+    )
+
+    # Columnas: marcas verticales en la franja superior (o inferior)
+    column_edges = np.empty(0)
+    column_clip = None
+    for strip in (top, bottom):
+        if strip is None:
+            continue
+        ticks = strip_ticks(vertical, strip, (inner_left, inner_right))
+        if ticks.size:
+            column_edges = np.concatenate(([inner_left], ticks, [inner_right]))
+            column_clip = (inner_left, min(strip), inner_right, max(strip))
+            break
+
+    # Filas: marcas horizontales en la franja derecha (o izquierda)
+    row_edges = np.empty(0)
+    row_clip = None
+    for strip in (right, left):
+        if strip is None:
+            continue
+        ticks = strip_ticks(horizontal, strip, (inner_top, inner_bottom))
+        if ticks.size:
+            row_edges = np.concatenate(([inner_top], ticks, [inner_bottom]))
+            row_clip = (min(strip), inner_top, max(strip), inner_bottom)
+            break
+
+    if column_edges.size < 2 or row_edges.size < 2:
+        return None
+
+    column_lines, column_labels = trim_unlabeled(
+        column_edges.tolist(), label_cells(page, column_edges, column_clip, 0)
+    )
+    row_lines, row_labels = trim_unlabeled(
+        row_edges.tolist(), label_cells(page, row_edges, row_clip, 1)
+    )
+
+    return {
+        'column_lines': column_lines,
+        'row_lines': row_lines,
+        'column_labels': column_labels,
+        'row_labels': row_labels,
+        'page_width': width,
+        'page_height': height
+    }
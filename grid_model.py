@@ -0,0 +1,268 @@
+"""
+Modelo inmutable de la cuadrícula de destino de los enlaces.
+
+Se construye una vez por generación a partir de la configuración de la
+cuadrícula (posiciones exactas del cajetín o márgenes y tamaños manuales).
+Los bordes de columnas y filas se guardan como sumas acumuladas, así que el
+rectángulo de un cuadrante es una consulta directa, y los resultados se
+memorizan por (tamaño de página, columna, fila): un lote con 100.000
+referencias solo calcula cada cuadrante distinto una vez.
+
+cell_rects calcula los cuadrantes de muchas referencias a la vez con NumPy
+(ver pdf_generation.compute_target_coordinates), para volver a calcular los
+destinos de todos los enlaces al retocar la cuadrícula.
+"""
+from functools import lru_cache
+from itertools import accumulate
+
+import numpy as np
+
+
+# Valores por defecto de la cuadrícula manual (márgenes en %, tamaños como texto "1,2,1")
+DEFAULT_GRID = {
+    'column_positions': [],
+    'row_positions': [],
+    'column_labels': [],
+    'row_labels': [],
+    'cols': 10,
+    'rows': 8,
+    'margin_left': 5,
+    'margin_top': 5,
+    'col_sizes': '',
+    'row_sizes': ''
+}
+
+
+def grid_settings_from_config(config_data):
+    """
+    Configuración de la cuadrícula a partir de grid_config.json.
+    Solo se usan las posiciones exactas si hay al menos dos líneas de cada tipo.
+    """
+    grid = dict(DEFAULT_GRID)
+    column_positions = config_data.get('column_lines', [])
+    row_positions = config_data.get('row_lines', [])
+    if len(column_positions) > 1 and len(row_positions) > 1:
+        grid['column_positions'] = column_positions
+        grid['row_positions'] = row_positions
+        grid['column_labels'] = config_data.get('column_labels', [])
+        grid['row_labels'] = config_data.get('row_labels', [])
+    return grid
+
+
+def parse_sizes(sizes_text, count):
+    """Parsea los tamaños desde el texto y devuelve una lista de proporciones"""
+    if not sizes_text.strip():
+        # Si está vacío, todos iguales
+        return [1.0] * count
+
+    try:
+        sizes = [float(s.strip()) for s in sizes_text.split(',') if s.strip()]
+
+        # Si hay menos valores que elementos, rellenar con 1
+        while len(sizes) < count:
+            sizes.append(1.0)
+
+        # Si hay más valores, truncar
+        sizes = sizes[:count]
+
+        return sizes
+    except ValueError:
+        # Si hay error, todos iguales
+        return [1.0] * count
+
+
+@lru_cache(maxsize=4096)
+def column_index(column):
+    """Índice de columna: número tal cual, o letra (A=0, B=1...)"""
+    try:
+        return int(column)
+    except ValueError:
+        if column and column.isalpha():
+            return ord(column.upper()) - ord('A')
+        return 0
+
+
+@lru_cache(maxsize=4096)
+def row_index(row):
+    """Índice de fila (A=0, B=1, C=2, ..., AA=27...) o número tal cual"""
+    index = 0
+    if row:
+        if row.isalpha():
+            if len(row) == 1:
+                index = ord(row.upper()) - ord('A')
+            else:
+                for i, char in enumerate(row.upper()):
+                    index += (ord(char) - ord('A') + 1) * (26 ** (len(row) - i - 1))
+        elif row.isdigit():
+            index = int(row)
+    return index
+
+
+class GridModel:
+    """
+    Cuadrícula de destino precalculada.
+
+    Con posiciones exactas los bordes son los del cajetín; si no, se guardan
+    como fracciones acumuladas del área útil (entre márgenes) y se convierten
+    a puntos una vez por tamaño de página.
+    """
+
+    def __init__(self, grid=None):
+        grid = dict(DEFAULT_GRID, **(grid or {}))
+        column_positions = list(grid['column_positions'])
+        row_positions = list(grid['row_positions'])
+
+        # MÉTODO 1: posiciones EXACTAS del cajetín
+        self.exact = len(column_positions) > 1 and len(row_positions) > 1
+        if self.exact:
+            self.column_edges = tuple(column_positions)
+            self.row_edges = tuple(row_positions)
+        else:
+            # MÉTODO 2: márgenes y tamaños relativos (fracciones acumuladas)
+            cols = grid['cols']
+            rows = grid['rows']
+            col_sizes = parse_sizes(grid['col_sizes'], cols)
+            row_sizes = parse_sizes(grid['row_sizes'], rows)
+            total_cols = sum(col_sizes)
+            total_rows = sum(row_sizes)
+            self.column_edges = tuple(edge / total_cols for edge in accumulate([0.0] + col_sizes))
+            self.row_edges = tuple(edge / total_rows for edge in accumulate([0.0] + row_sizes))
+        # Nombre de cada celda -> índice (solo si hay un nombre por celda detectada)
+        self.column_lookup = self.label_lookup(grid['column_labels'], self.columns) if self.exact else {}
+        self.row_lookup = self.label_lookup(grid['row_labels'], self.rows) if self.exact else {}
+        self.margin_left_pct = grid['margin_left'] / 100.0
+        self.margin_top_pct = grid['margin_top'] / 100.0
+
+        self._page_edges = {}   # (ancho, alto) -> (bordes x, bordes y) en puntos
+        self._cells = {}        # (ancho, alto, columna, fila) -> rectángulo
+
+    @staticmethod
+    def label_lookup(labels, count):
+        """{nombre en mayúsculas: índice} si hay exactamente un nombre por celda"""
+        if len(labels) != count:
+            return {}
+        return {label.upper(): index for index, label in enumerate(labels) if label}
+
+    @property
+    def columns(self):
+        return len(self.column_edges) - 1
+
+    @property
+    def rows(self):
+        return len(self.row_edges) - 1
+
+    def page_edges(self, width, height):
+        """Bordes de columnas y filas en puntos para un tamaño de página"""
+        key = (width, height)
+        edges = self._page_edges.get(key)
+        if edges is None:
+            if self.exact:
+                edges = (self.column_edges, self.row_edges)
+            else:
+                margin_left = width * self.margin_left_pct
+                margin_top = height * self.margin_top_pct
+                usable_width = width - 2 * margin_left
+                usable_height = height - 2 * margin_top
+                edges = (
+                    tuple(margin_left + usable_width * edge for edge in self.column_edges),
+                    tuple(margin_top + usable_height * edge for edge in self.row_edges)
+                )
+            self._page_edges[key] = edges
+        return edges
+
+    def column_number(self, column):
+        """Índice de una columna, sin limitarlo al tamaño de la cuadrícula"""
+        # Si la cuadrícula tiene nombres ('1', '2'...) se usan primero
+        col_num = self.column_lookup.get(column.upper())
+        return column_index(column) if col_num is None else col_num
+
+    def row_number(self, row):
+        """Índice de una fila, sin limitarlo al tamaño de la cuadrícula"""
+        # Si la cuadrícula tiene nombres ('A', 'B'...) se usan primero
+        row_num = self.row_lookup.get(row.upper())
+        return row_index(row) if row_num is None else row_num
+
+    def cell_indices(self, column, row):
+        """Índices (columna, fila) de un cuadrante, sin limitarlos al tamaño de la cuadrícula"""
+        return self.column_number(column), self.row_number(row)
+
+    def contains_cell(self, column, row):
+        """True si (columna, fila) es un cuadrante que existe en la cuadrícula"""
+        try:
+            col_num, row_num = self.cell_indices(column, row)
+        except (TypeError, ValueError):
+            return False
+        return 0 <= col_num < self.columns and 0 <= row_num < self.rows
+
+    def cell_rect(self, width, height, column, row):
+        """
+        Rectángulo [x0, y0, x1, y1] del cuadrante (columna, fila) en una página
+        de ese tamaño (coordenadas de PyMuPDF, origen arriba a la izquierda).
+        """
+        key = (width, height, column, row)
+        rect = self._cells.get(key)
+        if rect is None:
+            xs, ys = self.page_edges(width, height)
+            col_num, row_num = self.cell_indices(column, row)
+            # Asegurar que los índices estén dentro del rango
+            col_num = max(0, min(col_num, len(xs) - 2))
+            row_num = max(0, min(row_num, len(ys) - 2))
+            # Asegurar que las coordenadas estén dentro de la página (siempre
+            # como float, igual que cell_rects)
+            rect = (
+                float(max(0, min(xs[col_num], width))),
+                float(max(0, min(ys[row_num], height))),
+                float(max(0, min(xs[col_num + 1], width))),
+                float(max(0, min(ys[row_num + 1], height)))
+            )
+            self._cells[key] = rect
+        return list(rect)
+
+    def cell_rects(self, widths, heights, columns, rows):
+        """
+        Rectángulos de muchos cuadrantes a la vez, con los mismos valores que
+        cell_rect.
+
+        Args:
+            widths, heights: Arrays con el tamaño de la página de cada cuadrante
+            columns, rows: Nombres de la columna y la fila de cada cuadrante
+
+        Returns:
+            Array (n, 4) con [x0, y0, x1, y1] de cada cuadrante (coordenadas
+            de PyMuPDF)
+        """
+        widths = np.asarray(widths, dtype=float)
+        heights = np.asarray(heights, dtype=float)
+
+        # Cada nombre distinto se convierte a índice una sola vez
+        column_names, column_inverse = np.unique(np.asarray(columns, dtype=str), return_inverse=True)
+        row_names, row_inverse = np.unique(np.asarray(rows, dtype=str), return_inverse=True)
+        col_nums = np.array([self.column_number(str(name)) for name in column_names], dtype=np.intp)
+        row_nums = np.array([self.row_number(str(name)) for name in row_names], dtype=np.intp)
+        # Asegurar que los índices estén dentro del rango
+        col_nums = np.clip(col_nums[column_inverse.ravel()], 0, self.columns - 1)
+        row_nums = np.clip(row_nums[row_inverse.ravel()], 0, self.rows - 1)
+
+        column_edges = np.asarray(self.column_edges, dtype=float)
+        row_edges = np.asarray(self.row_edges, dtype=float)
+        if self.exact:
+            x0, x1 = column_edges[col_nums], column_edges[col_nums + 1]
+            y0, y1 = row_edges[row_nums], row_edges[row_nums + 1]
+        else:
+            # Mismas operaciones que page_edges, para obtener los mismos valores
+            margin_left = widths * self.margin_left_pct
+            margin_top = heights * self.margin_top_pct
+            usable_width = widths - 2 * margin_left
+            usable_height = heights - 2 * margin_top
+            x0 = margin_left + usable_width * column_edges[col_nums]
+            x1 = margin_left + usable_width * column_edges[col_nums + 1]
+            y0 = margin_top + usable_height * row_edges[row_nums]
+            y1 = margin_top + usable_height * row_edges[row_nums + 1]
+
+        # Asegurar que las coordenadas estén dentro de la página
+        return np.column_stack([
+            np.maximum(0, np.minimum(x0, widths)),
+            np.maximum(0, np.minimum(y0, heights)),
+            np.maximum(0, np.minimum(x1, widths)),
+            np.maximum(0, np.minimum(y1, heights))
+        ])
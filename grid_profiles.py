@@ -0,0 +1,174 @@
+"""
+Perfiles de cuadrícula por plantilla de página.
+
+Un mismo juego de planos puede mezclar portadas, hojas A3 y A1 con marcos
+distintos, y una única cuadrícula global no sirve para todas. Cada página se
+identifica con una huella barata (tamaño de página, líneas del marco y
+marcas de sus franjas) y la cuadrícula se detecta una sola vez por huella
+(ver grid_detection). Los perfiles se guardan en grid_profiles.json, así que
+una plantilla ya vista no se vuelve a analizar en siguientes generaciones.
+
+La cuadrícula global (grid_config.json o la configuración manual) tiene
+prioridad sobre los perfiles:
+- las páginas de la plantilla sobre la que se dibujó o detectó (clave
+  'template' de grid_config.json) usan siempre la cuadrícula global;
+- los perfiles guardados se descartan si la cuadrícula global ha cambiado
+  desde que se detectaron (ver grid_signature).
+Las páginas sin marco con marcas también usan la cuadrícula global.
+"""
+import json
+import hashlib
+
+from app_config import save_json_config
+from grid_detection import detect_grid_from_drawings, extract_segments, frame_lines, frame_ticks
+from grid_model import GridModel, grid_settings_from_config
+
+
+# Versión del formato: si cambia la detección o la huella, los perfiles antiguos se ignoran
+PROFILES_VERSION = 2
+
+
+def page_fingerprint(page, segments=None):
+    """
+    Huella de la plantilla de una página: tamaño redondeado y resumen de las
+    líneas del marco y de las marcas de sus franjas (redondeadas al punto),
+    de modo que dos plantillas con el mismo marco pero distinta separación
+    de marcas tienen huellas distintas.
+
+    Args:
+        page: Página de PyMuPDF
+        segments: Resultado de extract_segments(page), si ya se calculó
+    """
+    width, height = page.rect.width, page.rect.height
+    vertical, horizontal = segments if segments is not None else extract_segments(page)
+    frame_xs, frame_ys = frame_lines(vertical, horizontal, width, height)
+    parts = [frame_xs, frame_ys] + frame_ticks(vertical, horizontal, frame_xs, frame_ys, width, height)
+    frame = '|'.join(','.join(str(int(round(value))) for value in part.tolist()) for part in parts)
+    digest = hashlib.sha1(frame.encode('ascii')).hexdigest()[:16]
+    return f'{int(round(width))}x{int(round(height))}:{digest}'
+
+
+def grid_signature(grid):
+    """
+    Resumen de la cuadrícula global (grid_model.GridModel) con el que se
+    guardan los perfiles: si cambia, los perfiles guardados se descartan.
+    """
+    if grid is None:
+        return None
+    if grid.exact:
+        parts = (grid.column_edges, grid.row_edges,
+                 sorted(grid.column_lookup.items()), sorted(grid.row_lookup.items()))
+    else:
+        parts = (grid.column_edges, grid.row_edges, grid.margin_left_pct, grid.margin_top_pct)
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class GridProfiles:
+    """
+    Cuadrículas detectadas por huella de plantilla.
+
+    profiles: {huella: configuración con el formato de grid_config.json, o
+    None si la plantilla no tiene marco con marcas}. Se puede enviar a los
+    procesos del pool; lo que detecte cada proceso queda en new_profiles y se
+    incorpora al original con merge().
+
+    signature: grid_signature de la cuadrícula global con la que se usan.
+    template: huella de la plantilla de la cuadrícula global; sus páginas no
+    usan perfil.
+    """
+
+    def __init__(self, profiles=None, signature=None, template=None):
+        self.profiles = dict(profiles or {})
+        self.signature = signature
+        self.template = template
+        self.new_profiles = {}
+        self._models = {}   # huella -> GridModel
+
+    def __len__(self):
+        return len(self.profiles)
+
+    @classmethod
+    def load(cls, path, grid=None, template=None):
+        """
+        Lee los perfiles guardados (vacíos si el archivo no existe o no es
+        válido, o si se guardaron con otra cuadrícula global).
+
+        Args:
+            grid: Cuadrícula global (grid_model.GridModel) con la que se van a usar
+            template: Huella de la plantilla de la cuadrícula global (clave
+                'template' de grid_config.json), o None
+        """
+        signature = grid_signature(grid)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == PROFILES_VERSION:
+                if signature is not None and data.get('signature') != signature:
+                    # La cuadrícula global ha cambiado: las plantillas se detectan de nuevo
+                    print('La cuadrícula ha cambiado: se descartan los perfiles de cuadrícula guardados')
+                    return cls(signature=signature, template=template)
+                return cls(data.get('profiles', {}), signature, template)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f'Error al cargar perfiles de cuadrícula: {e}')
+        return cls(signature=signature, template=template)
+
+    @staticmethod
+    def saved_count(path):
+        """Número de plantillas guardadas en el archivo (0 si no existe o no es válido)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get('version') != PROFILES_VERSION:
+            return 0
+        return len(data.get('profiles', {}))
+
+    def save(self, path):
+        """Guarda los perfiles (escritura atómica)"""
+        try:
+            save_json_config(path, {'version': PROFILES_VERSION, 'signature': self.signature,
+                                    'profiles': self.profiles})
+        except Exception as e:
+            print(f'Error al guardar perfiles de cuadrícula: {e}')
+
+    def merge(self, new_profiles):
+        """Incorpora los perfiles detectados en otro proceso"""
+        for fingerprint, grid_data in (new_profiles or {}).items():
+            if fingerprint not in self.profiles:
+                self.profiles[fingerprint] = grid_data
+                self.new_profiles[fingerprint] = grid_data
+
+    def grid_for_page(self, page):
+        """
+        Cuadrícula de la plantilla de la página, detectándola si es la primera
+        vez que se ve. Devuelve None si la página debe usar la cuadrícula
+        global: es de su plantilla o no tiene marco con marcas.
+        """
+        segments = extract_segments(page)
+        fingerprint = page_fingerprint(page, segments)
+        if fingerprint == self.template:
+            return None
+        if fingerprint not in self.profiles:
+            grid_data = detect_grid_from_drawings(page, segments)
+            self.profiles[fingerprint] = grid_data
+            self.new_profiles[fingerprint] = grid_data
+
+        grid_data = self.profiles[fingerprint]
+        if grid_data is None:
+            return None
+        model = self._models.get(fingerprint)
+        if model is None:
+            model = self._models[fingerprint] = GridModel(grid_settings_from_config(grid_data))
+        return model
+
+    def page_grids(self, doc, page_numbers):
+        """{página: GridModel} de las páginas indicadas que tienen perfil"""
+        grids = {}
+        for page_num in page_numbers:
+            model = self.grid_for_page(doc[page_num])
+            if model is not None:
+                grids[page_num] = model
+        return grids
@@ -2,31 +2,93 @@ import sys
 import re
 import os
 import json
+import multiprocessing
+import queue
 import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, 
-                             QTableWidget, QTableWidgetItem, QTextEdit, QSplitter,
+                             QTableView, QTextEdit, QSplitter,
                              QHeaderView, QMessageBox, QProgressDialog, QComboBox,
                              QLineEdit, QGroupBox, QFormLayout, QSpinBox, QDialog,
-                             QGraphicsView, QGraphicsScene, QGraphicsLineItem,
+                             QGraphicsView, QGraphicsScene,
                              QGraphicsRectItem, QSlider, QScrollArea, QFrame,
                              QRadioButton, QButtonGroup, QTabWidget, QListWidget,
                              QListWidgetItem, QAbstractItemView, QCheckBox, QMenu)
-from PyQt5.QtCore import Qt, QRectF, QPointF, QLineF
+from PyQt5.QtCore import (Qt, QRectF, QPointF, QLineF, QObject, QThread, QTimer, pyqtSignal,
+                          QAbstractTableModel, QAbstractProxyModel, QModelIndex)
 from PyQt5.QtGui import QFont, QPixmap, QImage, QPen, QColor, QBrush, QPainter, QIcon
 import fitz  # PyMuPDF para leer PDFs
-from PyPDF2 import PdfReader, PdfWriter
-from PyPDF2.generic import DictionaryObject, NameObject, ArrayObject, NumberObject, createStringObject
 
+from app_config import GRID_PROFILES_FILE, get_app_path, save_json_config
+from detection_cache import CACHE_FILE_NAME
+from detection_engine import count_pages, iter_page_references
+from grid_detection import detect_grid_from_drawings, extract_segments
+from grid_model import GridModel
+from grid_profiles import GridProfiles, page_fingerprint
+from page_render_cache import (PageRenderCache, image_from_samples, neighbour_buckets,
+                               render_page_image, render_pdf_page, zoom_bucket)
+from page_analysis import PageAnalysis, file_signature
+from pdf_generation import (LINK_LAYOUT_COMPACT, LINK_LAYOUT_INLINE, build_javascript_code,
+                            interactive_output_path, iter_generate_pdfs, iter_restyle_pdfs)
+from reference_patterns import (REFERENCE_PATTERNS, convert_simple_pattern_to_regex, detection_pattern,
+                                resolve_pattern, uses_raw_regex)
+from reference_store import ReferenceStore
+from regex_guard import DEFAULT_PAGE_BUDGET, preflight_pattern, preflight_warning, stress_texts
+from style_sampling import best_style, format_ranking, sample_page_texts, score_styles
+from text_regions import DEFAULT_TEXT_REGIONS, TextRegions
 
-def get_app_path():
-    """Obtiene la ruta de la aplicación (funciona como script y como .exe)"""
-    if getattr(sys, 'frozen', False):
-        # Ejecutando como .exe (PyInstaller)
-        return os.path.dirname(sys.executable)
-    else:
-        # Ejecutando como script de Python
-        return os.path.dirname(os.path.abspath(__file__))
+
+class PageRenderWorker(QObject):
+    """
+    Renderiza páginas por adelantado para el editor visual de cuadrícula.
+    
+    PyMuPDF no admite usarse desde varios hilos a la vez, así que el hilo solo
+    espera: cada página se renderiza en un proceso aparte (que abre sus
+    propios documentos). Atiende las peticiones más recientes: al pedir otras
+    páginas se descartan las que aún no se han empezado. Cada imagen se emite
+    como QImage y el hilo de la interfaz la convierte en QPixmap y la guarda
+    en la caché.
+    """
+    
+    # (clave (pdf, página, tramo de zoom), QImage)
+    rendered = pyqtSignal(object, object)
+    
+    def __init__(self):
+        super().__init__()
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+    
+    def request(self, keys):
+        """Sustituye las peticiones pendientes por las indicadas"""
+        try:
+            while True:
+                self.requests.get_nowait()
+        except queue.Empty:
+            pass
+        for key in keys:
+            self.requests.put(key)
+    
+    def stop(self):
+        self.stop_event.set()
+        self.requests.put(None)
+    
+    def run(self):
+        """Atiende las peticiones hasta que se detiene (se ejecuta en el QThread)"""
+        # 'spawn' evita heredar por fork el estado de Qt y de los hilos del proceso padre
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            while not self.stop_event.is_set():
+                key = self.requests.get()
+                if key is None or self.stop_event.is_set():
+                    break
+                pdf_path, page_num, bucket = key
+                try:
+                    samples = executor.submit(render_pdf_page, pdf_path, page_num, bucket).result()
+                    self.rendered.emit(key, image_from_samples(samples))
+                except Exception as e:
+                    print(f'Error al renderizar la página {page_num + 1}: {e}')
 
 
 class GridEditorDialog(QDialog):
@@ -36,13 +98,31 @@ class GridEditorDialog(QDialog):
     arrastrando sobre la imagen.
     
     Los cambios se guardan automáticamente en un archivo JSON asociado al PDF.
+    Las líneas son elementos fijos de la escena que se mueven al cambiar, y el
+    guardado se agrupa: se escribe un momento después del último cambio.
     """
     
-    def __init__(self, parent=None, pdf_path=None):
+    # Espera desde el último cambio hasta guardar grid_config.json (ms)
+    SAVE_DELAY_MS = 400
+    
+    # Colores de las líneas de columnas (azules) y filas (verdes)
+    COLUMN_PEN = QPen(QColor(0, 0, 255), 2)
+    ROW_PEN = QPen(QColor(0, 128, 0), 2)
+    PREVIEW_PEN = QPen(QColor(255, 0, 0, 100), 2, Qt.DashLine)
+    
+    def __init__(self, parent=None, pdf_path=None, render_cache=None):
         super().__init__(parent)
         self.pdf_path = pdf_path
         self.page_num = 0
         self.zoom_factor = 1.0
+        # Páginas ya renderizadas (la ventana principal la conserva entre aperturas)
+        self.render_cache = render_cache if render_cache is not None else PageRenderCache()
+        self.pixmap_item = None
+        self.pixmap_key = None      # (pdf, página, tramo) de la imagen mostrada
+        self.shown_page = None      # (pdf, página) de la escena actual
+        # Elementos de la escena de cada línea (en el orden de column_lines / row_lines)
+        self.column_items = []
+        self.row_items = []
         self.column_lines = []  # Lista de posiciones X de líneas verticales
         self.row_lines = []     # Lista de posiciones Y de líneas horizontales
         self.current_mode = 'column'  # 'column' o 'row'
@@ -51,6 +131,13 @@ class GridEditorDialog(QDialog):
         self.page_height = 0
         self.config_file = None  # Ruta del archivo de configuración
         self.init_ui()
+        self.start_prefetch()
+        
+        # Guardado diferido: cada cambio reinicia la espera
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(self.SAVE_DELAY_MS)
+        self.save_timer.timeout.connect(self.save_config)
         
         if pdf_path:
             self.load_pdf(pdf_path)
@@ -238,22 +325,15 @@ class GridEditorDialog(QDialog):
         x = scene_pos.x()
         y = scene_pos.y()
         
-        # Eliminar preview anterior
-        if self.preview_line:
-            self.scene.removeItem(self.preview_line)
-            self.preview_line = None
-        
-        # Crear nueva línea de preview
-        pen = QPen(QColor(255, 0, 0, 100), 2, Qt.DashLine)
+        # La línea de preview se crea una vez y solo se mueve
+        if self.preview_line is None:
+            self.preview_line = self.scene.addLine(QLineF(), self.PREVIEW_PEN)
+            self.preview_line.setZValue(2)
         
         if self.current_mode == 'column':
-            self.preview_line = self.scene.addLine(
-                x, 0, x, self.page_height * self.zoom_factor, pen
-            )
+            self.preview_line.setLine(x, 0, x, self.page_height * self.zoom_factor)
         else:
-            self.preview_line = self.scene.addLine(
-                0, y, self.page_width * self.zoom_factor, y, pen
-            )
+            self.preview_line.setLine(0, y, self.page_width * self.zoom_factor, y)
     
     def on_load_pdf(self):
         """Carga un archivo PDF"""
@@ -298,7 +378,13 @@ class GridEditorDialog(QDialog):
             self.info_label.setText('Modo FILAS: Clic para añadir línea horizontal. Clic derecho para eliminar.')
     
     def render_page(self):
-        """Renderiza la página actual del PDF"""
+        """
+        Muestra la página actual con el zoom actual.
+        
+        La imagen sale de la caché si ya se renderizó ese tramo de zoom; si
+        solo cambia el zoom y el tramo nuevo no está, se escala la imagen
+        que ya se ve mientras el hilo de fondo renderiza la nueva.
+        """
         if not self.pdf_doc:
             return
         
@@ -306,64 +392,128 @@ class GridEditorDialog(QDialog):
         self.page_width = page.rect.width
         self.page_height = page.rect.height
         
-        # Renderizar a imagen
-        mat = fitz.Matrix(self.zoom_factor * 2, self.zoom_factor * 2)  # Mayor resolución
-        pix = page.get_pixmap(matrix=mat)
+        bucket = zoom_bucket(self.zoom_factor)
+        key = (self.pdf_path, self.page_num, bucket)
+        same_page = self.shown_page == (self.pdf_path, self.page_num)
         
-        # Convertir a QImage
-        img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(img)
-        
-        # Escalar al zoom deseado
-        scaled_pixmap = pixmap.scaled(
-            int(self.page_width * self.zoom_factor),
-            int(self.page_height * self.zoom_factor),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
+        pixmap = self.render_cache.get(key)
+        if pixmap is None and not same_page:
+            # Página nueva sin renderizar: hay que mostrarla ya
+            pixmap = QPixmap.fromImage(render_page_image(page, bucket))
+            self.render_cache.put(key, pixmap)
         
-        # Limpiar escena y añadir imagen
-        self.scene.clear()
-        self.preview_line = None
-        self.scene.addPixmap(scaled_pixmap)
-        self.scene.setSceneRect(0, 0, scaled_pixmap.width(), scaled_pixmap.height())
+        if not same_page:
+            # Limpiar escena y añadir imagen (scene.clear() borra también las líneas)
+            self.scene.clear()
+            self.preview_line = None
+            self.column_items = []
+            self.row_items = []
+            self.pixmap_item = self.scene.addPixmap(pixmap)
+            self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+            self.pixmap_key = key
+            self.shown_page = (self.pdf_path, self.page_num)
+        elif pixmap is not None and key != self.pixmap_key:
+            self.pixmap_item.setPixmap(pixmap)
+            self.pixmap_key = key
+        
+        self.scale_pixmap_item()
         
         # Redibujar líneas
         self.update_lines()
+        
+        self.prefetch_around(bucket)
+    
+    def scale_pixmap_item(self):
+        """Ajusta la imagen mostrada (de cualquier tramo) al zoom actual"""
+        width = self.page_width * self.zoom_factor
+        height = self.page_height * self.zoom_factor
+        self.pixmap_item.setScale(width / self.pixmap_item.pixmap().width())
+        self.scene.setSceneRect(0, 0, width, height)
+    
+    def start_prefetch(self):
+        """Arranca el hilo que renderiza por adelantado páginas y tramos de zoom"""
+        self.render_worker = PageRenderWorker()
+        self.render_thread = QThread(self)
+        self.render_worker.moveToThread(self.render_thread)
+        self.render_thread.started.connect(self.render_worker.run)
+        self.render_worker.rendered.connect(self.on_page_rendered)
+        self.render_thread.start()
+    
+    def stop_prefetch(self):
+        """Detiene el hilo de renderizado (espera a que termine la página en curso)"""
+        if self.render_thread is None:
+            return
+        self.render_worker.stop()
+        self.render_thread.quit()
+        self.render_thread.wait()
+        self.render_thread = None
+    
+    def prefetch_around(self, bucket):
+        """Pide las páginas vecinas y los tramos de zoom contiguos que no están en caché"""
+        if self.render_thread is None:
+            return
+        keys = [(self.pdf_path, self.page_num, bucket)]
+        keys += [(self.pdf_path, self.page_num + step, bucket) for step in (1, -1)
+                 if 0 <= self.page_num + step < len(self.pdf_doc)]
+        keys += [(self.pdf_path, self.page_num, other) for other in neighbour_buckets(bucket)]
+        self.render_worker.request([key for key in keys if key not in self.render_cache])
+    
+    def on_page_rendered(self, key, image):
+        """Guarda la imagen renderizada en segundo plano y la muestra si es la que falta"""
+        pixmap = QPixmap.fromImage(image)
+        self.render_cache.put(key, pixmap)
+        current = (self.pdf_path, self.page_num, zoom_bucket(self.zoom_factor))
+        if key == current and key != self.pixmap_key and self.pixmap_item is not None:
+            self.pixmap_item.setPixmap(pixmap)
+            self.pixmap_key = key
+            self.scale_pixmap_item()
     
     def update_lines(self):
-        """Actualiza las líneas dibujadas en la escena y guarda automáticamente"""
-        # Eliminar líneas anteriores (pero no la imagen)
-        for item in self.scene.items():
-            if isinstance(item, QGraphicsLineItem):
-                self.scene.removeItem(item)
-        
-        # Dibujar líneas de columnas (azules)
-        pen_col = QPen(QColor(0, 0, 255), 2)
-        for x in self.column_lines:
-            scaled_x = x * self.zoom_factor
-            self.scene.addLine(
-                scaled_x, 0, 
-                scaled_x, self.page_height * self.zoom_factor, 
-                pen_col
-            )
-        
-        # Dibujar líneas de filas (verdes)
-        pen_row = QPen(QColor(0, 128, 0), 2)
-        for y in self.row_lines:
-            scaled_y = y * self.zoom_factor
-            self.scene.addLine(
-                0, scaled_y, 
-                self.page_width * self.zoom_factor, scaled_y, 
-                pen_row
-            )
+        """Actualiza las líneas dibujadas en la escena y programa el guardado"""
+        width = self.page_width * self.zoom_factor
+        height = self.page_height * self.zoom_factor
+        
+        # Columnas (verticales) y filas (horizontales)
+        self.sync_line_items(
+            self.column_items, [QLineF(x * self.zoom_factor, 0, x * self.zoom_factor, height)
+                                for x in self.column_lines], self.COLUMN_PEN
+        )
+        self.sync_line_items(
+            self.row_items, [QLineF(0, y * self.zoom_factor, width, y * self.zoom_factor)
+                             for y in self.row_lines], self.ROW_PEN
+        )
         
         # Actualizar contadores
         self.cols_count_label.setText(f'Columnas: {len(self.column_lines)}')
         self.rows_count_label.setText(f'Filas: {len(self.row_lines)}')
         
-        # Guardar automáticamente
-        self.save_config()
+        # Guardar automáticamente (agrupando los cambios seguidos)
+        self.schedule_save()
+    
+    def sync_line_items(self, items, lines, pen):
+        """
+        Ajusta los elementos de la escena a las líneas: mueve los que ya
+        existen, crea los que faltan y quita los que sobran.
+        """
+        for item, line in zip(items, lines):
+            if item.line() != line:
+                item.setLine(line)
+        for line in lines[len(items):]:
+            item = self.scene.addLine(line, pen)
+            item.setZValue(1)
+            items.append(item)
+        while len(items) > len(lines):
+            self.scene.removeItem(items.pop())
+    
+    def schedule_save(self):
+        """Guarda la configuración cuando pasa SAVE_DELAY_MS sin más cambios"""
+        self.save_timer.start()
+    
+    def flush_save(self):
+        """Escribe ya la configuración si hay un guardado pendiente"""
+        if self.save_timer.isActive():
+            self.save_timer.stop()
+            self.save_config()
     
     def clear_columns(self):
         """Elimina todas las líneas de columnas"""
@@ -381,9 +531,19 @@ class GridEditorDialog(QDialog):
             'column_positions': sorted(self.column_lines),
             'row_positions': sorted(self.row_lines),
             'page_width': self.page_width,
-            'page_height': self.page_height
+            'page_height': self.page_height,
+            'template': self.page_template()
         }
     
+    def page_template(self):
+        """
+        Huella de la plantilla de la página sobre la que se dibuja: sus páginas
+        usan esta cuadrícula aunque haya un perfil guardado (ver grid_profiles)
+        """
+        if not self.pdf_doc:
+            return None
+        return page_fingerprint(self.pdf_doc[self.page_num])
+    
     def get_config_file_path(self):
         """Obtiene la ruta del archivo de configuración genérico"""
         # Guardar en la carpeta del usuario o junto al script
@@ -401,12 +561,12 @@ class GridEditorDialog(QDialog):
             'page_width': self.page_width,
             'page_height': self.page_height,
             'page_num': self.page_num,
-            'zoom_factor': self.zoom_factor
+            'zoom_factor': self.zoom_factor,
+            'template': self.page_template()
         }
         
         try:
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=2, ensure_ascii=False)
+            save_json_config(config_path, config_data)
             self.update_save_status(True)
         except Exception as e:
             print(f'Error al guardar configuración: {e}')
@@ -449,172 +609,536 @@ class GridEditorDialog(QDialog):
     def closeEvent(self, event):
         """Cerrar el documento PDF al cerrar el diálogo"""
         # Guardar automáticamente antes de cerrar
-        self.save_config()
+        self.flush_save()
         if self.pdf_doc:
             self.pdf_doc.close()
         event.accept()
+    
+    def done(self, result):
+        """Guarda lo pendiente y detiene el renderizado en segundo plano al aceptar o cancelar"""
+        self.flush_save()
+        self.stop_prefetch()
+        super().done(result)
+
+
+class DetectionWorker(QObject):
+    """
+    Ejecuta la detección de referencias fuera del hilo de la interfaz.
+    
+    Reparte los PDFs entre procesos (ver detection_engine), reutiliza las
+    páginas sin cambios guardadas en la caché (ver detection_cache) y emite los
+    resultados de cada página por señales, en orden, de modo que la ventana
+    los va acumulando sin bloquearse. La cancelación se comprueba mediante
+    un threading.Event.
+    """
+    
+    # (pdf_path, total_pages_del_pdf)
+    pdf_started = pyqtSignal(str, int)
+    # (pdf_path, page_num, referencias de la página)
+    page_done = pyqtSignal(str, int, object)
+    # pdf_path: todas las páginas del PDF analizadas
+    pdf_finished = pyqtSignal(str)
+    # (páginas procesadas, total de páginas)
+    progress = pyqtSignal(int, int)
+    # (pdf_path, mensaje de error)
+    pdf_failed = pyqtSignal(str, str)
+    # (pdf_path, page_num, mensaje): el regex personalizado superó el tiempo límite
+    page_timeout = pyqtSignal(str, int, str)
+    # (pdf_path, primera página, página final, mensaje): bloque de páginas que no se pudo analizar
+    pages_failed = pyqtSignal(str, int, int, str)
+    # mensaje de un error inesperado que detuvo la detección
+    failed = pyqtSignal(str)
+    # cancelado
+    finished = pyqtSignal(bool)
+    
+    def __init__(self, pdf_paths, pattern, groups_order, cancel_event, workers=0, cache_path=None,
+                 regions=None, analysis=None):
+        super().__init__()
+        self.pdf_paths = list(pdf_paths)
+        self.pattern = pattern
+        self.groups_order = groups_order
+        self.cancel_event = cancel_event
+        self.workers = workers
+        self.cache_path = cache_path
+        self.regions = regions
+        self.analysis = analysis
+    
+    def run(self):
+        """Procesa todos los PDFs (se ejecuta en el QThread)"""
+        try:
+            # Calcular el total de páginas de todos los PDFs para la barra de progreso
+            page_counts = count_pages(self.pdf_paths, self.analysis)
+            for pdf_path, count in page_counts.items():
+                if count is None:
+                    self.pdf_failed.emit(pdf_path, 'No se pudo abrir el PDF')
+            total_pages = sum(count for count in page_counts.values() if count)
+            
+            self.progress.emit(0, total_pages)
+            pages_processed = 0
+            current_pdf = None
+            
+            def on_error(pdf_path, start, end, message):
+                # Las páginas del bloque no llegan, pero cuentan para el progreso
+                nonlocal pages_processed
+                pages_processed += end - start
+                self.pages_failed.emit(pdf_path, start, end, message)
+                self.progress.emit(pages_processed, total_pages)
+            
+            # Los bloques de páginas se reparten entre procesos y llegan en orden
+            for pdf_path, page_num, page_refs in iter_page_references(
+                    page_counts, self.pattern, self.groups_order,
+                    workers=self.workers, cancel_event=self.cancel_event,
+                    cache_path=self.cache_path, regions=self.regions,
+                    on_timeout=self.page_timeout.emit, analysis=self.analysis, on_error=on_error):
+                if pdf_path != current_pdf:
+                    current_pdf = pdf_path
+                    self.pdf_started.emit(pdf_path, page_counts[pdf_path])
+                
+                pages_processed += 1
+                self.page_done.emit(pdf_path, page_num, page_refs)
+                if page_num + 1 == page_counts[pdf_path]:
+                    self.pdf_finished.emit(pdf_path)
+                self.progress.emit(pages_processed, total_pages)
+        except Exception as e:
+            print(f"Error en la detección: {e}")
+            self.failed.emit(str(e) or type(e).__name__)
+        finally:
+            # Siempre se emite: la ventana lo espera para desbloquear los controles
+            self.finished.emit(self.cancel_event.is_set())
+
+
+class GenerationWorker(QObject):
+    """
+    Genera los PDFs interactivos fuera del hilo de la interfaz.
+    
+    Cada PDF es un trabajo independiente en un pool de procesos (ver
+    pdf_generation.iter_generate_pdfs) que recibe sus referencias, la
+    cuadrícula y el JavaScript ya preparados. El resultado de cada PDF
+    (incluido su error, si lo hay) se emite al terminar.
+    
+    La misma tarea puede, en lugar de generar, actualizar los destinos de los
+    enlaces de los PDFs ya generados (RETARGET, ver
+    pdf_generation.retarget_interactive_pdf) o cambiar el estilo del
+    resaltado de una carpeta de PDFs interactivos (RESTYLE, ver
+    pdf_generation.iter_restyle_pdfs; los trabajos son solo las rutas).
+    """
+    
+    GENERATE = 'generate'
+    RETARGET = 'retarget'
+    RESTYLE = 'restyle'
+    
+    # resultado de un PDF (ver pdf_generation.run_generation_job)
+    pdf_done = pyqtSignal(object)
+    # (PDFs terminados, total de PDFs)
+    progress = pyqtSignal(int, int)
+    # mensaje de un error inesperado que detuvo la generación
+    failed = pyqtSignal(str)
+    # cancelado
+    finished = pyqtSignal(bool)
+    
+    def __init__(self, jobs, javascript_code, grid, cancel_event, workers=0, profiles=None,
+                 page_sizes=None, task=GENERATE, layout=LINK_LAYOUT_INLINE):
+        super().__init__()
+        self.jobs = jobs
+        self.javascript_code = javascript_code
+        self.grid = grid
+        self.cancel_event = cancel_event
+        self.workers = workers
+        self.profiles = profiles
+        self.page_sizes = page_sizes
+        self.task = task
+        self.layout = layout
+    
+    def run(self):
+        """Genera todos los PDFs (se ejecuta en el QThread)"""
+        try:
+            total = len(self.jobs)
+            self.progress.emit(0, total)
+            if self.task == self.RESTYLE:
+                results = iter_restyle_pdfs(self.jobs, self.javascript_code,
+                                            workers=self.workers, cancel_event=self.cancel_event)
+            else:
+                results = iter_generate_pdfs(
+                    self.jobs, self.javascript_code, self.grid,
+                    workers=self.workers, cancel_event=self.cancel_event,
+                    profiles=self.profiles, page_sizes=self.page_sizes, retarget=self.task == self.RETARGET,
+                    layout=self.layout
+                )
+            for done, result in enumerate(results, 1):
+                self.pdf_done.emit(result)
+                self.progress.emit(done, total)
+        except Exception as e:
+            print(f"Error en la generación: {e}")
+            self.failed.emit(str(e) or type(e).__name__)
+        finally:
+            # Siempre se emite: la ventana lo espera para desbloquear los controles
+            self.finished.emit(self.cancel_event.is_set())
+
+
+class ReferenceTableModel(QAbstractTableModel):
+    """
+    Modelo de tabla sobre el almacén de referencias detectadas.
+    
+    No crea ningún objeto por celda: el texto de cada celda se genera cuando
+    la vista lo pide para pintarlo, así que la memoria y el tiempo de mostrar
+    la tabla no crecen con el número de celdas. Lo comparten la tabla
+    principal y el diálogo de referencias.
+    """
+    
+    # Rol con la clave de ordenación de cada celda (ver ReferenceSortProxyModel)
+    SORT_ROLE = Qt.UserRole + 1
+    
+    HEADERS = ['Referencia', 'Página', 'Columna', 'Fila', 'Contexto']
+    FIELDS = ['ref', 'page', 'column', 'row', 'context']
+    
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.show_pdf = False
+        self.show_contexts = True
+    
+    def refresh(self, show_pdf):
+        """Vuelve a leer el almacén (tras detectar o eliminar PDFs)"""
+        self.beginResetModel()
+        self.show_pdf = show_pdf
+        self.endResetModel()
+    
+    def set_show_pdf(self, show_pdf):
+        """Muestra u oculta la columna del PDF (solo se relee el almacén si cambia)"""
+        if show_pdf != self.show_pdf:
+            self.refresh(show_pdf)
+    
+    def set_show_contexts(self, show_contexts):
+        """
+        Activa o desactiva la lectura de los contextos. Mientras trabaja la
+        detección o la generación la columna queda vacía: el texto de la
+        página se lee con PyMuPDF, que no se usa desde este hilo a la vez
+        """
+        self.show_contexts = show_contexts
+        column = self.fields().index('context')
+        if len(self.store):
+            self.dataChanged.emit(self.index(0, column), self.index(len(self.store) - 1, column))
+    
+    def add_page(self, pdf_path, page_num, page_rows):
+        """Añade al almacén las referencias de una página como filas nuevas al final"""
+        if page_rows:
+            first = len(self.store)
+            self.beginInsertRows(QModelIndex(), first, first + len(page_rows) - 1)
+            self.store.add_page(pdf_path, page_num, page_rows)
+            self.endInsertRows()
+        else:
+            self.store.add_page(pdf_path, page_num, page_rows)
+    
+    def remove_pdf(self, pdf_path):
+        """Quita del almacén las filas de un PDF"""
+        rows = self.store.rows_for_pdf(pdf_path)
+        if rows:
+            self.beginRemoveRows(QModelIndex(), rows.start, rows.stop - 1)
+            self.store.remove_pdf(pdf_path)
+            self.endRemoveRows()
+        else:
+            self.store.remove_pdf(pdf_path)
+    
+    def fields(self):
+        return (['pdf'] if self.show_pdf else []) + self.FIELDS
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.fields())
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            headers = (['PDF'] if self.show_pdf else []) + self.HEADERS
+            return headers[section] if section < len(headers) else None
+        return section + 1
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.display_text(index.row(), self.fields()[index.column()])
+        if role == self.SORT_ROLE:
+            return self.sort_key(index.row(), self.fields()[index.column()])
+        return None
+    
+    def display_text(self, row, field):
+        """Texto mostrado en una celda"""
+        store = self.store
+        if field == 'pdf':
+            # Acortar el nombre si es muy largo
+            pdf_name = store.pdf_name_of(row)
+            if len(pdf_name) > 25:
+                pdf_name = pdf_name[:22] + '...'
+            return pdf_name
+        if field == 'ref':
+            # Mostrar referencia con número de instancia si hay duplicados
+            ref_text = store.full[row]
+            if store.instance[row] > 1:
+                ref_text += f" (#{store.instance[row]})"
+            return ref_text
+        if field == 'context':
+            # El contexto se lee del texto de la página solo al mostrarlo
+            if not self.show_contexts:
+                return f"[Pág PDF: {store.pdf_page[row]+1}]"
+            return f"{store.context(row)} [Pág PDF: {store.pdf_page[row]+1}]"
+        return getattr(store, field)[row]
+    
+    def sort_key(self, row, field):
+        """Clave de ordenación de una celda (los números se ordenan como números)"""
+        store = self.store
+        if field == 'pdf':
+            return (store.pdf_name_of(row), store.pdf_page[row])
+        if field == 'ref':
+            return (store.full[row], store.instance[row])
+        if field == 'context':
+            # Orden de aparición en el documento (sin leer el texto)
+            return (store.pdf_id[row], store.pdf_page[row], store.context_start[row])
+        value = getattr(store, field)[row]
+        return (0, int(value), '') if value.isdigit() else (1, 0, value)
+    
+    def sort_keys(self, column):
+        """Claves de ordenación de toda una columna"""
+        field = self.fields()[column]
+        return [self.sort_key(row, field) for row in range(len(self.store))]
+
+
+class ReferenceSortProxyModel(QAbstractProxyModel):
+    """
+    Proxy que ordena un ReferenceTableModel sin copiar los datos.
+    
+    Guarda solo la permutación de filas; al ordenar calcula la clave de cada
+    fila una vez y ordena con sorted(), en lugar de comparar celda a celda
+    como QSortFilterProxyModel. Cada vista tiene su propio proxy, así que
+    pueden ordenarse de forma independiente sobre el mismo modelo.
+    
+    Las filas que el modelo añade o quita (ver ReferenceTableModel.add_page y
+    remove_pdf) se reenvían tal cual si no hay orden; con orden, sus
+    posiciones no son contiguas y el proxy se reinicia con la permutación
+    recalculada.
+    """
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.order = None      # fila del proxy -> fila del modelo (None = sin ordenar)
+        self.position = None   # fila del modelo -> fila del proxy
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.resetting_rows = False   # el cambio de filas en curso se aplica con un reinicio
+    
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self.on_source_reset)
+        model.dataChanged.connect(self.on_source_data_changed)
+        model.rowsAboutToBeInserted.connect(self.on_source_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self.on_source_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self.on_source_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self.on_source_rows_removed)
+        self.compute_order()
+        self.endResetModel()
+    
+    def on_source_reset(self):
+        self.compute_order()
+        self.endResetModel()
+    
+    def on_source_rows_about_to_be_inserted(self, parent, first, last):
+        self.resetting_rows = self.order is not None
+        if self.resetting_rows:
+            self.beginResetModel()
+        else:
+            self.beginInsertRows(QModelIndex(), first, last)
+    
+    def on_source_rows_about_to_be_removed(self, parent, first, last):
+        self.resetting_rows = self.order is not None
+        if self.resetting_rows:
+            self.beginResetModel()
+        else:
+            self.beginRemoveRows(QModelIndex(), first, last)
+    
+    def on_source_rows_inserted(self, parent, first, last):
+        if self.resetting_rows:
+            self.compute_order()
+            self.endResetModel()
+        else:
+            self.endInsertRows()
+    
+    def on_source_rows_removed(self, parent, first, last):
+        if self.resetting_rows:
+            self.compute_order()
+            self.endResetModel()
+        else:
+            self.endRemoveRows()
+    
+    def on_source_data_changed(self, top_left, bottom_right, roles=None):
+        # Simplificación: repintar todo (solo se usa al cambiar datos en bloque)
+        self.dataChanged.emit(
+            self.index(0, 0),
+            self.index(self.rowCount() - 1, self.columnCount() - 1)
+        )
+    
+    def compute_order(self):
+        """Calcula la permutación de filas según la columna de ordenación"""
+        model = self.sourceModel()
+        if model is None or self.sort_column < 0 or self.sort_column >= model.columnCount():
+            self.order = None
+            self.position = None
+            return
+        keys = model.sort_keys(self.sort_column)
+        self.order = sorted(range(len(keys)), key=keys.__getitem__,
+                            reverse=self.sort_order == Qt.DescendingOrder)
+        self.position = [0] * len(self.order)
+        for proxy_row, source_row in enumerate(self.order):
+            self.position[source_row] = proxy_row
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        old_persistent = self.persistentIndexList()
+        old_source = [self.mapToSource(index) for index in old_persistent]
+        
+        self.sort_column = column
+        self.sort_order = order
+        self.compute_order()
+        
+        self.changePersistentIndexList(
+            old_persistent, [self.mapFromSource(index) for index in old_source]
+        )
+        self.layoutChanged.emit()
+    
+    def rowCount(self, parent=QModelIndex()):
+        model = self.sourceModel()
+        return 0 if parent.isValid() or model is None else model.rowCount()
+    
+    def columnCount(self, parent=QModelIndex()):
+        model = self.sourceModel()
+        return 0 if parent.isValid() or model is None else model.columnCount()
+    
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column)
+    
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+    
+    def mapToSource(self, proxy_index):
+        model = self.sourceModel()
+        if model is None or not proxy_index.isValid():
+            return QModelIndex()
+        row = proxy_index.row()
+        if self.order is not None:
+            row = self.order[row]
+        return model.index(row, proxy_index.column())
+    
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self.position is not None:
+            row = self.position[row]
+        return self.index(row, source_index.column())
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Vertical:
+            # El número de fila es la posición en la vista, no en el modelo
+            return section + 1 if role == Qt.DisplayRole else None
+        return self.sourceModel().headerData(section, orientation, role)
+
+
+def create_reference_view(model):
+    """Crea una QTableView ordenable sobre el modelo de referencias compartido"""
+    proxy = ReferenceSortProxyModel()
+    proxy.setSourceModel(model)
+    view = QTableView()
+    proxy.setParent(view)
+    view.setModel(proxy)
+    # Sin indicador inicial: mantener el orden de detección hasta que se pulse una cabecera
+    view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+    view.setSortingEnabled(True)
+    # Altura de fila fija: la vista no tiene que medir cada fila
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(28)
+    view.setWordWrap(False)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    return view
 
 
 class PDFReferenceDetector(QMainWindow):
     
-    # Patrones de referencias predefinidos
-    # Formato: (nombre, patrón_regex, ejemplo, descripción de grupos)
-    REFERENCE_PATTERNS = {
-        'Estilo /1.0-A': {
-            'pattern': r'/\s*(\d+)[.\s]+(\d+|[A-Za-z]+)\s*[-/]\s*([A-Za-z0-9]+)',
-            'example': '/1.0-A, /10.5-Z, /3.12-AB',
-            'groups': ('página', 'columna', 'fila'),
-            'order': 'página.columna-fila'
-        },
-        'Estilo 25-A.0': {
-            'pattern': r'(\d+)\s*[-]\s*([A-Za-z]+)[.\s]+(\d+)',
-            'example': '25-A.0, 10-B.5, 3-C.12',
-            'groups': ('página', 'fila', 'columna'),
-            'order': 'página-fila.columna'
-        },
-        'Estilo A1/25': {
-            'pattern': r'([A-Za-z]+)(\d+)\s*[/]\s*(\d+)',
-            'example': 'A1/25, B5/10, C12/3',
-            'groups': ('fila', 'columna', 'página'),
-            'order': 'fila+columna/página'
-        },
-        'Estilo (1-A-0)': {
-            'pattern': r'\(\s*(\d+)\s*[-]\s*([A-Za-z]+)\s*[-]\s*(\d+)\s*\)',
-            'example': '(1-A-0), (10-B-5), (3-C-12)',
-            'groups': ('página', 'fila', 'columna'),
-            'order': '(página-fila-columna)'
-        },
-        'Personalizado': {
-            'pattern': '',
-            'example': 'Define tu propio patrón regex',
-            'groups': ('grupo1', 'grupo2', 'grupo3'),
-            'order': 'personalizado'
-        }
-    }
+    # Patrones de referencias predefinidos (ver reference_patterns)
+    REFERENCE_PATTERNS = REFERENCE_PATTERNS
     
     def __init__(self):
         super().__init__()
         self.pdf_path = None
         self.pdf_paths = []  # Lista de PDFs cargados
-        self.references = []
-        self.all_references = {}  # Referencias por PDF: {path: [referencias]}
-        self.pdf_document = None
+        # Lo extraído de cada página (recuentos, tamaños, textos, marco), compartido
+        # entre detección, contextos, cuadrícula y generación (ver page_analysis)
+        self.page_analysis = PageAnalysis()
+        
+        # Referencias de todos los PDFs (por columnas, ver reference_store)
+        self.reference_store = ReferenceStore(self.page_analysis)
+        # Detección en segundo plano
+        self.detection_thread = None
+        self.detection_worker = None
+        self.detection_cancel = None
+        self.detection_progress = None
+        self.detection_current_pdf = ('', 0)
+        self.detection_timeouts = []      # (pdf_path, página, mensaje) del regex personalizado
+        self.detection_failures = []      # (pdf_path, primera página, página final, mensaje)
+        self.detection_error = None
+        self.detection_key = None         # (patrón, zonas) de la detección en curso
+        self.detection_signatures = {}    # pdf_path -> firma del archivo al empezar la detección
+        self.detection_pending = 0        # PDFs analizados en la detección en curso
+        # Generación en segundo plano
+        self.generation_thread = None
+        self.generation_worker = None
+        self.generation_cancel = None
+        self.generation_progress = None
+        self.generation_results = []
+        self.generation_output_dir = None
+        self.generation_error = None
+        self.generation_profiles = None    # Perfiles de cuadrícula de la generación en curso
+        self.generation_task = GenerationWorker.GENERATE   # Tarea en curso (ver GenerationWorker)
+        self.generated_outputs = {}        # pdf_path -> PDF interactivo generado con sus referencias
+        # Zonas de extracción de texto (styles_config.json, sin control en la interfaz)
+        self.text_regions_config = dict(DEFAULT_TEXT_REGIONS)
+        # Tiempo límite por página de los regex personalizados (styles_config.json)
+        self.pattern_time_budget = DEFAULT_PAGE_BUDGET
+        # Páginas renderizadas del editor visual (se conservan entre aperturas)
+        self.render_cache = PageRenderCache()
         self.current_pattern = 'Estilo /1.0-A'  # Patrón por defecto
         self.custom_pattern = ''
         # Posiciones exactas de columnas y filas (detectadas del cajetín)
         self.column_positions = []  # Lista de posiciones X de cada columna
         self.row_positions = []     # Lista de posiciones Y de cada fila
+        self.column_labels = []     # Nombre de cada columna ('0', '1'...), si se detectó
+        self.row_labels = []        # Nombre de cada fila ('A', 'B'...), si se detectó
         self.grid_detected = False  # Si se detectó la cuadrícula
+        self.grid_template = None   # Huella de la plantilla de la cuadrícula (ver grid_profiles)
         self.init_ui()
         # Cargar configuración de cuadrícula genérica si existe
         self.load_saved_grid_config()
     
     def closeEvent(self, event):
-        """Cerrar el documento PDF al cerrar la aplicación"""
-        if self.pdf_document:
-            self.pdf_document.close()
+        """Detener la detección o la generación en curso al cerrar la aplicación"""
+        if self.detection_thread is not None:
+            self.detection_cancel.set()
+            self.detection_thread.quit()
+            self.detection_thread.wait()
+        if self.generation_thread is not None:
+            self.generation_cancel.set()
+            self.generation_thread.quit()
+            self.generation_thread.wait()
         event.accept()
         
     def get_javascript_code(self):
         """Genera el código JavaScript con los parámetros de estilo seleccionados"""
-        color = self.get_highlight_color()
-        line_width = self.line_width_spinbox.value()
-        blink_speed = self.get_blink_speed()
-        duration = self.get_highlight_duration()
-        
-        # Obtener nuevas opciones de estilo
-        fill_style = self.fill_combo.currentText()
-        fill_color = self.get_fill_color()
-        animation_type = self.animation_combo.currentText()
-        margin = self.rect_margin_spinbox.value()
-        
-        # Configurar el estilo de relleno
-        fill_code = ""
-        if fill_style == 'Semitransparente':
-            fill_code = f"f.fillColor = {fill_color};"
-        elif fill_style == 'Sólido':
-            fill_code = f"f.fillColor = {fill_color};"
-        
-        # Aplicar margen a las coordenadas
-        margin_code = ""
-        if margin != 0:
-            margin_code = f"""
-    coordinates[0] -= {margin};
-    coordinates[1] -= {margin};
-    coordinates[2] += {margin};
-    coordinates[3] += {margin};"""
-        
-        # Configurar el estilo de línea (para JavaScript de Acrobat es limitado)
-        line_style = self.line_style_combo.currentText()
-        line_style_code = ""
-        if line_style == 'Discontinua':
-            line_style_code = "f.borderStyle = border.d;"  # Dashed
-        elif line_style == 'Punteada':
-            line_style_code = "f.borderStyle = border.d;"  # Similar a dashed
-        
-        # Generar código de animación según el tipo
-        if animation_type == 'Sin animación' or blink_speed == 0:
-            blinker_code = "// Sin animación"
-            interval_code = ""
-        elif animation_type == 'Fade In/Out':
-            blinker_code = """var f = getField('Target');
-    if (f != null) {
-        var oldDirty = dirty;
-        // Fade effect simulado con visibilidad
-        if (interval.counter++%2) { f.hidden=false; }
-        else { f.hidden = true; }
-        dirty = oldDirty;
-    }"""
-            interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
-        elif animation_type == 'Pulso':
-            blinker_code = """var f = getField('Target');
-    if (f != null) {
-        var oldDirty = dirty;
-        // Efecto pulso
-        if (interval.counter++%2) { f.hidden=false; }
-        else { f.hidden = true; }
-        dirty = oldDirty;
-    }"""
-            interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
-        else:  # Parpadeo normal
-            blinker_code = """var f = getField('Target');
-    if (f != null) {
-        var oldDirty = dirty;
-        if (interval.counter++%2) { f.hidden=false; }
-        else { f.hidden = true; }
-        dirty = oldDirty;
-    }"""
-            interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
-        
-        return f"""
-function finish() {{
-    app.clearInterval(interval);
-    var oldDirty = dirty;
-    removeField('Target');
-    dirty = oldDirty;
-}}
-
-function blinker() {{
-    {blinker_code}
-}}
-
-function highlight(page, coordinates) {{
-    var f = getField('Target');
-    if (f != null) {{
-        app.clearTimeOut(timer);
-        finish();
-    }}{margin_code}
-    var oldDirty = dirty;
-    var f = addField('Target', 'button', page, coordinates);
-    f.lineWidth = {line_width};
-    f.strokeColor = {color};
-    {fill_code}
-    {line_style_code}
-    dirty = oldDirty;
-    {interval_code}
-    timer = app.setTimeOut('finish()', {duration});
-}}
-"""
+        return build_javascript_code(self.get_style_settings())
         
     def init_ui(self):
         self.setWindowTitle('PDF Reference Detector')
@@ -724,22 +1248,22 @@ function highlight(page, coordinates) {{
                 selection-background-color: #3b82f6;
                 outline: none;
             }
-            QTableWidget {
+            QTableView {
                 background-color: #1e293b;
                 border: 1px solid #334155;
                 border-radius: 8px;
                 gridline-color: #334155;
                 color: #e2e8f0;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px;
                 border-bottom: 1px solid #334155;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #3b82f6;
                 color: white;
             }
-            QTableWidget::item:alternate {
+            QTableView::item:alternate {
                 background-color: #0f172a;
             }
             QHeaderView::section {
@@ -1022,6 +1546,33 @@ function highlight(page, coordinates) {{
         ''')
         file_row.addWidget(self.generate_button)
         
+        self.retarget_button = QPushButton('🎯 Actualizar Destinos')
+        self.retarget_button.clicked.connect(self.retarget_interactive_pdfs)
+        self.retarget_button.setEnabled(False)
+        self.retarget_button.setToolTip(
+            'Recalcula con la cuadrícula actual el destino de los enlaces de los PDFs ya generados,\n'
+            'sin volver a detectar ni a generar.\n'
+            'Con la cuadrícula por plantilla, las hojas de otros tipos usan la cuadrícula de su tipo.'
+        )
+        self.retarget_button.setStyleSheet('''
+            QPushButton {
+                background-color: #8b5cf6;
+                color: white;
+                padding: 10px 18px;
+                font-weight: bold;
+                border-radius: 6px;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #a78bfa;
+            }
+            QPushButton:disabled {
+                background-color: #334155;
+                color: #64748b;
+            }
+        ''')
+        file_row.addWidget(self.retarget_button)
+        
         file_row.addStretch()
         file_main_layout.addLayout(file_row)
         
@@ -1040,6 +1591,27 @@ function highlight(page, coordinates) {{
         self.disable_popups.setToolTip('Si está marcado, no se mostrarán ventanas emergentes de confirmación al terminar de exportar')
         save_options_row.addWidget(self.disable_popups)
         
+        save_options_row.addSpacing(20)
+        
+        self.compact_links = QCheckBox('Enlaces compactos')
+        self.compact_links.setStyleSheet('color: #94a3b8;')
+        self.compact_links.setToolTip('Guarda cada destino una sola vez en una tabla del documento en lugar de '
+                                      'repetirlo en cada enlace (PDFs más pequeños con muchas referencias)')
+        save_options_row.addWidget(self.compact_links)
+        
+        save_options_row.addSpacing(20)
+        
+        lbl_workers = QLabel('Procesos:')
+        lbl_workers.setStyleSheet('color: #94a3b8;')
+        save_options_row.addWidget(lbl_workers)
+        
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(0, 64)
+        self.workers_spinbox.setValue(0)
+        self.workers_spinbox.setSpecialValueText('Auto')
+        self.workers_spinbox.setToolTip('Número de procesos para detectar en paralelo (Auto = uno por núcleo)')
+        save_options_row.addWidget(self.workers_spinbox)
+        
         save_options_row.addStretch()
         file_main_layout.addLayout(save_options_row)
         
@@ -1085,6 +1657,30 @@ function highlight(page, coordinates) {{
         pattern_row1.addWidget(self.pattern_example)
         pattern_row1.addStretch()
         
+        self.auto_pattern_button = QPushButton('Auto')
+        self.auto_pattern_button.setFixedHeight(28)
+        self.auto_pattern_button.setToolTip(
+            'Analiza unas pocas páginas de muestra y elige el estilo con más\n'
+            'referencias válidas (página existente y cuadrante de la cuadrícula).\n'
+            'También se hace al añadir PDFs.'
+        )
+        self.auto_pattern_button.clicked.connect(lambda: self.autodetect_pattern())
+        self.auto_pattern_button.setStyleSheet('''
+            QPushButton {
+                background-color: #334155;
+                color: #94a3b8;
+                border-radius: 14px;
+                font-weight: bold;
+                border: none;
+                padding: 0 10px;
+            }
+            QPushButton:hover {
+                background-color: #3b82f6;
+                color: white;
+            }
+        ''')
+        pattern_row1.addWidget(self.auto_pattern_button)
+        
         self.help_pattern_button = QPushButton('?')
         self.help_pattern_button.setFixedSize(28, 28)
         self.help_pattern_button.clicked.connect(self.show_pattern_help)
@@ -1146,6 +1742,27 @@ function highlight(page, coordinates) {{
         self.pattern_preview_label.hide()
         pattern_layout.addWidget(self.pattern_preview_label)
         
+        # Estilos que se buscan además del elegido, en la misma pasada
+        pattern_row3 = QHBoxLayout()
+        lbl_combinar = QLabel('Además:')
+        lbl_combinar.setStyleSheet('color: #94a3b8; min-width: 50px;')
+        pattern_row3.addWidget(lbl_combinar)
+        self.combined_pattern_checks = {}
+        for pattern_name in self.REFERENCE_PATTERNS:
+            if pattern_name == 'Personalizado':
+                continue
+            check = QCheckBox(pattern_name.replace('Estilo ', ''))
+            check.setStyleSheet('color: #94a3b8;')
+            check.setToolTip(
+                f'Buscar también referencias con el {pattern_name.lower()}.\n'
+                'Todos los estilos marcados se detectan en una sola pasada por página.'
+            )
+            check.setEnabled(pattern_name != self.current_pattern)
+            self.combined_pattern_checks[pattern_name] = check
+            pattern_row3.addWidget(check)
+        pattern_row3.addStretch()
+        pattern_layout.addLayout(pattern_row3)
+        
         left_column.addWidget(pattern_group)
         
         # Sección de configuración de cuadrícula
@@ -1244,6 +1861,41 @@ function highlight(page, coordinates) {{
         grid_row4.addWidget(self.row_sizes_input, 1)
         grid_main_layout.addLayout(grid_row4)
         
+        self.grid_profiles_checkbox = QCheckBox('Cuadrícula por plantilla de página')
+        self.grid_profiles_checkbox.setChecked(True)
+        self.grid_profiles_checkbox.setStyleSheet('color: #94a3b8;')
+        self.grid_profiles_checkbox.setToolTip(
+            'Detecta la cuadrícula de cada tipo de hoja (tamaño y marco) una sola vez y la recuerda.\n'
+            'Las hojas del tipo sobre el que se dibujó o detectó la cuadrícula configurada arriba, y\n'
+            'las hojas sin marco con marcas, usan la cuadrícula configurada. Si se cambia esa\n'
+            'cuadrícula, los tipos de hoja recordados se vuelven a detectar.'
+        )
+        grid_row5 = QHBoxLayout()
+        grid_row5.addWidget(self.grid_profiles_checkbox)
+        grid_row5.addStretch()
+        self.reset_profiles_button = QPushButton()
+        self.reset_profiles_button.setToolTip('Olvida la cuadrícula recordada de cada tipo de hoja')
+        self.reset_profiles_button.setStyleSheet('''
+            QPushButton {
+                background-color: #334155;
+                color: #e2e8f0;
+                padding: 4px 10px;
+                border-radius: 4px;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #475569;
+            }
+            QPushButton:disabled {
+                background-color: #1e293b;
+                color: #64748b;
+            }
+        ''')
+        self.reset_profiles_button.clicked.connect(self.reset_grid_profiles)
+        grid_row5.addWidget(self.reset_profiles_button)
+        grid_main_layout.addLayout(grid_row5)
+        self.update_grid_profiles_button()
+        
         # Página a escanear (oculto, se mantiene para compatibilidad)
         self.scan_page_spinbox = QSpinBox()
         self.scan_page_spinbox.setRange(1, 999)
@@ -1421,6 +2073,32 @@ function highlight(page, coordinates) {{
         
         highlight_layout.addWidget(preview_frame)
         
+        # Aplicar el estilo a PDFs ya generados sin regenerarlos
+        self.restyle_button = QPushButton('🎨 Aplicar estilo a PDFs generados...')
+        self.restyle_button.setToolTip(
+            'Cambia el estilo del resaltado de los PDFs interactivos de una carpeta\n'
+            'sustituyendo solo su JavaScript (sin volver a generarlos)'
+        )
+        self.restyle_button.clicked.connect(self.restyle_interactive_pdfs)
+        self.restyle_button.setStyleSheet('''
+            QPushButton {
+                background-color: #334155;
+                color: #e2e8f0;
+                padding: 8px 16px;
+                font-weight: bold;
+                border-radius: 6px;
+                border: none;
+            }
+            QPushButton:hover {
+                background-color: #475569;
+            }
+            QPushButton:disabled {
+                background-color: #1e293b;
+                color: #64748b;
+            }
+        ''')
+        highlight_layout.addWidget(self.restyle_button)
+        
         # Conectar cambios de estilos al guardado automático
         self.color_combo.currentTextChanged.connect(self.update_style_preview)
         self.line_width_spinbox.valueChanged.connect(self.save_styles_config)
@@ -1436,8 +2114,13 @@ function highlight(page, coordinates) {{
         self.effect_combo.currentTextChanged.connect(self.save_styles_config)
         self.pattern_combo.currentTextChanged.connect(self.save_styles_config)
         self.custom_pattern_input.textChanged.connect(self.save_styles_config)
+        for check in self.combined_pattern_checks.values():
+            check.stateChanged.connect(self.save_styles_config)
         self.keep_original_name.stateChanged.connect(self.save_styles_config)
         self.disable_popups.stateChanged.connect(self.save_styles_config)
+        self.compact_links.stateChanged.connect(self.save_styles_config)
+        self.workers_spinbox.valueChanged.connect(self.save_styles_config)
+        self.grid_profiles_checkbox.stateChanged.connect(self.save_styles_config)
         
         right_column.addWidget(highlight_group)
         right_column.addStretch()
@@ -1450,9 +2133,8 @@ function highlight(page, coordinates) {{
         main_layout.addWidget(config_page)
         
         # Crear widgets ocultos para tabla y estadísticas (usados en diálogos)
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(['Referencia', 'Página', 'Columna', 'Fila', 'Contexto'])
+        self.reference_model = ReferenceTableModel(self.reference_store, self)
+        self.table = create_reference_view(self.reference_model)
         
         self.ref_count_label = QLabel('0 referencias')
         self.stats_text = QTextEdit()
@@ -1538,6 +2220,12 @@ function highlight(page, coordinates) {{
     
     def dropEvent(self, event):
         """Maneja cuando se sueltan archivos"""
+        # Durante la detección o la generación la lista no cambia (ver set_detection_running)
+        if self.detection_thread is not None or self.generation_thread is not None:
+            event.ignore()
+            self.reset_drop_zone()
+            return
+        
         urls = event.mimeData().urls()
         pdf_files = [url.toLocalFile() for url in urls 
                     if url.toLocalFile().lower().endswith('.pdf')]
@@ -1583,6 +2271,10 @@ function highlight(page, coordinates) {{
             
             # Cargar configuración de cuadrícula
             self.load_saved_grid_config()
+            
+            # Preseleccionar el estilo con una muestra de páginas (salvo el personalizado)
+            if self.current_pattern != 'Personalizado':
+                self.autodetect_pattern(quiet=True)
     
     def update_pdf_count(self):
         """Actualiza el contador de PDFs"""
@@ -1601,13 +2293,14 @@ function highlight(page, coordinates) {{
         """Limpia la lista de PDFs"""
         self.pdf_paths.clear()
         self.pdf_list.clear()
-        self.all_references.clear()
-        self.references.clear()
+        self.reference_store.clear()
+        self.generated_outputs.clear()
         self.pdf_path = None
         self.update_pdf_count()
         self.detect_button.setEnabled(False)
         self.generate_button.setEnabled(False)
-        self.table.setRowCount(0)
+        self.retarget_button.setEnabled(False)
+        self.reference_model.refresh(False)
         self.ref_count_label.setText('0 referencias')
         self.statusBar().showMessage('Lista de PDFs limpiada')
     
@@ -1618,11 +2311,14 @@ function highlight(page, coordinates) {{
             file_path = item.data(Qt.UserRole)
             if file_path in self.pdf_paths:
                 self.pdf_paths.remove(file_path)
-            if file_path in self.all_references:
-                del self.all_references[file_path]
+            # Solo se quitan sus filas; el resto de referencias sigue detectado
+            self.reference_model.remove_pdf(file_path)
+            self.generated_outputs.pop(file_path, None)
             self.pdf_list.takeItem(self.pdf_list.row(item))
         
         self.update_pdf_count()
+        self.refresh_statistics()
+        self.retarget_button.setEnabled(bool(self.generated_outputs))
         
         if not self.pdf_paths:
             self.detect_button.setEnabled(False)
@@ -1630,6 +2326,7 @@ function highlight(page, coordinates) {{
             self.pdf_path = None
         else:
             self.pdf_path = self.pdf_paths[0]
+            self.generate_button.setEnabled(len(self.reference_store) > 0)
         
         self.statusBar().showMessage(f'{len(selected_items)} PDF(s) eliminado(s)')
         
@@ -1654,8 +2351,11 @@ function highlight(page, coordinates) {{
         if not os.path.exists(config_path):
             # Resetear estado si no hay configuración
             self.grid_detected = False
+            self.grid_template = None
             self.column_positions = []
             self.row_positions = []
+            self.column_labels = []
+            self.row_labels = []
             self.config_status.setText('○ Sin configuración')
             self.config_status.setStyleSheet('color: #94a3b8; font-size: 12px;')
             return
@@ -1664,49 +2364,19 @@ function highlight(page, coordinates) {{
             with open(config_path, 'r', encoding='utf-8') as f:
                 config_data = json.load(f)
             
-            # Cargar posiciones exactas
+            # Cargar posiciones exactas (y nombres de las celdas, si se detectaron)
             self.column_positions = config_data.get('column_lines', [])
             self.row_positions = config_data.get('row_lines', [])
+            self.column_labels = config_data.get('column_labels', [])
+            self.row_labels = config_data.get('row_labels', [])
             self.grid_detected = len(self.column_positions) > 1 and len(self.row_positions) > 1
+            self.grid_template = config_data.get('template')
             
             if self.grid_detected:
                 # Actualizar interfaz
                 num_cols = len(self.column_positions) - 1
                 num_rows = len(self.row_positions) - 1
-                self.cols_spinbox.setValue(num_cols)
-                self.rows_spinbox.setValue(num_rows)
-                
-                # Calcular tamaños relativos de columnas
-                col_widths = []
-                for i in range(len(self.column_positions) - 1):
-                    col_widths.append(self.column_positions[i + 1] - self.column_positions[i])
-                if col_widths:
-                    min_width = min(col_widths)
-                    if min_width > 0:
-                        relative_cols = [round(w / min_width, 2) for w in col_widths]
-                        self.col_sizes_input.setText(','.join(str(s) for s in relative_cols))
-                
-                # Calcular tamaños relativos de filas
-                row_heights = []
-                for i in range(len(self.row_positions) - 1):
-                    row_heights.append(self.row_positions[i + 1] - self.row_positions[i])
-                if row_heights:
-                    min_height = min(row_heights)
-                    if min_height > 0:
-                        relative_rows = [round(h / min_height, 2) for h in row_heights]
-                        self.row_sizes_input.setText(','.join(str(s) for s in relative_rows))
-                
-                # Calcular márgenes
-                page_width = config_data.get('page_width', 0)
-                page_height = config_data.get('page_height', 0)
-                
-                if page_width > 0 and self.column_positions:
-                    margin_left_pct = int((self.column_positions[0] / page_width) * 100)
-                    self.margin_left_spinbox.setValue(max(0, min(margin_left_pct, 30)))
-                
-                if page_height > 0 and self.row_positions:
-                    margin_top_pct = int((self.row_positions[0] / page_height) * 100)
-                    self.margin_top_spinbox.setValue(max(0, min(margin_top_pct, 30)))
+                self.update_grid_inputs(config_data.get('page_width', 0), config_data.get('page_height', 0))
                 
                 self.statusBar().showMessage(
                     f'✅ Configuración cargada: {num_cols} columnas × {num_rows} filas (cuadrantes exactos)'
@@ -1737,6 +2407,42 @@ function highlight(page, coordinates) {{
         # Cargar configuración de estilos
         self.load_styles_config()
     
+    def update_grid_inputs(self, page_width, page_height):
+        """Ajusta columnas, filas, tamaños relativos y márgenes a las posiciones exactas"""
+        num_cols = len(self.column_positions) - 1
+        num_rows = len(self.row_positions) - 1
+        self.cols_spinbox.setValue(num_cols)
+        self.rows_spinbox.setValue(num_rows)
+        
+        # Calcular tamaños relativos de columnas
+        col_widths = []
+        for i in range(len(self.column_positions) - 1):
+            col_widths.append(self.column_positions[i + 1] - self.column_positions[i])
+        if col_widths:
+            min_width = min(col_widths)
+            if min_width > 0:
+                relative_cols = [round(w / min_width, 2) for w in col_widths]
+                self.col_sizes_input.setText(','.join(str(s) for s in relative_cols))
+        
+        # Calcular tamaños relativos de filas
+        row_heights = []
+        for i in range(len(self.row_positions) - 1):
+            row_heights.append(self.row_positions[i + 1] - self.row_positions[i])
+        if row_heights:
+            min_height = min(row_heights)
+            if min_height > 0:
+                relative_rows = [round(h / min_height, 2) for h in row_heights]
+                self.row_sizes_input.setText(','.join(str(s) for s in relative_rows))
+        
+        # Calcular márgenes
+        if page_width > 0 and self.column_positions:
+            margin_left_pct = int((self.column_positions[0] / page_width) * 100)
+            self.margin_left_spinbox.setValue(max(0, min(margin_left_pct, 30)))
+        
+        if page_height > 0 and self.row_positions:
+            margin_top_pct = int((self.row_positions[0] / page_height) * 100)
+            self.margin_top_spinbox.setValue(max(0, min(margin_top_pct, 30)))
+    
     def load_styles_config(self):
         """Carga la configuración de estilos guardada"""
         app_dir = get_app_path()
@@ -1756,6 +2462,9 @@ function highlight(page, coordinates) {{
                     self.pattern_combo.setCurrentIndex(idx)
             if 'custom_pattern' in config:
                 self.custom_pattern_input.setText(config['custom_pattern'])
+            for pattern_name in config.get('combined_patterns', []):
+                if pattern_name in self.combined_pattern_checks:
+                    self.combined_pattern_checks[pattern_name].setChecked(True)
             
             # Cargar estilos del rectángulo
             if 'rect_color' in config:
@@ -1804,20 +2513,37 @@ function highlight(page, coordinates) {{
                 self.keep_original_name.setChecked(config['keep_original_name'])
             if 'disable_popups' in config:
                 self.disable_popups.setChecked(config['disable_popups'])
+            if 'link_layout' in config:
+                self.compact_links.setChecked(config['link_layout'] == LINK_LAYOUT_COMPACT)
+            if 'detection_workers' in config:
+                self.workers_spinbox.setValue(config['detection_workers'])
+            if 'grid_profiles' in config:
+                self.grid_profiles_checkbox.setChecked(config['grid_profiles'])
+            if isinstance(config.get('text_regions'), dict):
+                self.text_regions_config = config['text_regions']
+            if 'editor_cache_mb' in config:
+                self.render_cache.set_limit(config['editor_cache_mb'])
+            if 'pattern_time_budget' in config:
+                self.pattern_time_budget = float(config['pattern_time_budget'])
             
             self.update_style_preview()
             
         except Exception as e:
             print(f'Error al cargar estilos: {e}')
     
-    def save_styles_config(self):
-        """Guarda la configuración de estilos"""
-        app_dir = get_app_path()
-        config_path = os.path.join(app_dir, 'styles_config.json')
-        
-        config = {
+    def get_text_regions(self):
+        """Zonas de extracción de texto (ver text_regions) según styles_config.json"""
+        return TextRegions(self.text_regions_config)
+    
+    def get_style_settings(self):
+        """Configuración de estilos actual (mismas claves que styles_config.json)"""
+        return {
             'pattern': self.pattern_combo.currentText(),
             'custom_pattern': self.custom_pattern_input.text(),
+            'combined_patterns': [
+                pattern_name for pattern_name, check in self.combined_pattern_checks.items()
+                if check.isChecked()
+            ],
             'rect_color': self.color_combo.currentText(),
             'line_width': self.line_width_spinbox.value(),
             'line_style': self.line_style_combo.currentText(),
@@ -1831,8 +2557,21 @@ function highlight(page, coordinates) {{
             'rect_margin': self.rect_margin_spinbox.value(),
             'effect': self.effect_combo.currentText(),
             'keep_original_name': self.keep_original_name.isChecked(),
-            'disable_popups': self.disable_popups.isChecked()
+            'disable_popups': self.disable_popups.isChecked(),
+            'link_layout': LINK_LAYOUT_COMPACT if self.compact_links.isChecked() else LINK_LAYOUT_INLINE,
+            'detection_workers': self.workers_spinbox.value(),
+            'grid_profiles': self.grid_profiles_checkbox.isChecked(),
+            'text_regions': self.text_regions_config,
+            'editor_cache_mb': self.render_cache.limit_bytes // (1024 * 1024),
+            'pattern_time_budget': self.pattern_time_budget
         }
+    
+    def save_styles_config(self):
+        """Guarda la configuración de estilos"""
+        app_dir = get_app_path()
+        config_path = os.path.join(app_dir, 'styles_config.json')
+        
+        config = self.get_style_settings()
         
         try:
             with open(config_path, 'w', encoding='utf-8') as f:
@@ -1858,6 +2597,10 @@ function highlight(page, coordinates) {{
             pattern_info = self.REFERENCE_PATTERNS.get(pattern_name, {})
             self.pattern_example.setText(pattern_info.get('example', ''))
         
+        # El estilo elegido ya se busca: no se puede marcar como adicional
+        for name, check in self.combined_pattern_checks.items():
+            check.setEnabled(name != pattern_name)
+        
         self.statusBar().showMessage(f'Patrón seleccionado: {pattern_name}')
     
     def on_custom_pattern_changed(self, text):
@@ -1866,7 +2609,7 @@ function highlight(page, coordinates) {{
         
         if text:
             # Convertir formato simple a regex y mostrar preview
-            regex, example, valid = self.convert_simple_pattern_to_regex(text)
+            regex, example, valid = convert_simple_pattern_to_regex(text)
             if valid:
                 self.pattern_preview_label.setText(f'✓ Detectará: {example}')
                 self.pattern_preview_label.setStyleSheet('''
@@ -1886,49 +2629,6 @@ function highlight(page, coordinates) {{
         else:
             self.pattern_preview_label.setText('')
     
-    def convert_simple_pattern_to_regex(self, simple_pattern):
-        """
-        Convierte un patrón simple con placeholders a regex.
-        
-        Placeholders soportados:
-        - {P} = Página (número)
-        - {C} = Columna (número)  
-        - {F} = Fila (letra A-Z)
-        
-        Ejemplo: /{P}.{C}-{F} → \/(\d+)\.(\d+)-([A-Z])
-        """
-        import re
-        
-        # Detectar si usa placeholders simples
-        has_placeholders = any(p in simple_pattern.upper() for p in ['{P}', '{C}', '{F}', '{PAG}', '{COL}', '{FILA}'])
-        
-        if has_placeholders:
-            # Convertir a regex
-            regex = simple_pattern
-            
-            # Escapar caracteres especiales de regex primero (excepto los placeholders)
-            special_chars = ['\\', '.', '^', '$', '*', '+', '?', '[', ']', '(', ')', '|']
-            for char in special_chars:
-                # No escapar si está dentro de un placeholder
-                regex = regex.replace(char, '\\' + char)
-            
-            # Reemplazar placeholders por grupos de captura
-            # Orden de grupos según aparición
-            regex = re.sub(r'\{P\}|\{PAG\}|\{PAGINA\}', r'(\\d+)', regex, flags=re.IGNORECASE)
-            regex = re.sub(r'\{C\}|\{COL\}|\{COLUMNA\}', r'(\\d+)', regex, flags=re.IGNORECASE)
-            regex = re.sub(r'\{F\}|\{FILA\}', r'([A-Z])', regex, flags=re.IGNORECASE)
-            
-            # Generar ejemplo
-            example = simple_pattern
-            example = re.sub(r'\{P\}|\{PAG\}|\{PAGINA\}', '5', example, flags=re.IGNORECASE)
-            example = re.sub(r'\{C\}|\{COL\}|\{COLUMNA\}', '3', example, flags=re.IGNORECASE)
-            example = re.sub(r'\{F\}|\{FILA\}', 'A', example, flags=re.IGNORECASE)
-            
-            return regex, example, True
-        else:
-            # Asumir que es un regex directo
-            return simple_pattern, simple_pattern, False
-    
     def update_style_preview(self, color_name=None):
         """Actualiza el preview del estilo del rectángulo y guarda configuración"""
         if color_name is None:
@@ -1976,7 +2676,7 @@ function highlight(page, coordinates) {{
         header.addWidget(title)
         header.addStretch()
         
-        count_label = QLabel(f'{len(self.references)} referencias')
+        count_label = QLabel(f'{len(self.reference_store)} referencias')
         count_label.setStyleSheet('''
             color: #10b981;
             font-size: 14px;
@@ -1988,21 +2688,13 @@ function highlight(page, coordinates) {{
         header.addWidget(count_label)
         layout.addLayout(header)
         
-        # Tabla
-        table = QTableWidget()
-        if len(self.pdf_paths) > 1:
-            table.setColumnCount(6)
-            table.setHorizontalHeaderLabels(['PDF', 'Referencia', 'Página', 'Columna', 'Fila', 'Contexto'])
-        else:
-            table.setColumnCount(5)
-            table.setHorizontalHeaderLabels(['Referencia', 'Página', 'Columna', 'Fila', 'Contexto'])
-        
-        table.setRowCount(len(self.references))
+        # Tabla (vista sobre el modelo compartido, con su propia ordenación)
+        table = create_reference_view(self.reference_model)
         table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        table.horizontalHeader().setSectionResizeMode(table.columnCount() - 1, QHeaderView.Stretch)
+        table.horizontalHeader().setSectionResizeMode(table.model().columnCount() - 1, QHeaderView.Stretch)
         table.setAlternatingRowColors(True)
         table.setStyleSheet('''
-            QTableWidget {
+            QTableView {
                 background-color: #1e293b;
                 alternate-background-color: #0f172a;
                 border: 1px solid #334155;
@@ -2018,29 +2710,6 @@ function highlight(page, coordinates) {{
             }
         ''')
         
-        for row, ref in enumerate(self.references):
-            col_offset = 0
-            if len(self.pdf_paths) > 1:
-                pdf_name = ref.get('pdf_name', 'Unknown')
-                if len(pdf_name) > 25:
-                    pdf_name = pdf_name[:22] + '...'
-                table.setItem(row, 0, QTableWidgetItem(pdf_name))
-                col_offset = 1
-            
-            ref_text = ref['full']
-            if ref.get('instance', 1) > 1:
-                ref_text += f" (#{ref['instance']})"
-            
-            table.setItem(row, col_offset + 0, QTableWidgetItem(ref_text))
-            table.setItem(row, col_offset + 1, QTableWidgetItem(ref['page']))
-            table.setItem(row, col_offset + 2, QTableWidgetItem(ref['column']))
-            table.setItem(row, col_offset + 3, QTableWidgetItem(ref['row']))
-            
-            context_text = ref['context']
-            if ref.get('coordinates'):
-                context_text += f" [Pág PDF: {ref['pdf_page']+1}]"
-            table.setItem(row, col_offset + 4, QTableWidgetItem(context_text))
-        
         layout.addWidget(table)
         
         # Botón cerrar
@@ -2120,53 +2789,6 @@ function highlight(page, coordinates) {{
         
         dialog.exec_()
     
-    def get_highlight_color(self):
-        """Obtiene el color de resaltado seleccionado para JavaScript"""
-        color_map = {
-            'Rojo': 'color.red',
-            'Verde': 'color.green',
-            'Azul': 'color.blue',
-            'Amarillo': 'color.yellow',
-            'Naranja': '["RGB", 0.976, 0.451, 0.086]',
-            'Magenta': 'color.magenta',
-            'Cian': 'color.cyan'
-        }
-        return color_map.get(self.color_combo.currentText(), 'color.red')
-    
-    def get_fill_color(self):
-        """Obtiene el color de relleno seleccionado para JavaScript"""
-        fill_color_name = self.fill_color_combo.currentText()
-        
-        if fill_color_name == 'Mismo que borde':
-            return self.get_highlight_color()
-        
-        color_map = {
-            'Rojo': 'color.red',
-            'Verde': 'color.green',
-            'Azul': 'color.blue',
-            'Amarillo': 'color.yellow',
-            'Naranja': '["RGB", 0.976, 0.451, 0.086]',
-            'Magenta': 'color.magenta',
-            'Cian': 'color.cyan',
-            'Blanco': 'color.white',
-            'Negro': 'color.black'
-        }
-        return color_map.get(fill_color_name, 'color.red')
-    
-    def get_blink_speed(self):
-        """Obtiene la velocidad de parpadeo en milisegundos"""
-        speed_map = {
-            'Rápido': 300,
-            'Normal': 500,
-            'Lento': 800,
-            'Sin parpadeo': 0
-        }
-        return speed_map.get(self.blink_speed_combo.currentText(), 500)
-    
-    def get_highlight_duration(self):
-        """Obtiene la duración del resaltado en milisegundos"""
-        return self.duration_spinbox.value() * 1000
-    
     def update_rows_info(self, value):
         """Actualiza la información de filas según el valor del spinbox"""
         if value <= 26:
@@ -2175,6 +2797,35 @@ function highlight(page, coordinates) {{
         else:
             self.rows_info_label.setText(f'(A-Z + {value - 26})')
     
+    def update_grid_profiles_button(self):
+        """Muestra cuántos tipos de hoja tienen la cuadrícula recordada"""
+        count = GridProfiles.saved_count(os.path.join(get_app_path(), GRID_PROFILES_FILE))
+        self.reset_profiles_button.setText(f'🗑 Olvidar plantillas ({count})')
+        self.reset_profiles_button.setEnabled(count > 0)
+    
+    def reset_grid_profiles(self):
+        """Borra los perfiles de cuadrícula guardados (grid_profiles.json)"""
+        profiles_path = os.path.join(get_app_path(), GRID_PROFILES_FILE)
+        count = GridProfiles.saved_count(profiles_path)
+        reply = QMessageBox.question(
+            self,
+            'Olvidar plantillas',
+            f'Se olvidará la cuadrícula de {count} tipo(s) de hoja. En la próxima generación '
+            f'se volverán a detectar.\n\n¿Continuar?',
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            os.remove(profiles_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            QMessageBox.warning(self, 'Error', f'No se pudo borrar {GRID_PROFILES_FILE}:\n{e}')
+        self.update_grid_profiles_button()
+        self.statusBar().showMessage('🗑 Plantillas de cuadrícula olvidadas')
+    
     def open_visual_editor(self):
         """
         Abre el editor visual para dibujar manualmente la cuadrícula.
@@ -2186,7 +2837,7 @@ function highlight(page, coordinates) {{
             return
         
         # Crear y mostrar el diálogo del editor
-        dialog = GridEditorDialog(self, self.pdf_path)
+        dialog = GridEditorDialog(self, self.pdf_path, render_cache=self.render_cache)
         
         if dialog.exec_() == QDialog.Accepted:
             # Obtener los datos de la cuadrícula
@@ -2208,7 +2859,10 @@ function highlight(page, coordinates) {{
             # Guardar las posiciones para usarlas en el resaltado
             self.column_positions = col_positions
             self.row_positions = row_positions
+            self.column_labels = []
+            self.row_labels = []
             self.grid_detected = True
+            self.grid_template = grid_data['template']
             
             # Calcular número de columnas y filas (cuadrantes = líneas - 1)
             num_cols = len(col_positions) - 1
@@ -2269,15 +2923,58 @@ function highlight(page, coordinates) {{
                 f'• Posiciones exactas guardadas\n\n'
                 f'El rectángulo de resaltado cubrirá exactamente cada cuadrante.')
     
+    def autodetect_pattern(self, quiet=False):
+        """
+        Elige el estilo de referencia con más coincidencias válidas en una
+        muestra de páginas de los PDFs cargados (ver style_sampling).
+        Con quiet no se muestran avisos (preselección al añadir PDFs).
+        """
+        if not self.pdf_paths:
+            if not quiet:
+                QMessageBox.warning(self, 'Aviso', 'No hay PDFs cargados.')
+            return
+        # PyMuPDF no se usa desde este hilo mientras lo usa la detección o la generación
+        if self.detection_thread is not None or self.generation_thread is not None:
+            return
+        
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            ranking, sampled = score_styles(
+                self.pdf_paths, GridModel(self.get_grid_settings()), regions=self.get_text_regions(),
+                analysis=self.page_analysis
+            )
+        finally:
+            QApplication.restoreOverrideCursor()
+        
+        detected = best_style(ranking)
+        if detected is None:
+            message = f'No se reconoce ningún estilo en {sampled} página(s) de muestra'
+            if quiet:
+                self.statusBar().showMessage(message)
+            else:
+                QMessageBox.information(self, 'Estilo de Referencias', message + '.')
+            return
+        
+        self.pattern_combo.setCurrentText(detected)
+        self.statusBar().showMessage(
+            f'🔍 Estilo detectado: {detected} ({sampled} páginas de muestra; válidas/total: {format_ranking(ranking)})'
+        )
+    
     def autodetect_grid(self):
         """
         Analiza el PDF para detectar automáticamente la cuadrícula del esquema.
-        Busca los números de columna (0, 1, 2...) y letras de fila (A, B, C...)
-        en los bordes del cajetín del esquema eléctrico.
+        
+        Primero lee las marcas del marco en la geometría vectorial de la página
+        (ver grid_detection), que da los bordes exactos de cada cuadrante. Si
+        la página no tiene un marco con marcas, busca los números de columna
+        (0, 1, 2...) y letras de fila (A, B, C...) en los bordes del cajetín.
         """
         if not self.pdf_path:
             QMessageBox.warning(self, 'Aviso', 'Primero debes seleccionar un archivo PDF.')
             return
+        # PyMuPDF no se usa desde este hilo mientras lo usa la detección o la generación
+        if self.detection_thread is not None or self.generation_thread is not None:
+            return
         
         self.statusBar().showMessage('Analizando cuadrícula del PDF...')
         
@@ -2307,6 +3004,20 @@ function highlight(page, coordinates) {{
             # Usar la página seleccionada para detectar la cuadrícula
             page = doc[selected_page]
             self.statusBar().showMessage(f'Analizando página {selected_page + 1} de {len(doc)}...')
+            self.page_analysis.note_document(self.pdf_path, doc)
+            regions = self.get_text_regions()
+            
+            # Marcas del marco (geometría vectorial): bordes exactos de los cuadrantes
+            segments = self.page_analysis.page_labels(
+                self.pdf_path, selected_page, None, 'segments', lambda: extract_segments(page)
+            )
+            grid_data = detect_grid_from_drawings(page, segments)
+            if grid_data is not None:
+                grid_data['template'] = page_fingerprint(page, segments)
+                total_pages = len(doc)
+                doc.close()
+                self.apply_detected_grid(grid_data, selected_page, total_pages)
+                return
             rect = page.rect
             width = rect.width
             height = rect.height
@@ -2327,8 +3038,10 @@ function highlight(page, coordinates) {{
             right_zone = width * 0.96     # 96% derecho (donde están A,B,C...)
             left_zone = width * 0.04      # 4% izquierdo
             
-            # Obtener TODAS las palabras del documento
-            words = page.get_text("words")
+            # Obtener solo las palabras de las franjas del borde (superior y derecha)
+            words = self.page_analysis.page_labels(
+                self.pdf_path, selected_page, regions, 'words', lambda: regions.label_words(page)
+            )
             
             # Analizar cada palabra
             for word in words:
@@ -2385,8 +3098,9 @@ function highlight(page, coordinates) {{
                         if letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ' and item['x'] > right_zone_expanded:
                             row_labels.append((item['y'], letter))
             
-            # Guardar número de páginas antes de cerrar
+            # Guardar número de páginas y plantilla antes de cerrar
             total_pages = len(doc)
+            template = page_fingerprint(page, segments)
             doc.close()
             
             # Procesar columnas: eliminar duplicados y ordenar
@@ -2479,8 +3193,13 @@ function highlight(page, coordinates) {{
             else:
                 self.row_positions = []
             
+            # Las etiquetas se usan como centros, no como nombres de celdas
+            self.column_labels = []
+            self.row_labels = []
+            
             # Marcar que se detectó la cuadrícula
             self.grid_detected = len(self.column_positions) > 1 and len(self.row_positions) > 1
+            self.grid_template = template
             
             # Aplicar los valores detectados a la interfaz
             self.cols_spinbox.setValue(num_cols)
@@ -2541,6 +3260,44 @@ function highlight(page, coordinates) {{
             QMessageBox.critical(self, 'Error', error_msg)
             self.statusBar().showMessage('Error al detectar cuadrícula')
     
+    def apply_detected_grid(self, grid_data, selected_page, total_pages):
+        """Aplica la cuadrícula detectada en el marco (ver grid_detection)"""
+        self.column_positions = grid_data['column_lines']
+        self.row_positions = grid_data['row_lines']
+        self.column_labels = grid_data['column_labels']
+        self.row_labels = grid_data['row_labels']
+        self.grid_detected = True
+        self.grid_template = grid_data['template']
+        self.update_grid_inputs(grid_data['page_width'], grid_data['page_height'])
+        
+        num_cols = len(self.column_positions) - 1
+        num_rows = len(self.row_positions) - 1
+        self.config_status.setText(f'● {num_cols}×{num_rows} cuadrantes')
+        self.config_status.setStyleSheet('''
+            color: #10b981;
+            font-size: 12px;
+            font-weight: bold;
+            background: transparent;
+            padding: 4px 10px;
+            border: 1px solid #10b981;
+            border-radius: 4px;
+        ''')
+        
+        cols_info = ', '.join(label or '?' for label in self.column_labels)
+        rows_info = ', '.join(label or '?' for label in self.row_labels)
+        
+        msg = f"Cuadrícula detectada desde las marcas del marco:\n"
+        msg += f"📄 Página escaneada: {selected_page + 1} de {total_pages}\n\n"
+        msg += f"📊 Columnas: {cols_info}\n"
+        msg += f"   Total: {num_cols} columnas\n\n"
+        msg += f"📊 Filas: {rows_info}\n"
+        msg += f"   Total: {num_rows} filas\n\n"
+        msg += "✅ Valores aplicados automáticamente.\n"
+        msg += "✅ Se usarán los CUADRANTES EXACTOS para el resaltado."
+        
+        QMessageBox.information(self, 'Detección de Cuadrícula', msg)
+        self.statusBar().showMessage(f'Cuadrícula detectada: {num_cols} columnas, {num_rows} filas')
+    
     def filter_close_lines(self, lines, min_distance):
         """Filtra líneas que están muy cerca entre sí, manteniendo solo una"""
         if not lines:
@@ -2589,27 +3346,6 @@ function highlight(page, coordinates) {{
         row_example = ','.join(['1'] * rows)
         self.row_sizes_input.setPlaceholderText(f'Ej: {row_example} (dejar vacío para iguales)')
     
-    def parse_sizes(self, sizes_text, count):
-        """Parsea los tamaños desde el texto y devuelve una lista de proporciones"""
-        if not sizes_text.strip():
-            # Si está vacío, todos iguales
-            return [1.0] * count
-        
-        try:
-            sizes = [float(s.strip()) for s in sizes_text.split(',') if s.strip()]
-            
-            # Si hay menos valores que elementos, rellenar con 1
-            while len(sizes) < count:
-                sizes.append(1.0)
-            
-            # Si hay más valores, truncar
-            sizes = sizes[:count]
-            
-            return sizes
-        except ValueError:
-            # Si hay error, todos iguales
-            return [1.0] * count
-    
     def calculate_position_with_sizes(self, index, sizes, total_size, margin_start):
         """
         Calcula la posición central de un elemento dado sus tamaños variables.
@@ -2663,6 +3399,11 @@ Ejemplos: A1/25, B5/10, C12/3</p>
 Formato: (página-fila-columna)<br>
 Ejemplos: (1-A-0), (10-B-5), (3-C-12)</p>
 
+<p><b>Varios estilos a la vez:</b> marca en <i>Además</i> los estilos que
+aparecen junto al elegido (planos de distintos proveedores). Todos se buscan
+en una sola pasada por página; si dos coinciden en el mismo texto, gana la
+coincidencia más larga.</p>
+
 <hr>
 
 <h4>🆕 Patrón Personalizado (Fácil):</h4>
@@ -2733,307 +3474,326 @@ Ejemplos: (1-A-0), (10-B-5), (3-C-12)</p>
     
     def get_current_pattern(self):
         """Obtiene el patrón regex actual según la selección"""
-        if self.current_pattern == 'Personalizado':
-            if not self.custom_pattern:
-                return None
-            # Convertir patrón simple a regex si usa placeholders
-            regex, _, has_placeholders = self.convert_simple_pattern_to_regex(self.custom_pattern)
-            return regex
-        else:
-            return self.REFERENCE_PATTERNS.get(self.current_pattern, {}).get('pattern', '')
+        return resolve_pattern(self.current_pattern, self.custom_pattern)[0]
     
     def get_pattern_groups_order(self):
         """Obtiene el orden de los grupos según el patrón seleccionado"""
-        if self.current_pattern == 'Personalizado' and self.custom_pattern:
-            # Determinar orden de grupos basándose en la posición de los placeholders
-            import re
-            pattern_upper = self.custom_pattern.upper()
-            
-            # Encontrar posiciones de cada placeholder
-            groups = []
-            
-            # Buscar todas las ocurrencias de placeholders
-            p_match = re.search(r'\{P\}|\{PAG\}|\{PAGINA\}', pattern_upper)
-            c_match = re.search(r'\{C\}|\{COL\}|\{COLUMNA\}', pattern_upper)
-            f_match = re.search(r'\{F\}|\{FILA\}', pattern_upper)
-            
-            # Ordenar por posición
-            placeholders = []
-            if p_match:
-                placeholders.append((p_match.start(), 'página'))
-            if c_match:
-                placeholders.append((c_match.start(), 'columna'))
-            if f_match:
-                placeholders.append((f_match.start(), 'fila'))
-            
-            placeholders.sort(key=lambda x: x[0])
-            groups = tuple(p[1] for p in placeholders)
-            
-            return groups if groups else ('página', 'columna', 'fila')
-        else:
-            pattern_info = self.REFERENCE_PATTERNS.get(self.current_pattern, {})
-            return pattern_info.get('groups', ('página', 'columna', 'fila'))
+        return resolve_pattern(self.current_pattern, self.custom_pattern)[1]
+    
+    def get_pattern_names(self):
+        """Estilos que se detectan: el seleccionado y los marcados en 'Además'"""
+        return [self.current_pattern] + [
+            pattern_name for pattern_name, check in self.combined_pattern_checks.items()
+            if check.isChecked() and pattern_name != self.current_pattern
+        ]
             
+    def preflight_custom_pattern(self):
+        """
+        Prueba el regex personalizado con una muestra de páginas y con textos
+        repetitivos antes de la detección completa (ver regex_guard).
+        Devuelve False si es lento y el usuario decide no seguir.
+        """
+        regex, groups_order = resolve_pattern('Personalizado', self.custom_pattern)
+        budget = self.pattern_time_budget
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            samples = list(sample_page_texts(self.pdf_paths, self.get_text_regions(), max_pdfs=4, pages_per_pdf=4,
+                                             analysis=self.page_analysis))
+            texts = [text for _, _, _, text in samples] + stress_texts(regex)
+            warning = preflight_warning(preflight_pattern(regex, groups_order, texts, budget), samples, budget)
+        except Exception as e:
+            print(f'Error al probar el patrón personalizado: {e}')
+            return True
+        finally:
+            QApplication.restoreOverrideCursor()
+        
+        if warning is None:
+            return True
+        
+        reply = QMessageBox.question(
+            self,
+            'Patrón lento',
+            f'{warning}.\n\n'
+            f'Puede tener retroceso catastrófico (repeticiones anidadas como (\\w+\\s?)+). '
+            f'Las páginas que superen el tiempo límite se saltarán y se indicarán al terminar.\n\n'
+            f'¿Continuar con la detección?',
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        return reply == QMessageBox.Yes
+    
     def detect_references(self):
-        """Detecta todas las referencias en todos los PDFs"""
-        if not self.pdf_paths:
-            QMessageBox.warning(self, 'Aviso', 'No hay PDFs cargados.')
+        """Detecta todas las referencias en todos los PDFs (en segundo plano)"""
+        if self.detection_thread is not None:
             return
         
-        # Obtener el patrón actual
-        pattern = self.get_current_pattern()
-        if not pattern:
-            QMessageBox.warning(self, 'Aviso', 'Por favor, introduce un patrón regex válido.')
+        if not self.pdf_paths:
+            QMessageBox.warning(self, 'Aviso', 'No hay PDFs cargados.')
             return
         
-        # Validar el patrón regex
+        # Obtener y validar los patrones (varios estilos se buscan en una sola pasada)
+        pattern_names = self.get_pattern_names()
         try:
-            re.compile(pattern)
+            pattern, groups_order = detection_pattern(
+                pattern_names, self.custom_pattern, time_budget=self.pattern_time_budget
+            )
         except re.error as e:
             QMessageBox.critical(self, 'Error', f'Patrón regex inválido:\n{str(e)}')
             return
+        if pattern is None:
+            QMessageBox.warning(self, 'Aviso', 'Por favor, introduce un patrón regex válido.')
+            return
+        
+        # Los regex escritos a mano se prueban antes con una muestra (ver regex_guard)
+        if uses_raw_regex(pattern_names, self.custom_pattern) and not self.preflight_custom_pattern():
+            return
         
-        # Calcular el total de páginas de todos los PDFs para la barra de progreso
-        total_pages = 0
-        pdf_page_counts = {}
-        for pdf_path in self.pdf_paths:
-            try:
-                temp_doc = fitz.open(pdf_path)
-                pdf_page_counts[pdf_path] = len(temp_doc)
-                total_pages += len(temp_doc)
-                temp_doc.close()
-            except Exception:
-                pdf_page_counts[pdf_path] = 0
-        
-        # Diálogo de progreso con total de páginas
-        progress = QProgressDialog('Iniciando análisis...', 'Cancelar', 0, total_pages, self)
-        progress.setWindowModality(Qt.WindowModal)
+        # Diálogo de progreso (no modal: la ventana sigue respondiendo)
+        progress = QProgressDialog('Iniciando análisis...', 'Cancelar', 0, 0, self)
         progress.setWindowTitle('Detectando Referencias')
         progress.setMinimumDuration(0)  # Mostrar inmediatamente
         progress.setMinimumWidth(400)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
         progress.setValue(0)
+        self.detection_progress = progress
+        
+        # Solo se analizan los PDFs nuevos o modificados, o todos si cambian
+        # el patrón o las zonas de extracción; las filas de los demás se conservan
+        store = self.reference_store
+        regions = self.get_text_regions()
+        self.detection_key = (pattern.cache_key(groups_order), regions)
+        self.detection_signatures = {pdf_path: file_signature(pdf_path) for pdf_path in self.pdf_paths}
+        pending = [
+            pdf_path for pdf_path in self.pdf_paths
+            if not store.is_current(pdf_path, (self.detection_signatures[pdf_path], self.detection_key))
+        ]
+        for pdf_path in store.detected_pdfs():
+            if pdf_path in pending or pdf_path not in self.pdf_paths:
+                self.reference_model.remove_pdf(pdf_path)
+                # Sus referencias cambian: los enlaces generados ya no corresponden
+                self.generated_outputs.pop(pdf_path, None)
+        if not store.detected_pdfs():
+            store.clear()
+            self.generated_outputs.clear()
+            self.reference_model.refresh(False)
+        store.text_regions = regions
+        self.detection_pending = len(pending)
+        self.detection_current_pdf = ('', 0)
+        self.detection_timeouts = []
+        self.detection_failures = []
+        self.detection_error = None
+        
+        if not pending:
+            progress.close()
+            self.detection_progress = None
+            self.statusBar().showMessage(
+                f'✅ Sin cambios: {len(store)} referencias en {len(self.pdf_paths)} PDF(s) ya detectadas'
+            )
+            return
         
-        # Forzar que se muestre la ventana
-        QApplication.processEvents()
+        # Token de cancelación compartido con el hilo de detección
+        self.detection_cancel = threading.Event()
+        progress.canceled.connect(self.detection_cancel.set)
         
-        self.table.setRowCount(0)
-        self.references = []
-        self.all_references = {}
+        worker = DetectionWorker(
+            pending, pattern, groups_order, self.detection_cancel,
+            workers=self.workers_spinbox.value(),
+            cache_path=os.path.join(get_app_path(), CACHE_FILE_NAME),
+            regions=regions, analysis=self.page_analysis
+        )
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.pdf_started.connect(self.on_detection_pdf_started)
+        worker.page_done.connect(self.on_detection_page_done)
+        worker.pdf_finished.connect(self.on_detection_pdf_finished)
+        worker.progress.connect(self.on_detection_progress)
+        worker.pdf_failed.connect(self.on_detection_pdf_failed)
+        worker.page_timeout.connect(self.on_detection_page_timeout)
+        worker.pages_failed.connect(self.on_detection_pages_failed)
+        worker.failed.connect(self.on_detection_failed)
+        worker.finished.connect(self.on_detection_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        
+        self.detection_worker = worker
+        self.detection_thread = thread
+        self.set_detection_running(True)
+        self.statusBar().showMessage('🔍 Detectando referencias...')
+        thread.start()
+    
+    def set_detection_running(self, running):
+        """
+        Bloquea mientras se detecta o se genera los controles que modifican la
+        lista y los que abren PDFs con PyMuPDF en este hilo: PyMuPDF no admite
+        que dos hilos lo usen a la vez. Los contextos de la tabla tampoco se
+        leen hasta que termina
+        """
+        self.detect_button.setEnabled(not running and bool(self.pdf_paths))
+        self.select_button.setEnabled(not running)
+        self.clear_list_btn.setEnabled(not running)
+        self.remove_selected_btn.setEnabled(not running)
+        self.visual_editor_button.setEnabled(not running and bool(self.pdf_paths))
+        self.auto_pattern_button.setEnabled(not running)
+        self.reference_model.set_show_contexts(not running)
+        self.retarget_button.setEnabled(not running and bool(self.generated_outputs))
+        self.restyle_button.setEnabled(not running)
+        if running:
+            self.generate_button.setEnabled(False)
+    
+    def on_detection_pdf_started(self, pdf_path, num_pages):
+        """Registra el PDF que empieza a analizarse"""
+        self.reference_store.add_pdf(pdf_path)
+        self.detection_current_pdf = (os.path.basename(pdf_path), num_pages)
+    
+    def on_detection_page_done(self, pdf_path, page_num, page_refs):
+        """Acumula las referencias de una página terminada"""
+        self.reference_model.add_page(pdf_path, page_num, page_refs)
+        
+        pdf_name, num_pages = self.detection_current_pdf
+        if self.detection_progress is not None:
+            self.detection_progress.setLabelText(
+                f'📄 {pdf_name}\n'
+                f'Página {page_num + 1}/{num_pages} • '
+                f'{len(self.reference_store)} referencias encontradas'
+            )
+    
+    def on_detection_pdf_finished(self, pdf_path):
+        """Anota un PDF ya analizado entero para no repetirlo en la siguiente detección"""
+        # Los PDFs con páginas que superaron el tiempo límite o que no se
+        # pudieron analizar se vuelven a intentar
+        if any(timeout[0] == pdf_path for timeout in self.detection_timeouts):
+            return
+        if any(failure[0] == pdf_path for failure in self.detection_failures):
+            return
+        signature = self.detection_signatures.get(pdf_path)
+        if signature is not None:
+            self.reference_store.mark_detected(pdf_path, (signature, self.detection_key))
+    
+    def on_detection_progress(self, pages_processed, total_pages):
+        """Actualiza la barra de progreso"""
+        if self.detection_progress is not None:
+            self.detection_progress.setMaximum(total_pages)
+            self.detection_progress.setValue(pages_processed)
+    
+    def on_detection_pdf_failed(self, pdf_path, error):
+        """Informa de un PDF que no se pudo abrir"""
+        self.statusBar().showMessage(f'⚠ No se pudo abrir {os.path.basename(pdf_path)}: {error}')
+    
+    def on_detection_page_timeout(self, pdf_path, page_num, message):
+        """Anota una página en la que el regex personalizado superó el tiempo límite"""
+        self.detection_timeouts.append((pdf_path, page_num, message))
+        self.statusBar().showMessage(f'⚠ {os.path.basename(pdf_path)}, página {page_num + 1}: {message}')
+    
+    def on_detection_pages_failed(self, pdf_path, start, end, message):
+        """Anota un bloque de páginas que no se pudo analizar (se repetirá en la siguiente detección)"""
+        self.detection_failures.append((pdf_path, start, end, message))
+        self.statusBar().showMessage(
+            f'⚠ {os.path.basename(pdf_path)}, páginas {start + 1}-{end}: {message}'
+        )
+    
+    def on_detection_failed(self, message):
+        """Anota el error que detuvo la detección (se muestra al terminar)"""
+        self.detection_error = message
+    
+    def on_detection_finished(self, cancelled):
+        """Muestra los resultados al terminar (o cancelar) la detección"""
+        self.detection_thread = None
+        self.detection_worker = None
         
-        # Obtener el orden de los grupos
-        groups_order = self.get_pattern_groups_order()
+        if self.detection_progress is not None:
+            self.detection_progress.canceled.disconnect()
+            self.detection_progress.close()
+            self.detection_progress = None
         
-        total_references_all = 0
-        pages_processed = 0
+        total_references_all = len(self.reference_store)
+        self.set_detection_running(False)
         
         try:
-            # Procesar cada PDF
-            for pdf_idx, pdf_path in enumerate(self.pdf_paths):
-                if progress.wasCanceled():
-                    break
-                
-                pdf_name = os.path.basename(pdf_path)
-                
-                # Cerrar documento previo si existe
-                if self.pdf_document:
-                    self.pdf_document.close()
-                
-                # Abrir el PDF con PyMuPDF
-                try:
-                    self.pdf_document = fitz.open(pdf_path)
-                    self.pdf_path = pdf_path
-                except Exception as e:
-                    print(f"Error al abrir {pdf_path}: {e}")
-                    continue
-                
-                pdf_references = []
-                total_references = 0
-                num_pages = len(self.pdf_document)
-                
-                # Recorrer todas las páginas
-                for page_num in range(num_pages):
-                    if progress.wasCanceled():
-                        break
-                    
-                    # Actualizar barra de progreso con información detallada
-                    pages_processed += 1
-                    progress.setValue(pages_processed)
-                    progress.setLabelText(
-                        f'📄 {pdf_name}\n'
-                        f'Página {page_num + 1}/{num_pages} • '
-                        f'{total_references_all + total_references} referencias encontradas'
-                    )
-                    QApplication.processEvents()  # Actualizar UI
-                    
-                    try:
-                        page = self.pdf_document[page_num]
-                        text = page.get_text()
-                        
-                        # Buscar todas las coincidencias en la página usando regex
-                        matches = list(re.finditer(pattern, text))
-                        
-                        # Para cada referencia única, encontrar TODAS sus posiciones en la página
-                        ref_positions_used = {}
-                        
-                        for match in matches:
-                            full_ref = match.group(0)
-                            
-                            # Extraer los grupos según el orden del patrón
-                            group1 = match.group(1) if match.lastindex >= 1 else ''
-                            group2 = match.group(2) if match.lastindex >= 2 else ''
-                            group3 = match.group(3) if match.lastindex >= 3 else ''
-                            
-                            # Asignar página, columna y fila según el orden del patrón
-                            page_ref, column_ref, row_ref = '', '', ''
-                            
-                            for i, group_name in enumerate(groups_order):
-                                value = [group1, group2, group3][i] if i < 3 else ''
-                                if group_name == 'página':
-                                    page_ref = value
-                                elif group_name == 'columna':
-                                    column_ref = value
-                                elif group_name == 'fila':
-                                    row_ref = value
-                            
-                            # Obtener contexto (30 caracteres antes y después)
-                            start = max(0, match.start() - 30)
-                            end = min(len(text), match.end() + 30)
-                            context = text[start:end].replace('\n', ' ').strip()
-                            
-                            # Buscar TODAS las coordenadas de esta referencia en la página
-                            text_instances = page.search_for(full_ref)
-                            
-                            if text_instances:
-                                # Inicializar contador para esta referencia si no existe
-                                if full_ref not in ref_positions_used:
-                                    ref_positions_used[full_ref] = 0
-                                
-                                # Obtener el índice de la posición que corresponde a este match
-                                position_index = ref_positions_used[full_ref]
-                                
-                                # Si hay suficientes instancias, usar la que corresponde
-                                if position_index < len(text_instances):
-                                    rect = text_instances[position_index]
-                                    coordinates = [rect.x0, rect.y0, rect.x1, rect.y1]
-                                    
-                                    reference_data = {
-                                        'full': full_ref,
-                                        'page': page_ref,
-                                        'column': column_ref,
-                                        'row': row_ref,
-                                        'context': context,
-                                        'pdf_page': page_num,
-                                        'coordinates': coordinates,
-                                        'instance': position_index + 1,
-                                        'pdf_path': pdf_path,
-                                        'pdf_name': os.path.basename(pdf_path)
-                                    }
-                                    
-                                    pdf_references.append(reference_data)
-                                    self.references.append(reference_data)
-                                    total_references += 1
-                                    
-                                    # Incrementar el contador para la próxima vez
-                                    ref_positions_used[full_ref] += 1
-                                else:
-                                    # Si no hay más instancias, usar la última disponible
-                                    rect = text_instances[-1]
-                                    coordinates = [rect.x0, rect.y0, rect.x1, rect.y1]
-                                    
-                                    reference_data = {
-                                        'full': full_ref,
-                                        'page': page_ref,
-                                        'column': column_ref,
-                                        'row': row_ref,
-                                        'context': context,
-                                        'pdf_page': page_num,
-                                        'coordinates': coordinates,
-                                        'instance': len(text_instances),
-                                        'pdf_path': pdf_path,
-                                        'pdf_name': os.path.basename(pdf_path)
-                                    }
-                                    
-                                    pdf_references.append(reference_data)
-                                    self.references.append(reference_data)
-                                    total_references += 1
-                    except Exception as page_error:
-                        # Si hay error en una página, continuar con las demás
-                        print(f"Error procesando página {page_num + 1} de {pdf_name}: {page_error}")
-                        continue
-                
-                # Guardar referencias de este PDF
-                self.all_references[pdf_path] = pdf_references
-                total_references_all += total_references
-            
-            # Completar la barra de progreso
-            progress.setValue(total_pages)
-            progress.setLabelText(f'✅ Análisis completado: {total_references_all} referencias')
-            QApplication.processEvents()
-            
             # Mostrar referencias en la tabla
             self.populate_table()
             
             # Actualizar estadísticas
             self.update_statistics(total_references_all)
-            
-            # Habilitar el botón de generar PDF interactivo
-            if total_references_all > 0:
-                self.generate_button.setEnabled(True)
-            
-            self.statusBar().showMessage(f'✅ Análisis completado: {total_references_all} referencias en {len(self.pdf_paths)} PDF(s)')
-            
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
             print(f"Error en detección: {error_detail}")
             QMessageBox.critical(self, 'Error', f'Error al procesar el PDF:\n{str(e)}')
             self.statusBar().showMessage('Error al analizar el PDF')
-            
-    def populate_table(self):
-        """Llena la tabla con las referencias encontradas"""
-        # Actualizar columnas si hay múltiples PDFs
-        if len(self.pdf_paths) > 1:
-            self.table.setColumnCount(6)
-            self.table.setHorizontalHeaderLabels(['PDF', 'Referencia', 'Página', 'Columna', 'Fila', 'Contexto'])
-            self.table.horizontalHeader().setSectionResizeMode(5, QHeaderView.Stretch)
-        else:
-            self.table.setColumnCount(5)
-            self.table.setHorizontalHeaderLabels(['Referencia', 'Página', 'Columna', 'Fila', 'Contexto'])
-            self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
+            return
         
-        self.table.setRowCount(len(self.references))
+        if self.detection_timeouts:
+            pages = '\n'.join(
+                f'• {os.path.basename(pdf_path)}, página {page_num + 1}'
+                for pdf_path, page_num, _ in self.detection_timeouts[:10]
+            )
+            if len(self.detection_timeouts) > 10:
+                pages += f'\n• ... y {len(self.detection_timeouts) - 10} más'
+            QMessageBox.warning(
+                self, 'Patrón lento',
+                f'El patrón personalizado superó el tiempo límite ({self.pattern_time_budget:g} s) '
+                f'en {len(self.detection_timeouts)} página(s), que se han quedado sin referencias:\n\n{pages}'
+            )
         
-        for row, ref in enumerate(self.references):
-            col_offset = 0
-            
-            # Mostrar nombre del PDF si hay múltiples
-            if len(self.pdf_paths) > 1:
-                pdf_name = ref.get('pdf_name', 'Unknown')
-                # Acortar el nombre si es muy largo
-                if len(pdf_name) > 25:
-                    pdf_name = pdf_name[:22] + '...'
-                self.table.setItem(row, 0, QTableWidgetItem(pdf_name))
-                col_offset = 1
-            
-            # Mostrar referencia con número de instancia si hay duplicados
-            ref_text = ref['full']
-            if ref.get('instance', 1) > 1:
-                ref_text += f" (#{ref['instance']})"
-            
-            self.table.setItem(row, col_offset + 0, QTableWidgetItem(ref_text))
-            self.table.setItem(row, col_offset + 1, QTableWidgetItem(ref['page']))
-            self.table.setItem(row, col_offset + 2, QTableWidgetItem(ref['column']))
-            self.table.setItem(row, col_offset + 3, QTableWidgetItem(ref['row']))
-            
-            # Añadir información de coordenadas al contexto si están disponibles
-            context_text = ref['context']
-            if ref.get('coordinates'):
-                context_text += f" [Pág PDF: {ref['pdf_page']+1}]"
+        if self.detection_failures:
+            pages = '\n'.join(
+                f'• {os.path.basename(pdf_path)}, páginas {start + 1}-{end}: {message}'
+                for pdf_path, start, end, message in self.detection_failures[:10]
+            )
+            if len(self.detection_failures) > 10:
+                pages += f'\n• ... y {len(self.detection_failures) - 10} más'
+            QMessageBox.warning(
+                self, 'Páginas sin analizar',
+                f'No se pudieron analizar {len(self.detection_failures)} bloque(s) de páginas, que se han '
+                f'quedado sin referencias. Se volverán a analizar en la siguiente detección:\n\n{pages}'
+            )
+        
+        if self.detection_error is not None:
+            QMessageBox.critical(
+                self, 'Error',
+                f'La detección se detuvo por un error:\n{self.detection_error}\n\n'
+                f'Se muestran las referencias encontradas hasta ese momento.'
+            )
+        
+        # Habilitar el botón de generar PDF interactivo
+        if total_references_all > 0:
+            self.generate_button.setEnabled(True)
+        
+        if self.detection_error is not None:
+            self.statusBar().showMessage(f'⚠ Análisis interrumpido: {total_references_all} referencias encontradas')
+        elif cancelled:
+            self.statusBar().showMessage(f'⏹ Análisis cancelado: {total_references_all} referencias encontradas')
+        else:
+            analysed = '' if self.detection_pending == len(self.pdf_paths) else f' ({self.detection_pending} analizados)'
+            self.statusBar().showMessage(self.with_analysis_report(
+                f'✅ Análisis completado: {total_references_all} referencias en {len(self.pdf_paths)} PDF(s){analysed}'
+            ))
             
-            self.table.setItem(row, col_offset + 4, QTableWidgetItem(context_text))
+    def populate_table(self):
+        """Muestra las referencias encontradas en la tabla (modelo compartido)"""
+        # Columna de PDF solo si hay múltiples PDFs (las filas ya se añadieron al detectar)
+        self.reference_model.set_show_pdf(len(self.pdf_paths) > 1)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(self.reference_model.columnCount() - 1, QHeaderView.Stretch)
             
     def update_statistics(self, total):
-        """Actualiza el área de estadísticas"""
+        """Actualiza el área de estadísticas y muestra las referencias"""
+        self.refresh_statistics()
+        
+        # Mostrar diálogo de referencias automáticamente
+        if total > 0:
+            self.show_references_dialog()
+    
+    def refresh_statistics(self):
+        """
+        Actualiza el área de estadísticas y el contador de referencias con los
+        recuentos que el almacén mantiene al añadir y quitar PDFs
+        """
+        total = len(self.reference_store)
         pattern_info = self.REFERENCE_PATTERNS.get(self.current_pattern, {})
         pattern_order = pattern_info.get('order', 'desconocido')
         pattern_example = pattern_info.get('example', '')
@@ -3048,8 +3808,8 @@ No se encontraron referencias en el documento.
             """
         else:
             # Contar referencias únicas
-            unique_refs = len(set(ref['full'] for ref in self.references))
-            pages_with_refs = len(set(ref['page'] for ref in self.references))
+            unique_refs = len(self.reference_store.full_counts)
+            pages_with_refs = len(self.reference_store.page_counts)
             
             stats = f"""
 Estilo de referencia: {self.current_pattern}
@@ -3065,10 +3825,7 @@ Páginas referenciadas: {pages_with_refs}
 Distribución por página:
 """
             # Contar por página
-            page_counts = {}
-            for ref in self.references:
-                page = ref['page']
-                page_counts[page] = page_counts.get(page, 0) + 1
+            page_counts = self.reference_store.page_counts
             
             for page in sorted(page_counts.keys(), key=lambda x: int(x) if x.isdigit() else 0):
                 stats += f"  Página {page}: {page_counts[page]} referencias\n"
@@ -3076,7 +3833,7 @@ Distribución por página:
         self.stats_text.setText(stats.strip())
         
         # Actualizar contador de referencias en la pestaña
-        total_refs = len(self.references)
+        total_refs = len(self.reference_store)
         if total_refs == 0:
             self.ref_count_label.setText('No se encontraron referencias')
             self.ref_count_label.setStyleSheet('color: #f87171; font-size: 12px; padding: 5px;')
@@ -3086,14 +3843,13 @@ Distribución por página:
         else:
             self.ref_count_label.setText(f'{total_refs} referencias encontradas')
             self.ref_count_label.setStyleSheet('color: #10b981; font-size: 12px; padding: 5px;')
-        
-        # Mostrar diálogo de referencias automáticamente
-        if total_refs > 0:
-            self.show_references_dialog()
     
     def generate_interactive_pdf(self):
-        """Genera PDFs interactivos para todos los archivos cargados"""
-        if not self.all_references:
+        """Genera PDFs interactivos para todos los archivos cargados (en segundo plano)"""
+        if self.generation_thread is not None or self.detection_thread is not None:
+            return
+        
+        if not self.reference_store.detected_pdfs():
             QMessageBox.warning(self, 'Aviso', 'Primero debes detectar las referencias.')
             return
         
@@ -3110,7 +3866,7 @@ Distribución por página:
             )
             if reply != QMessageBox.Yes:
                 return
-            output_dir = None
+            output_dir = os.path.dirname(self.pdf_paths[0])
             single_output = None
         else:
             # Pedir al usuario dónde guardar los PDFs
@@ -3137,231 +3893,339 @@ Distribución por página:
                     return
                 single_output = None
         
-        try:
-            total_pdfs = len(self.all_references)
-            total_refs_processed = 0
-            pdfs_generated = []
-            
-            # Crear un diálogo de progreso
-            progress = QProgressDialog(f'Generando {total_pdfs} PDF(s) interactivo(s)...', 'Cancelar', 0, total_pdfs, self)
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setWindowTitle('Procesando PDFs')
-            progress.setValue(0)
-            
-            # Procesar cada PDF
-            for pdf_idx, (pdf_path, pdf_refs) in enumerate(self.all_references.items()):
-                if progress.wasCanceled():
-                    break
-                
-                progress.setLabelText(f'Procesando: {os.path.basename(pdf_path)}')
-                progress.setValue(pdf_idx)
-                
-                if not pdf_refs:
-                    continue
-                
-                try:
-                    # Determinar ruta de salida
-                    if keep_name:
-                        # Usar archivo temporal y luego reemplazar
-                        current_output = pdf_path + '.tmp'
-                        final_output = pdf_path
-                    elif single_output and pdf_idx == 0:
-                        current_output = single_output
-                        final_output = single_output
-                    else:
-                        base_name = os.path.basename(pdf_path).replace('.pdf', '_interactivo.pdf')
-                        current_output = os.path.join(output_dir, base_name)
-                        final_output = current_output
-                    
-                    # Contador de enlaces añadidos
-                    links_added = 0
-                    references_data = []
-                    
-                    # Abrir con PyMuPDF solo para obtener dimensiones de página
-                    temp_doc = fitz.open(pdf_path)
-                    
-                    # Procesar cada referencia para calcular coordenadas
-                    for idx, ref in enumerate(pdf_refs):
-                        # Verificar que tenemos coordenadas
-                        if not ref['coordinates']:
-                            continue
-                        
-                        # Página donde está la referencia (0-indexed)
-                        source_page_num = ref['pdf_page']
-                        source_page = temp_doc[source_page_num]
-                        
-                        # Coordenadas de la referencia en el PDF actual
-                        x0, y0, x1, y1 = ref['coordinates']
-                        
-                        # Convertir coordenadas de PyMuPDF a coordenadas PDF estándar
-                        page_height = source_page.rect.height
-                        pdf_y0 = page_height - y1
-                        pdf_y1 = page_height - y0
-                        
-                        # Página destino (donde debe ir al hacer clic)
-                        target_page_num = int(ref['page']) - 1
-                        
-                        # Verificar que la página destino existe
-                        if target_page_num < 0 or target_page_num >= len(temp_doc):
-                            continue
-                        
-                        # Obtener las coordenadas de destino basadas en columna y fila
-                        target_coords = self.calculate_target_coordinates(
-                            temp_doc[target_page_num],
-                            ref['column'],
-                            ref['row']
-                        )
-                        
-                        # Convertir coordenadas de destino también
-                        target_page_height = temp_doc[target_page_num].rect.height
-                        target_pdf_coords = [
-                            target_coords[0],
-                            target_page_height - target_coords[3],
-                            target_coords[2],
-                            target_page_height - target_coords[1]
-                        ]
-                        
-                        # Guardar datos de la referencia
-                        ref_data = {
-                            'full': ref['full'],
-                            'page': ref['page'],
-                            'column': ref['column'],
-                            'row': ref['row'],
-                            'pdf_page': source_page_num,
-                            'coordinates': [x0, pdf_y0, x1, pdf_y1],
-                            'target_page': target_page_num,
-                            'target_coordinates': target_pdf_coords
-                        }
-                        references_data.append(ref_data)
-                        links_added += 1
-                    
-                    temp_doc.close()
-                    
-                    # Usar PyPDF2 para crear el PDF con JavaScript
-                    reader = PdfReader(pdf_path)
-                    writer = PdfWriter()
-                    
-                    # Copiar todas las páginas manteniendo todo el contenido original
-                    for page in reader.pages:
-                        writer.add_page(page)
-                    
-                    # Añadir JavaScript a nivel de documento con los estilos configurados
-                    writer.add_js(self.get_javascript_code())
-                    
-                    # Añadir nuevos enlaces invisibles con JavaScript Y GoTo para cada referencia
-                    for ref_data in references_data:
-                        try:
-                            page_num = ref_data['pdf_page']
-                            coords = ref_data['coordinates']
-                            target_page = ref_data['target_page']
-                            target_coords = ref_data['target_coordinates']
-                            
-                            # Obtener la página del writer
-                            page = writer.pages[page_num]
-                            
-                            # JavaScript: solo ejecutar highlight (la navegación la hace GoTo)
-                            js_code = f"highlight({target_page}, {target_coords});"
-                            
-                            # Crear acción JavaScript
-                            js_action = DictionaryObject({
-                                NameObject("/S"): NameObject("/JavaScript"),
-                                NameObject("/JS"): createStringObject(js_code)
-                            })
-                            
-                            # Crear acción GoTo para ir a la página destino
-                            goto_action = DictionaryObject({
-                                NameObject("/S"): NameObject("/GoTo"),
-                                NameObject("/D"): ArrayObject([
-                                    writer.pages[target_page].indirect_reference,
-                                    NameObject("/XYZ"),
-                                    NumberObject(int(target_coords[0])),
-                                    NumberObject(int(target_coords[3])),
-                                    NumberObject(0)
-                                ])
-                            })
-                            
-                            # Encadenar acciones: GoTo primero, luego JavaScript
-                            goto_action[NameObject("/Next")] = js_action
-                            
-                            # Crear enlace invisible con acción combinada
-                            link_annotation = DictionaryObject()
-                            link_annotation.update({
-                                NameObject("/Type"): NameObject("/Annot"),
-                                NameObject("/Subtype"): NameObject("/Link"),
-                                NameObject("/Rect"): ArrayObject([
-                                    NumberObject(coords[0]),
-                                    NumberObject(coords[1]),
-                                    NumberObject(coords[2]),
-                                    NumberObject(coords[3])
-                                ]),
-                                NameObject("/Border"): ArrayObject([
-                                    NumberObject(0), NumberObject(0), NumberObject(0)
-                                ]),
-                                NameObject("/A"): goto_action,
-                                NameObject("/H"): NameObject("/N")
-                            })
-                            
-                            # Añadir la anotación a la página
-                            if "/Annots" in page:
-                                page["/Annots"].append(link_annotation)
-                            else:
-                                page[NameObject("/Annots")] = ArrayObject([link_annotation])
-                            
-                        except Exception as ref_error:
-                            print(f"Error procesando referencia {ref_data.get('full', 'unknown')}: {ref_error}")
-                            continue
-                    
-                    # Guardar el PDF final
-                    with open(current_output, 'wb') as f:
-                        writer.write(f)
-                    
-                    # Si estamos sobrescribiendo, reemplazar el archivo original
-                    if keep_name and current_output != final_output:
-                        import shutil
-                        shutil.move(current_output, final_output)
-                    
-                    pdfs_generated.append(final_output)
-                    total_refs_processed += links_added
-                    
-                except Exception as pdf_error:
-                    import traceback
-                    error_detail = traceback.format_exc()
-                    print(f"Error al procesar {pdf_path}: {pdf_error}\n{error_detail}")
-                    continue
-            
-            progress.setValue(total_pdfs)
-            
-            # Mensaje de resumen
-            if len(pdfs_generated) == 1:
-                msg = f'PDF interactivo generado correctamente! ✅\n\n'
-                msg += f'📄 Archivo: {pdfs_generated[0]}\n'
-                msg += f'🔗 Referencias procesadas: {total_refs_processed}\n\n'
+        store = self.reference_store
+        
+        # Un trabajo por PDF con referencias: sus enlaces, con la ruta de salida
+        jobs = []
+        for pdf_idx, pdf_path in enumerate(store.detected_pdfs()):
+            if not store.rows_for_pdf(pdf_path):
+                continue
+            if keep_name:
+                final_output = pdf_path
+            elif single_output and pdf_idx == 0:
+                final_output = single_output
             else:
-                msg = f'{len(pdfs_generated)} PDFs interactivos generados! ✅\n\n'
-                msg += f'📁 Carpeta: {output_dir}\n'
-                msg += f'🔗 Total referencias: {total_refs_processed}\n\n'
-                msg += 'Archivos generados:\n'
-                for p in pdfs_generated[:5]:  # Mostrar máximo 5
-                    msg += f'  • {os.path.basename(p)}\n'
-                if len(pdfs_generated) > 5:
-                    msg += f'  ... y {len(pdfs_generated) - 5} más\n'
-                msg += '\n'
-            
-            msg += f'✨ Características:\n'
-            msg += f'  • Acción "Ir a página" (funciona en todos los visores) ✓\n'
-            msg += f'  • Animación JavaScript (Adobe Acrobat/Reader) ✓'
-            
+                final_output = interactive_output_path(pdf_path, output_dir)
+            jobs.append((pdf_path, final_output, store.link_sources(pdf_path)))
+        
+        if not jobs:
+            QMessageBox.warning(self, 'Aviso', 'No hay referencias para generar enlaces.')
+            return
+        
+        self.start_generation(jobs, output_dir)
+    
+    def retarget_interactive_pdfs(self):
+        """
+        Actualiza con la cuadrícula actual los destinos de los enlaces de los
+        PDFs ya generados, sin volver a detectar ni a generar (en segundo plano)
+        
+        Con la cuadrícula por plantilla, las hojas del tipo sobre el que se
+        dibujó o detectó la cuadrícula usan la cuadrícula actual y las de otros
+        tipos la de su perfil (ver grid_profiles). Si la cuadrícula actual no
+        tiene tipo de hoja (configuración manual), ningún perfil la dejaría
+        aplicarse: se pregunta si usarla en todas las hojas.
+        """
+        if self.generation_thread is not None or self.detection_thread is not None:
+            return
+        
+        store = self.reference_store
+        jobs = [
+            (pdf_path, output_path, store.link_sources(pdf_path))
+            for pdf_path, output_path in self.generated_outputs.items()
+            if store.rows_for_pdf(pdf_path)
+        ]
+        if not jobs:
+            QMessageBox.warning(self, 'Aviso', 'Primero debes generar los PDFs interactivos.')
+            return
+        
+        use_profiles = self.grid_profiles_checkbox.isChecked()
+        if use_profiles and self.grid_template is None:
+            reply = QMessageBox.question(
+                self,
+                'Cuadrícula por plantilla',
+                'La cuadrícula actual no se dibujó ni se detectó sobre ningún tipo de hoja, así que '
+                'las hojas con marco con marcas usarían la cuadrícula detectada de su tipo.\n\n'
+                '¿Usar la cuadrícula actual en todas las hojas?',
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                QMessageBox.Yes
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            use_profiles = reply == QMessageBox.No
+        
+        self.start_generation(jobs, self.generation_output_dir, GenerationWorker.RETARGET, use_profiles)
+    
+    def restyle_interactive_pdfs(self):
+        """
+        Aplica el estilo actual del resaltado a los PDFs interactivos de una
+        carpeta cambiando solo su JavaScript de documento (en segundo plano)
+        """
+        if self.generation_thread is not None or self.detection_thread is not None:
+            return
+        
+        start_dir = self.generation_output_dir or (os.path.dirname(self.pdf_paths[0]) if self.pdf_paths else '')
+        folder = QFileDialog.getExistingDirectory(
+            self,
+            'Seleccionar carpeta con los PDFs interactivos',
+            start_dir
+        )
+        if not folder:
+            return
+        
+        pdf_paths = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith('.pdf')
+        )
+        if not pdf_paths:
+            QMessageBox.warning(self, 'Aviso', 'No hay PDFs en la carpeta seleccionada.')
+            return
+        
+        self.start_generation(pdf_paths, folder, GenerationWorker.RESTYLE)
+    
+    def start_generation(self, jobs, output_dir, task=GenerationWorker.GENERATE, use_profiles=True):
+        """
+        Lanza la tarea de generación (ver GenerationWorker) en segundo plano.
+        Con use_profiles=False se usa la cuadrícula actual en todas las páginas.
+        """
+        # Diálogo de progreso (no modal: la ventana sigue respondiendo)
+        if task == GenerationWorker.RETARGET:
+            label = f'Actualizando destinos de {len(jobs)} PDF(s) interactivo(s)...'
+        elif task == GenerationWorker.RESTYLE:
+            label = f'Aplicando el estilo a {len(jobs)} PDF(s)...'
+        else:
+            label = f'Generando {len(jobs)} PDF(s) interactivo(s)...'
+        progress = QProgressDialog(label, 'Cancelar', 0, len(jobs), self)
+        progress.setWindowTitle('Procesando PDFs')
+        progress.setMinimumDuration(0)
+        progress.setMinimumWidth(400)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.setValue(0)
+        self.generation_progress = progress
+        self.generation_results = []
+        self.generation_output_dir = output_dir
+        self.generation_error = None
+        self.generation_task = task
+        
+        # Token de cancelación compartido con el hilo de generación
+        self.generation_cancel = threading.Event()
+        progress.canceled.connect(self.generation_cancel.set)
+        
+        # Cuadrícula de cada plantilla de página, detectada una vez y guardada
+        self.generation_profiles = None
+        page_sizes = None
+        if task != GenerationWorker.RESTYLE:
+            if use_profiles and self.grid_profiles_checkbox.isChecked():
+                # La cuadrícula configurada manda: los perfiles de otra cuadrícula se
+                # descartan y las páginas de su plantilla no usan perfil
+                self.generation_profiles = GridProfiles.load(
+                    os.path.join(get_app_path(), GRID_PROFILES_FILE),
+                    GridModel(self.get_grid_settings()), self.grid_template
+                )
+            page_sizes = {pdf_path: self.page_analysis.page_sizes(pdf_path) for pdf_path, _, _ in jobs}
+        
+        worker = GenerationWorker(
+            jobs, self.get_javascript_code(), GridModel(self.get_grid_settings()),
+            self.generation_cancel, workers=self.workers_spinbox.value(),
+            profiles=self.generation_profiles, page_sizes=page_sizes, task=task,
+            layout=LINK_LAYOUT_COMPACT if self.compact_links.isChecked() else LINK_LAYOUT_INLINE
+        )
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.pdf_done.connect(self.on_generation_pdf_done)
+        worker.progress.connect(self.on_generation_progress)
+        worker.failed.connect(self.on_generation_failed)
+        worker.finished.connect(self.on_generation_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        
+        self.generation_worker = worker
+        self.generation_thread = thread
+        self.set_detection_running(True)
+        if task == GenerationWorker.RETARGET:
+            self.statusBar().showMessage('🎯 Actualizando destinos de los enlaces...')
+        elif task == GenerationWorker.RESTYLE:
+            self.statusBar().showMessage('🎨 Aplicando el estilo a los PDFs interactivos...')
+        else:
+            self.statusBar().showMessage('⚙ Generando PDFs interactivos...')
+        thread.start()
+    
+    def on_generation_pdf_done(self, result):
+        """Guarda el resultado de un PDF terminado"""
+        self.generation_results.append(result)
+        if self.generation_progress is not None:
+            if result['error']:
+                status = '⚠ Error'
+            elif self.generation_task == GenerationWorker.RESTYLE:
+                status = 'omitido (no es interactivo)' if result['skipped'] else '✓ estilo aplicado'
+            else:
+                status = f"✓ {result['links']} enlaces"
+            self.generation_progress.setLabelText(f"{os.path.basename(result['pdf'])}: {status}")
+    
+    def on_generation_progress(self, done, total):
+        """Actualiza la barra de progreso de la generación"""
+        if self.generation_progress is not None:
+            self.generation_progress.setMaximum(total)
+            self.generation_progress.setValue(done)
+    
+    def on_generation_failed(self, message):
+        """Anota el error que detuvo la generación (se muestra al terminar)"""
+        self.generation_error = message
+    
+    def on_generation_finished(self, cancelled):
+        """Muestra el resumen de la generación, con los PDFs que fallaron"""
+        self.generation_thread = None
+        self.generation_worker = None
+        
+        if self.generation_progress is not None:
+            self.generation_progress.canceled.disconnect()
+            self.generation_progress.close()
+            self.generation_progress = None
+        
+        self.set_detection_running(False)
+        self.generate_button.setEnabled(len(self.reference_store) > 0)
+        
+        # Guardar las plantillas nuevas para no volver a detectarlas
+        profiles = self.generation_profiles
+        self.generation_profiles = None
+        if profiles is not None and profiles.new_profiles:
+            profiles.save(os.path.join(get_app_path(), GRID_PROFILES_FILE))
+            self.update_grid_profiles_button()
+        
+        # Resultados en el orden de la lista de PDFs
+        order = {pdf_path: idx for idx, pdf_path in enumerate(self.reference_store.detected_pdfs())}
+        results = sorted(self.generation_results, key=lambda result: order.get(result['pdf'], 0))
+        pdfs_generated = [result['output'] for result in results if not result['error']]
+        failed = [result for result in results if result['error']]
+        total_refs_processed = sum(result['links'] for result in results)
+        output_dir = self.generation_output_dir
+        
+        if self.generation_task == GenerationWorker.RETARGET:
+            self.finish_retarget(cancelled, pdfs_generated, failed, total_refs_processed)
+            return
+        if self.generation_task == GenerationWorker.RESTYLE:
+            self.finish_restyle(cancelled, results)
+            return
+        
+        # PDFs generados cuyos destinos se pueden actualizar al cambiar la cuadrícula
+        for result in results:
+            if not result['error']:
+                self.generated_outputs[result['pdf']] = result['output']
+        self.retarget_button.setEnabled(bool(self.generated_outputs))
+        
+        # Mensaje de resumen
+        if len(pdfs_generated) == 1:
+            msg = f'PDF interactivo generado correctamente! ✅\n\n'
+            msg += f'📄 Archivo: {pdfs_generated[0]}\n'
+            msg += f'🔗 Referencias procesadas: {total_refs_processed}\n\n'
+        else:
+            msg = f'{len(pdfs_generated)} PDFs interactivos generados! ✅\n\n'
+            msg += f'📁 Carpeta: {output_dir}\n'
+            msg += f'🔗 Total referencias: {total_refs_processed}\n\n'
+            msg += 'Archivos generados:\n'
+            for p in pdfs_generated[:5]:  # Mostrar máximo 5
+                msg += f'  • {os.path.basename(p)}\n'
+            if len(pdfs_generated) > 5:
+                msg += f'  ... y {len(pdfs_generated) - 5} más\n'
+            msg += '\n'
+        
+        msg += f'✨ Características:\n'
+        msg += f'  • Acción "Ir a página" (funciona en todos los visores) ✓\n'
+        msg += f'  • Animación JavaScript (Adobe Acrobat/Reader) ✓'
+        
+        if failed:
+            # Los errores se muestran siempre, aunque estén desactivadas las ventanas emergentes
+            error_msg = f'{len(failed)} PDF(s) no se pudieron generar:\n\n'
+            for result in failed[:10]:
+                error_msg += f"  • {os.path.basename(result['pdf'])}: {result['error']}\n"
+            if len(failed) > 10:
+                error_msg += f'  ... y {len(failed) - 10} más\n'
+            if pdfs_generated:
+                error_msg += f'\n{len(pdfs_generated)} PDF(s) generados correctamente.'
+            QMessageBox.warning(self, 'Errores al generar', error_msg)
+        if self.generation_error is not None:
+            QMessageBox.critical(
+                self, 'Error',
+                f'La generación se detuvo por un error:\n{self.generation_error}\n\n'
+                f'{len(pdfs_generated)} PDF(s) se generaron antes del error.'
+            )
+        elif pdfs_generated and not failed and not self.disable_popups.isChecked():
             # Mostrar mensaje solo si no están desactivadas las ventanas emergentes
-            if not self.disable_popups.isChecked():
-                QMessageBox.information(self, 'Éxito', msg)
-            
-            self.statusBar().showMessage(f'{len(pdfs_generated)} PDF(s) interactivo(s) generado(s) ✅')
-            
-        except Exception as e:
-            import traceback
-            error_msg = f'Error al generar PDF interactivo:\n{str(e)}\n\n{traceback.format_exc()}'
-            QMessageBox.critical(self, 'Error', error_msg)
-            self.statusBar().showMessage('Error al generar PDF interactivo')
+            QMessageBox.information(self, 'Éxito', msg)
+        
+        status = f'{len(pdfs_generated)} PDF(s) interactivo(s) generado(s) ✅'
+        if failed:
+            status += f' • {len(failed)} con errores'
+        if self.generation_error is not None:
+            status = f'⚠ Generación interrumpida: {status}'
+        elif cancelled:
+            status = f'⏹ Generación cancelada: {status}'
+        self.statusBar().showMessage(self.with_analysis_report(status))
+    
+    def finish_retarget(self, cancelled, pdfs_updated, failed, total_links):
+        """Muestra el resumen de la actualización de destinos"""
+        if failed:
+            # Los errores se muestran siempre, aunque estén desactivadas las ventanas emergentes
+            error_msg = f'{len(failed)} PDF(s) no se pudieron actualizar:\n\n'
+            for result in failed[:10]:
+                error_msg += f"  • {os.path.basename(result['pdf'])}: {result['error']}\n"
+            if len(failed) > 10:
+                error_msg += f'  ... y {len(failed) - 10} más\n'
+            if pdfs_updated:
+                error_msg += f'\n{len(pdfs_updated)} PDF(s) actualizados correctamente.'
+            QMessageBox.warning(self, 'Errores al actualizar destinos', error_msg)
+        if self.generation_error is not None:
+            QMessageBox.critical(
+                self, 'Error',
+                f'La actualización de destinos se detuvo por un error:\n{self.generation_error}\n\n'
+                f'{len(pdfs_updated)} PDF(s) se actualizaron antes del error.'
+            )
+        
+        status = f'🎯 Destinos actualizados: {total_links} enlaces en {len(pdfs_updated)} PDF(s)'
+        if failed:
+            status += f' • {len(failed)} con errores'
+        if self.generation_error is not None:
+            status = f'⚠ Actualización interrumpida: {status}'
+        elif cancelled:
+            status = f'⏹ Actualización cancelada: {status}'
+        self.statusBar().showMessage(self.with_analysis_report(status))
+    
+    def finish_restyle(self, cancelled, results):
+        """Muestra el resumen del cambio de estilo de una carpeta"""
+        restyled = [result for result in results if result['output']]
+        skipped = [result for result in results if result.get('skipped')]
+        failed = [result for result in results if result['error']]
+        
+        if failed:
+            error_msg = f'{len(failed)} PDF(s) no se pudieron modificar:\n\n'
+            for result in failed[:10]:
+                error_msg += f"  • {os.path.basename(result['pdf'])}: {result['error']}\n"
+            if len(failed) > 10:
+                error_msg += f'  ... y {len(failed) - 10} más\n'
+            QMessageBox.warning(self, 'Errores al aplicar el estilo', error_msg)
+        if self.generation_error is not None:
+            QMessageBox.critical(
+                self, 'Error',
+                f'El cambio de estilo se detuvo por un error:\n{self.generation_error}\n\n'
+                f'Se aplicó a {len(restyled)} PDF(s) antes del error.'
+            )
+        
+        status = f'🎨 Estilo aplicado a {len(restyled)} PDF(s) interactivo(s)'
+        if skipped:
+            status += f' • {len(skipped)} omitidos (no son PDFs interactivos)'
+        if failed:
+            status += f' • {len(failed)} con errores'
+        if self.generation_error is not None:
+            status = f'⚠ Cambio de estilo interrumpido: {status}'
+        elif cancelled:
+            status = f'⏹ Cambio de estilo cancelado: {status}'
+        self.statusBar().showMessage(status)
+    
+    def with_analysis_report(self, message):
+        """Añade al mensaje de estado el trabajo de extracción ahorrado (ver page_analysis)"""
+        report = self.page_analysis.report()
+        return f'{message} • {report}' if report else message
     
     def coords_match(self, coords1, coords2, tolerance=5):
         """
@@ -3376,109 +4240,21 @@ Distribución por página:
                 return False
         return True
     
-    def calculate_target_coordinates(self, target_page, column, row):
-        """
-        Calcula las coordenadas del cuadrante (celda) en la página destino.
-        
-        Si se detectó la cuadrícula del cajetín, usa las posiciones EXACTAS
-        para crear un rectángulo que cubra todo el cuadrante.
-        
-        Si no, usa el cálculo basado en márgenes y tamaños configurados.
-        """
-        # Obtener dimensiones de la página
-        rect = target_page.rect
-        width = rect.width
-        height = rect.height
-        
-        # Intentar convertir columna a número
-        try:
-            col_num = int(column)
-        except ValueError:
-            if column and column.isalpha():
-                col_num = ord(column.upper()) - ord('A')
-            else:
-                col_num = 0
-        
-        # Calcular índice de fila (A=0, B=1, C=2, etc.)
-        row_index = 0
-        if row:
-            if row.isalpha():
-                if len(row) == 1:
-                    row_index = ord(row.upper()) - ord('A')
-                else:
-                    for i, char in enumerate(row.upper()):
-                        row_index += (ord(char) - ord('A') + 1) * (26 ** (len(row) - i - 1))
-            elif row.isdigit():
-                row_index = int(row)
-        
-        # MÉTODO 1: Si se detectó la cuadrícula del cajetín, usar posiciones EXACTAS
-        if self.grid_detected and self.column_positions and self.row_positions:
-            # Asegurar que los índices estén dentro del rango
-            col_num = max(0, min(col_num, len(self.column_positions) - 2))
-            row_index = max(0, min(row_index, len(self.row_positions) - 2))
-            
-            # Obtener las coordenadas exactas del cuadrante
-            x0 = self.column_positions[col_num]
-            x1 = self.column_positions[col_num + 1] if col_num + 1 < len(self.column_positions) else x0 + 50
-            
-            y0 = self.row_positions[row_index]
-            y1 = self.row_positions[row_index + 1] if row_index + 1 < len(self.row_positions) else y0 + 50
-            
-            # Asegurar que las coordenadas estén dentro de la página
-            x0 = max(0, min(x0, width))
-            x1 = max(0, min(x1, width))
-            y0 = max(0, min(y0, height))
-            y1 = max(0, min(y1, height))
-            
-            return [x0, y0, x1, y1]
-        
-        # MÉTODO 2: Cálculo basado en configuración manual (fallback)
-        margin_left_pct = self.margin_left_spinbox.value() / 100.0
-        margin_top_pct = self.margin_top_spinbox.value() / 100.0
-        
-        margin_left = width * margin_left_pct
-        margin_right = width * margin_left_pct
-        margin_top = height * margin_top_pct
-        margin_bottom = height * margin_top_pct
-        
-        usable_width = width - margin_left - margin_right
-        usable_height = height - margin_top - margin_bottom
-        
-        cols_per_page = self.cols_spinbox.value()
-        rows_per_page = self.rows_spinbox.value()
-        
-        col_sizes = self.parse_sizes(self.col_sizes_input.text(), cols_per_page)
-        row_sizes = self.parse_sizes(self.row_sizes_input.text(), rows_per_page)
-        
-        col_num = max(0, min(col_num, cols_per_page - 1))
-        row_index = max(0, min(row_index, rows_per_page - 1))
-        
-        # Calcular posiciones usando tamaños variables
-        total_col_proportion = sum(col_sizes)
-        total_row_proportion = sum(row_sizes)
-        
-        col_unit = usable_width / total_col_proportion
-        row_unit = usable_height / total_row_proportion
-        
-        # Calcular X0 y X1 del cuadrante
-        x0 = margin_left
-        for i in range(col_num):
-            x0 += col_sizes[i] * col_unit
-        x1 = x0 + col_sizes[col_num] * col_unit
-        
-        # Calcular Y0 y Y1 del cuadrante
-        y0 = margin_top
-        for i in range(row_index):
-            y0 += row_sizes[i] * row_unit
-        y1 = y0 + row_sizes[row_index] * row_unit
-        
-        # Asegurar límites
-        x0 = max(0, min(x0, width))
-        x1 = max(0, min(x1, width))
-        y0 = max(0, min(y0, height))
-        y1 = max(0, min(y1, height))
-        
-        return [x0, y0, x1, y1]
+    def get_grid_settings(self):
+        """Configuración de la cuadrícula actual (ver grid_model.DEFAULT_GRID)"""
+        exact = self.grid_detected and self.column_positions and self.row_positions
+        return {
+            'column_positions': self.column_positions if exact else [],
+            'row_positions': self.row_positions if exact else [],
+            'column_labels': self.column_labels if exact else [],
+            'row_labels': self.row_labels if exact else [],
+            'cols': self.cols_spinbox.value(),
+            'rows': self.rows_spinbox.value(),
+            'margin_left': self.margin_left_spinbox.value(),
+            'margin_top': self.margin_top_spinbox.value(),
+            'col_sizes': self.col_sizes_input.text(),
+            'row_sizes': self.row_sizes_input.text()
+        }
 
 
 def main():
@@ -3495,5 +4271,7 @@ def main():
 
 
 if __name__ == '__main__':
+    # Necesario para el pool de procesos en el ejecutable (PyInstaller)
+    multiprocessing.freeze_support()
     main()
 
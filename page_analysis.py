@@ -0,0 +1,262 @@
+"""
+Análisis de páginas compartido entre las etapas del proceso.
+
+La misma página se abría y se extraía varias veces: para contar las páginas
+antes de detectar, para muestrear el estilo de referencia y probar el patrón
+personalizado, para mostrar los contextos, para detectar la cuadrícula y
+para leer el tamaño de las páginas al generar los enlaces. PageAnalysis
+guarda lo que extrae cada etapa (número de páginas, tamaño y rotación de
+cada página, texto plano, trazos del marco y palabras de las franjas del
+borde) para que las demás lo reutilicen, y cuenta cuánto trabajo de
+extracción se ha ahorrado.
+
+Los datos de cada PDF se invalidan solos si el archivo cambia (fecha de
+modificación o tamaño). Solo se guardan datos de Python, nunca objetos de
+PyMuPDF, así que lo pueden usar a la vez el hilo de la interfaz y los de
+detección y generación.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF para leer PDFs
+
+
+# Textos de página que se mantienen en memoria
+MAX_PAGE_TEXTS = 256
+# Páginas cuya geometría del marco y palabras del borde se mantienen en memoria
+MAX_PAGE_LABELS = 16
+
+# Tipos de extracción que se contabilizan, con su nombre para el resumen
+ANALYSIS_KINDS = OrderedDict([
+    ('pages', 'recuentos de páginas'),
+    ('geometry', 'tamaños de página'),
+    ('text', 'textos de página'),
+    ('segments', 'trazos del marco'),
+    ('words', 'palabras del borde')
+])
+
+
+def file_signature(pdf_path):
+    """(fecha de modificación, tamaño) del archivo, o None si no existe"""
+    try:
+        stat = os.stat(pdf_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def page_geometry(page):
+    """(ancho, alto, rotación) de una página de PyMuPDF (ancho y alto ya rotados)"""
+    rect = page.rect
+    return (rect.width, rect.height, page.rotation)
+
+
+class PageAnalysis:
+    """
+    Datos extraídos de las páginas de los PDFs, por archivo y página.
+
+    documents: ruta -> {'signature', 'num_pages', 'geometry'}, donde
+    geometry tiene un (ancho, alto, rotación) o None por página.
+    Los textos y los datos de la cuadrícula se guardan por (ruta, página,
+    zonas de extracción) en cachés LRU acotadas.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.texts = OrderedDict()
+        self.labels = OrderedDict()
+        self.stats = {kind: {'extracted': 0, 'reused': 0, 'seconds': 0.0} for kind in ANALYSIS_KINDS}
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.texts.clear()
+            self.labels.clear()
+
+    def count(self, kind, reused, seconds=0.0):
+        """Cuenta una extracción (con lo que tardó) o reused reutilizaciones (con el lock)"""
+        stats = self.stats[kind]
+        if reused:
+            stats['reused'] += reused
+        else:
+            stats['extracted'] += 1
+            stats['seconds'] += seconds
+
+    def document(self, pdf_path):
+        """Datos guardados del PDF si el archivo no ha cambiado desde entonces (con el lock)"""
+        document = self.documents.get(pdf_path)
+        if document is not None and document['signature'] != file_signature(pdf_path):
+            self.forget(pdf_path)
+            document = None
+        return document
+
+    def forget(self, pdf_path):
+        """Descarta todo lo guardado de un PDF (con el lock)"""
+        self.documents.pop(pdf_path, None)
+        for cache in (self.texts, self.labels):
+            for key in [key for key in cache if key[0] == pdf_path]:
+                del cache[key]
+
+    # --- Documento -------------------------------------------------------
+
+    def page_count(self, pdf_path):
+        """
+        Número de páginas del PDF, abriéndolo solo si no se conoce.
+
+        Raises:
+            Las excepciones de fitz.open si el PDF no se puede abrir
+        """
+        with self.lock:
+            document = self.document(pdf_path)
+            if document is not None:
+                self.count('pages', 1)
+                return document['num_pages']
+        start = time.perf_counter()
+        signature = file_signature(pdf_path)
+        doc = fitz.open(pdf_path)
+        try:
+            num_pages = len(doc)
+        finally:
+            doc.close()
+        with self.lock:
+            self.count('pages', 0, time.perf_counter() - start)
+            self.documents[pdf_path] = {'signature': signature, 'num_pages': num_pages,
+                                        'geometry': [None] * num_pages}
+        return num_pages
+
+    def note_document(self, pdf_path, doc):
+        """Registra el número de páginas de un PDF que otra etapa ya ha abierto"""
+        with self.lock:
+            if self.document(pdf_path) is None:
+                self.documents[pdf_path] = {'signature': file_signature(pdf_path), 'num_pages': len(doc),
+                                            'geometry': [None] * len(doc)}
+
+    def record_geometry(self, pdf_path, start, geometry):
+        """Guarda el (ancho, alto, rotación) de las páginas start, start + 1... de un PDF ya contado"""
+        with self.lock:
+            document = self.document(pdf_path)
+            if document is None:
+                return
+            for page_num, page_info in enumerate(geometry, start):
+                if page_info is not None and page_num < document['num_pages']:
+                    if document['geometry'][page_num] is None:
+                        self.count('geometry', 0)
+                    document['geometry'][page_num] = page_info
+
+    def page_sizes(self, pdf_path):
+        """
+        (ancho, alto) de cada página del PDF si se conocen todas (ver
+        pdf_generation.get_page_sizes), o None si falta alguna.
+        """
+        with self.lock:
+            document = self.document(pdf_path)
+            if document is None or None in document['geometry']:
+                return None
+            self.count('geometry', len(document['geometry']))
+            return [(width, height) for width, height, _ in document['geometry']]
+
+    # --- Páginas ---------------------------------------------------------
+
+    def cached(self, cache, key, kind):
+        """Valor guardado (o None) contando la reutilización (con el lock)"""
+        if self.document(key[0]) is None:
+            return None
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            self.count(kind, 1)
+        return value
+
+    def store(self, cache, key, kind, value, seconds, limit):
+        """
+        Guarda un valor extraído si se conoce su PDF (sin firma no se podría
+        invalidar). seconds es None si lo extrajo otra etapa como parte de su
+        propio trabajo (no cuenta como extracción del análisis).
+        """
+        with self.lock:
+            if seconds is not None:
+                self.count(kind, 0, seconds)
+            if self.document(key[0]) is None:
+                return
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > limit:
+                cache.popitem(last=False)
+
+    def page_text(self, pdf_path, page_num, regions, extract):
+        """
+        Texto de una página, extrayéndolo con extract() si no está guardado.
+
+        El texto se guarda por zonas de extracción (ver text_regions), así
+        que el mismo sirve para el muestreo, la detección y los contextos
+        siempre que el texto plano coincida con el del mapa de caracteres
+        (ver detection_engine.plain_text_matches_char_map).
+        """
+        key = (pdf_path, page_num, regions)
+        with self.lock:
+            text = self.cached(self.texts, key, 'text')
+        if text is not None:
+            return text
+        start = time.perf_counter()
+        text = extract()
+        self.store_text(pdf_path, page_num, regions, text, time.perf_counter() - start)
+        return text
+
+    def store_text(self, pdf_path, page_num, regions, text, seconds=None):
+        """Guarda el texto de una página ya extraído en otra etapa"""
+        self.store(self.texts, (pdf_path, page_num, regions), 'text', text, seconds, MAX_PAGE_TEXTS)
+
+    def page_labels(self, pdf_path, page_num, regions, kind, extract):
+        """
+        Trazos del marco ('segments', ver grid_detection.extract_segments) o
+        palabras de las franjas del borde ('words', ver
+        text_regions.TextRegions.label_words) de una página, extrayéndolos
+        con extract() si no están guardados.
+        """
+        key = (pdf_path, page_num, regions, kind)
+        with self.lock:
+            value = self.cached(self.labels, key, kind)
+        if value is not None:
+            return value
+        start = time.perf_counter()
+        value = extract()
+        self.store(self.labels, key, kind, value, time.perf_counter() - start, MAX_PAGE_LABELS)
+        return value
+
+    # --- Resumen ---------------------------------------------------------
+
+    def summary(self):
+        """
+        Trabajo de extracción por tipo: {'extracted', 'reused', 'seconds',
+        'saved_seconds'}; saved_seconds estima el tiempo ahorrado con la
+        media de lo que costó cada extracción de ese tipo (los tamaños de
+        página se leen durante la detección sin coste aparte, así que de
+        ellos solo se cuentan las reutilizaciones).
+        """
+        with self.lock:
+            summary = {}
+            for kind, stats in self.stats.items():
+                average = stats['seconds'] / stats['extracted'] if stats['extracted'] else 0.0
+                summary[kind] = {
+                    'extracted': stats['extracted'],
+                    'reused': stats['reused'],
+                    'seconds': round(stats['seconds'], 3),
+                    'saved_seconds': round(average * stats['reused'], 3)
+                }
+            return summary
+
+    def report(self):
+        """Resumen para la barra de estado ('' si no se ha reutilizado nada)"""
+        summary = self.summary()
+        reused = [f"{stats['reused']} {ANALYSIS_KINDS[kind]}"
+                  for kind, stats in summary.items() if stats['reused']]
+        if not reused:
+            return ''
+        report = f"Reutilizados: {', '.join(reused)}"
+        saved = sum(stats['saved_seconds'] for stats in summary.values())
+        if saved >= 0.05:
+            report += f' (≈{saved:.1f} s de extracción ahorrados)'
+        return report
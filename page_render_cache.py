@@ -0,0 +1,140 @@
+"""
+Caché de páginas renderizadas para el editor visual de cuadrícula.
+
+Renderizar una hoja grande (A0, tamaño E) en cada cambio de página o en cada
+paso del control de zoom es lento. Las páginas se renderizan por tramos de
+zoom (ZOOM_BUCKETS): dentro del mismo tramo la imagen ya renderizada solo se
+escala en la escena, y cada imagen se guarda en una caché LRU con un límite
+de memoria. Un hilo de fondo (ver PageRenderWorker en main.py) renderiza por
+adelantado las páginas vecinas y los tramos de zoom contiguos; el renderizado
+en sí se hace en un proceso aparte, porque PyMuPDF no admite usarse desde
+varios hilos a la vez.
+"""
+from collections import OrderedDict
+
+from PyQt5.QtGui import QImage
+import fitz  # PyMuPDF para leer PDFs
+
+
+# Tramos de zoom (el control va del 25 % al 200 %)
+ZOOM_BUCKETS = (0.5, 1.0, 1.5, 2.0)
+# Se renderiza al doble del tramo para que la imagen reducida se vea nítida
+RENDER_OVERSAMPLING = 2
+# Límite de píxeles de una imagen (las hojas enormes se renderizan a menos resolución)
+MAX_RENDER_PIXELS = 40_000_000
+# Memoria por defecto de la caché (MB)
+DEFAULT_CACHE_LIMIT_MB = 256
+# Documentos abiertos en el proceso de renderizado
+MAX_OPEN_DOCS = 4
+
+_open_docs = OrderedDict()   # ruta -> documento (solo en el proceso de renderizado)
+
+
+def zoom_bucket(zoom_factor):
+    """Tramo de zoom (el menor que no es inferior al zoom pedido)"""
+    for bucket in ZOOM_BUCKETS:
+        if zoom_factor <= bucket:
+            return bucket
+    return ZOOM_BUCKETS[-1]
+
+
+def neighbour_buckets(bucket):
+    """Tramos de zoom contiguos a uno dado"""
+    index = ZOOM_BUCKETS.index(bucket)
+    return [ZOOM_BUCKETS[i] for i in (index - 1, index + 1) if 0 <= i < len(ZOOM_BUCKETS)]
+
+
+def render_page_samples(page, bucket):
+    """Renderiza una página para un tramo de zoom: (ancho, alto, stride, bytes RGB)"""
+    scale = bucket * RENDER_OVERSAMPLING
+    pixels = page.rect.width * page.rect.height * scale * scale
+    if pixels > MAX_RENDER_PIXELS:
+        scale *= (MAX_RENDER_PIXELS / pixels) ** 0.5
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    return pix.width, pix.height, pix.stride, pix.samples
+
+
+def image_from_samples(samples):
+    """QImage con su propia copia de los píxeles (se puede usar desde otro hilo)"""
+    width, height, stride, data = samples
+    return QImage(data, width, height, stride, QImage.Format_RGB888).copy()
+
+
+def render_page_image(page, bucket):
+    """Renderiza una página para un tramo de zoom y devuelve un QImage"""
+    return image_from_samples(render_page_samples(page, bucket))
+
+
+def render_pdf_page(pdf_path, page_num, bucket):
+    """
+    Renderiza una página de un PDF en el proceso de renderizado, reutilizando
+    los documentos abiertos. Devuelve lo mismo que render_page_samples.
+    """
+    doc = _open_docs.pop(pdf_path, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        while len(_open_docs) >= MAX_OPEN_DOCS:
+            _open_docs.popitem(last=False)[1].close()
+    _open_docs[pdf_path] = doc
+    return render_page_samples(doc[page_num], bucket)
+
+
+class PageRenderCache:
+    """
+    Caché LRU de páginas renderizadas, con clave (pdf, página, tramo de zoom)
+    y un límite de memoria. Solo se usa desde el hilo de la interfaz.
+    """
+
+    def __init__(self, limit_mb=DEFAULT_CACHE_LIMIT_MB):
+        self.items = OrderedDict()   # clave -> (pixmap, bytes)
+        self.total_bytes = 0
+        self.set_limit(limit_mb)
+
+    def set_limit(self, limit_mb):
+        """Cambia el límite de memoria (MB) y descarta lo que sobre"""
+        self.limit_bytes = max(0, int(limit_mb)) * 1024 * 1024
+        self.evict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        """Imagen guardada (marcada como la más reciente) o None"""
+        entry = self.items.get(key)
+        if entry is None:
+            return None
+        self.items.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, pixmap):
+        """Guarda una imagen y descarta las menos usadas si se supera el límite"""
+        size = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self.items[key] = (pixmap, size)
+        self.total_bytes += size
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Descarta las imágenes menos usadas hasta cumplir el límite (salvo keep)"""
+        while self.total_bytes > self.limit_bytes and self.items:
+            key = next(iter(self.items))
+            if key == keep:
+                if len(self.items) == 1:
+                    break
+                self.items.move_to_end(key)
+                continue
+            self.total_bytes -= self.items.pop(key)[1]
+
+    def discard_pdf(self, pdf_path):
+        """Descarta las imágenes de un PDF (por ejemplo, si ha cambiado en disco)"""
+        for key in [key for key in self.items if key[0] == pdf_path]:
+            self.total_bytes -= self.items.pop(key)[1]
+
+    def clear(self):
+        self.items.clear()
+        self.total_bytes = 0
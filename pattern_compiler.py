@@ -0,0 +1,339 @@
+"""
+Compilación de los patrones de referencia con un prefiltro de literales.
+
+La mayoría de las páginas de un juego de planos tienen pocas referencias (o
+ninguna), pero extraer el texto con la caja de cada carácter (rawdict) es
+lo más caro de la detección. Cada patrón se analiza una vez para sacar los
+literales que toda coincidencia debe contener (la '/' de '/1.0-A', el '-' de
+'25-A.0', los paréntesis de '(1-A-0)'...). Con el texto plano de la página,
+que es casi gratis una vez construida la página de texto de PyMuPDF, se
+descartan las páginas sin esos literales y, si los tienen, se comprueba que
+el patrón encuentra algo antes de construir las cajas de los caracteres.
+
+Ver benchmark_patterns.py para medir la ganancia con PDFs reales.
+
+Si se eligen varios estilos a la vez (proyectos con planos de distintos
+proveedores), MultiReferencePattern los une en una sola alternancia con un
+grupo con nombre por estilo, de modo que el texto de cada página se recorre
+una sola vez y cada estilo conserva su orden de grupos.
+"""
+import re
+
+try:
+    from re import _parser as sre_parse   # Python 3.11+
+except ImportError:
+    import sre_parse
+
+
+# Prefijo de los grupos con nombre de cada estilo en la alternancia
+STYLE_GROUP = '_estilo'
+
+
+class CompiledReferencePattern:
+    """
+    Patrón de referencia compilado con su prefiltro.
+
+    literals: textos que aparecen en toda coincidencia (vacío si no se pudo
+    deducir ninguno; entonces solo decide el regex).
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.literals = required_literals(pattern)
+
+    def may_match(self, text):
+        """False si el texto no puede contener ninguna coincidencia (sin ejecutar el regex)"""
+        for literal in self.literals:
+            if literal not in text:
+                return False
+        return True
+
+    def has_match(self, text):
+        """True si el patrón encuentra al menos una coincidencia en el texto"""
+        return self.may_match(text) and self.regex.search(text) is not None
+
+    def finditer(self, text):
+        if not self.may_match(text):
+            return iter(())
+        return self.regex.finditer(text)
+
+    def iter_references(self, text, groups_order):
+        """
+        Coincidencias del texto como (inicio, fin, página, columna, fila),
+        asignando los grupos según groups_order.
+        """
+        for match in self.finditer(text):
+            # Extraer los grupos según el orden del patrón
+            group1 = match.group(1) if match.lastindex >= 1 else ''
+            group2 = match.group(2) if match.lastindex >= 2 else ''
+            group3 = match.group(3) if match.lastindex >= 3 else ''
+            yield (match.start(), match.end(), *assign_groups((group1, group2, group3), groups_order))
+
+    def cache_key(self, groups_order):
+        """(patrón, orden de los grupos) con los que se guardan sus resultados en la caché"""
+        return self.pattern, tuple(groups_order)
+
+
+class MultiReferencePattern:
+    """
+    Varios estilos de referencia buscados en una sola pasada.
+
+    styles: [(nombre, regex, orden de los grupos)] en orden de prioridad.
+    Cada regex va en un grupo con nombre de una única alternancia. Si dos
+    estilos coinciden en la misma posición gana el más largo (y, a igual
+    longitud, el primero). Si una coincidencia de un estilo anterior empieza
+    dentro de la elegida, gana la del estilo anterior: en 'Motor M0 /1.0-B'
+    la referencia es '/1.0-B' y no 'M0 /1' (estilo A1/25). Las coincidencias
+    no se solapan.
+
+    Los patrones que no se pueden unir (referencias a grupos como \1 o
+    flags globales) se buscan por separado con la misma regla.
+    """
+
+    def __init__(self, styles):
+        self.styles = [
+            (name, CompiledReferencePattern(regex), tuple(groups_order))
+            for name, regex, groups_order in styles
+        ]
+        self.pattern = '|'.join(
+            f'(?P<{STYLE_GROUP}{index}>{style.pattern})'
+            for index, (_, style, _) in enumerate(self.styles)
+        )
+        self.regex = None
+        self.style_groups = {}   # número del grupo de cada estilo -> índice del estilo
+        if all(can_combine(style.pattern) for _, style, _ in self.styles):
+            try:
+                self.regex = re.compile(self.pattern)
+            except re.error:
+                self.regex = None
+        if self.regex is not None:
+            for index in range(len(self.styles)):
+                self.style_groups[self.regex.groupindex[f'{STYLE_GROUP}{index}']] = index
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.styles]
+
+    def may_match(self, text):
+        return any(style.may_match(text) for _, style, _ in self.styles)
+
+    def has_match(self, text):
+        if self.regex is not None:
+            return self.may_match(text) and self.regex.search(text) is not None
+        return any(style.has_match(text) for _, style, _ in self.styles)
+
+    def iter_references(self, text, groups_order=None):
+        """
+        Coincidencias de todos los estilos como (inicio, fin, página, columna,
+        fila), cada una con el orden de grupos de su estilo (groups_order se
+        ignora).
+        """
+        candidates = [index for index, (_, style, _) in enumerate(self.styles) if style.may_match(text)]
+        if not candidates:
+            return
+        if self.regex is None:
+            yield from self.iter_separate(text, candidates)
+            return
+
+        pos = 0
+        while True:
+            match = self.regex.search(text, pos)
+            if match is None:
+                return
+            index = self.style_groups[match.lastindex]
+            group = match.lastindex
+            values = [match.group(group + i) for i in range(1, 4) if i <= self.styles[index][1].regex.groups]
+            start, end, index, values = self.resolve_overlap(
+                text, match.start(), match.end(), index, values, candidates
+            )
+
+            yield (start, end, *assign_groups([value or '' for value in values], self.styles[index][2]))
+            pos = end if end > start else start + 1
+
+    def resolve_overlap(self, text, start, end, index, values, candidates):
+        """
+        Aplica la prioridad de los estilos a la coincidencia más a la
+        izquierda (inicio, fin, estilo, valores de los grupos) y devuelve la
+        que gana con el mismo formato.
+        """
+        while True:
+            # Los estilos posteriores también pueden coincidir aquí (los
+            # anteriores no, se han probado antes): gana el más largo
+            for other in candidates:
+                if other <= index:
+                    continue
+                longer = self.styles[other][1].regex.match(text, start)
+                if longer is not None and longer.end() > end:
+                    index, end = other, longer.end()
+                    values = list(longer.groups()[:3])
+
+            # Un estilo anterior que empieza dentro de la coincidencia la sustituye
+            earlier = [other for other in candidates if other < index]
+            preferred = None
+            for pos in range(start + 1, end) if earlier else ():
+                for other in earlier:
+                    match = self.styles[other][1].regex.match(text, pos)
+                    if match is not None and match.end() > pos:
+                        preferred = other, match
+                        break
+                if preferred is not None:
+                    break
+            if preferred is None:
+                return start, end, index, values
+            index, match = preferred
+            start, end = match.start(), match.end()
+            values = list(match.groups()[:3])
+
+    def iter_separate(self, text, candidates):
+        """Misma regla que iter_references, buscando cada estilo por separado"""
+        next_matches = {}   # estilo -> siguiente coincidencia desde pos
+        pos = 0
+        while True:
+            best = best_index = None
+            for index in candidates:
+                match = next_matches.get(index, False)
+                if match is False or (match is not None and match.start() < pos):
+                    match = next_matches[index] = self.styles[index][1].regex.search(text, pos)
+                if match is None:
+                    continue
+                if best is None or (match.start(), -match.end()) < (best.start(), -best.end()):
+                    best, best_index = match, index
+            if best is None:
+                return
+            start, end, index, values = self.resolve_overlap(
+                text, best.start(), best.end(), best_index, list(best.groups()[:3]), candidates
+            )
+            values = [value or '' for value in values]
+            yield (start, end, *assign_groups(values, self.styles[index][2]))
+            pos = end if end > start else start + 1
+
+    def cache_key(self, groups_order=None):
+        """(patrón, orden de los grupos) con los que se guardan sus resultados en la caché"""
+        return self.pattern, tuple('.'.join(order) for _, _, order in self.styles)
+
+
+def assign_groups(values, groups_order):
+    """Asigna los valores de los grupos a (página, columna, fila) según su orden"""
+    page_ref, column_ref, row_ref = '', '', ''
+    for i, group_name in enumerate(groups_order):
+        value = values[i] if i < len(values) else ''
+        if group_name == 'página':
+            page_ref = value
+        elif group_name == 'columna':
+            column_ref = value
+        elif group_name == 'fila':
+            row_ref = value
+    return page_ref, column_ref, row_ref
+
+
+def can_combine(pattern):
+    """False si el patrón no se puede meter en una alternancia sin cambiar su significado"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return False
+    if parsed.state.flags & ~(re.UNICODE | re.ASCII):
+        # Flags globales como (?i): dentro de la alternancia no son válidos
+        return False
+
+    def has_group_reference(value):
+        if isinstance(value, sre_parse.SubPattern):
+            return any(
+                str(op) in ('GROUPREF', 'GROUPREF_EXISTS') or has_group_reference(arg)
+                for op, arg in value
+            )
+        if isinstance(value, (list, tuple)):
+            return any(has_group_reference(item) for item in value)
+        return False
+
+    # Las referencias numéricas (\1) cambiarían de grupo al unir los patrones
+    return not has_group_reference(parsed)
+
+
+def compile_reference_styles(styles):
+    """
+    Compila los estilos elegidos [(nombre, regex, orden de los grupos)].
+
+    Returns:
+        (patrón compilado, orden de los grupos): un solo estilo da un
+        CompiledReferencePattern con su orden; varios, un
+        MultiReferencePattern (cada estilo lleva el suyo)
+    """
+    if len(styles) == 1:
+        _, regex, groups_order = styles[0]
+        return CompiledReferencePattern(regex), tuple(groups_order)
+    multi = MultiReferencePattern(styles)
+    return multi, multi.cache_key()[1]
+
+
+def compile_reference_pattern(pattern):
+    """Compila un patrón (texto, re.Pattern o ya compilado, también con regex_guard)"""
+    if isinstance(pattern, re.Pattern):
+        pattern = pattern.pattern
+    if not isinstance(pattern, str):
+        return pattern
+    return CompiledReferencePattern(pattern)
+
+
+def required_literals(pattern):
+    """
+    Literales que toda coincidencia del patrón debe contener, de mayor a
+    menor longitud. Solo se recorren los elementos obligatorios de la
+    secuencia principal (y de sus grupos); las alternativas, las
+    repeticiones opcionales y los patrones que ignoran mayúsculas no
+    aportan literales.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return ()
+    if parsed.state.flags & re.IGNORECASE:
+        return ()
+
+    literals = set()
+    run = []
+
+    def flush():
+        if run:
+            literals.add(''.join(run))
+            run.clear()
+
+    def walk(items):
+        for op, arg in items:
+            name = str(op)
+            char = single_char(name, arg)
+            if char is not None:
+                run.append(char)
+            elif name == 'SUBPATTERN':
+                # (grupo, flags añadidos, flags quitados, contenido)
+                if arg[1] & re.IGNORECASE:
+                    flush()
+                    continue
+                walk(arg[-1])
+            elif name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+                minimum, _, content = arg
+                flush()
+                if minimum >= 1:
+                    # Lo repetido aparece al menos una vez, pero no se sabe cuántas
+                    walk(content)
+                    flush()
+            elif name == 'AT':
+                # Anclas (^, $, \b): no consumen texto
+                continue
+            else:
+                flush()
+
+    walk(parsed)
+    flush()
+    return tuple(sorted(literals, key=len, reverse=True))
+
+
+def single_char(name, arg):
+    """Carácter que coincide con un elemento del patrón si solo admite uno, o None"""
+    if name == 'LITERAL':
+        return chr(arg)
+    if name == 'IN' and len(arg) == 1 and str(arg[0][0]) == 'LITERAL':
+        # Clase con un solo carácter, como [-] o [/]
+        return chr(arg[0][1])
+    return None
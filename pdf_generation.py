@@ -0,0 +1,1113 @@
+"""
+Generación de los PDFs interactivos sin dependencias de Qt.
+
+Contiene el código JavaScript de resaltado (a partir de la configuración de
+estilos), el cálculo de las coordenadas del cuadrante destino (a partir de la
+configuración de la cuadrícula) y la escritura de los enlaces en el PDF.
+Lo usan tanto la interfaz como el modo por lotes (batch.py).
+
+Hay dos formas de escribir los enlaces:
+- 'incremental' (por defecto): con PyMuPDF se añaden al final del archivo
+  solo los objetos nuevos (anotaciones, páginas modificadas y JavaScript),
+  sin reescribir el resto. El coste depende del número de enlaces y no del
+  tamaño del PDF.
+- 'pypdf2': se copian todas las páginas a un PdfWriter y se reescribe el
+  archivo completo (método original).
+
+Cuando hay varios PDFs, cada uno se genera en un proceso de un pool (ver
+iter_generate_pdfs) y los errores de cada archivo se devuelven en su
+resultado en lugar de interrumpir el lote.
+
+Al retocar la cuadrícula no hace falta volver a detectar ni a generar:
+retarget_interactive_pdf vuelve a calcular los destinos de todos los enlaces
+de una vez (ver compute_target_coordinates) y solo cambia el destino y el
+JavaScript de los enlaces ya escritos en los PDFs generados. Del mismo modo,
+restyle_interactive_pdf cambia el estilo del resaltado sustituyendo solo el
+JavaScript de documento (ver iter_restyle_pdfs para una carpeta entera).
+
+Los enlaces se pueden escribir de dos formas (ver LINK_LAYOUTS):
+- 'inline' (por defecto): cada enlace lleva su propia acción GoTo con la
+  llamada highlight(página, [x0, y0, x1, y1]).
+- 'compact': cada destino distinto (página, columna, fila) se guarda una sola
+  vez, en una tabla de JavaScript de documento (targets) y en una acción
+  GoTo compartida; el enlace solo apunta a esa acción, que llama a
+  highlightTarget(índice). Ocupa menos con miles de enlaces (ver
+  benchmark_links.py).
+"""
+import os
+import re
+import time
+import shutil
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF para leer PDFs
+import numpy as np
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DictionaryObject, NameObject, ArrayObject, NumberObject, createStringObject
+
+from detection_engine import init_pool_worker, resolve_worker_count
+
+
+# Colores de resaltado para JavaScript
+HIGHLIGHT_COLORS = {
+    'Rojo': 'color.red',
+    'Verde': 'color.green',
+    'Azul': 'color.blue',
+    'Amarillo': 'color.yellow',
+    'Naranja': '["RGB", 0.976, 0.451, 0.086]',
+    'Magenta': 'color.magenta',
+    'Cian': 'color.cyan'
+}
+
+# Colores de relleno para JavaScript ('Mismo que borde' usa el de resaltado)
+FILL_COLORS = dict(HIGHLIGHT_COLORS, **{
+    'Blanco': 'color.white',
+    'Negro': 'color.black'
+})
+
+# Velocidad de parpadeo en milisegundos
+BLINK_SPEEDS = {
+    'Rápido': 300,
+    'Normal': 500,
+    'Lento': 800,
+    'Sin parpadeo': 0
+}
+
+# Formas de escribir los enlaces en el PDF
+BACKEND_INCREMENTAL = 'incremental'
+BACKEND_REWRITE = 'pypdf2'
+GENERATION_BACKENDS = (BACKEND_INCREMENTAL, BACKEND_REWRITE)
+
+# Forma de guardar los destinos de los enlaces
+LINK_LAYOUT_INLINE = 'inline'
+LINK_LAYOUT_COMPACT = 'compact'
+LINK_LAYOUTS = (LINK_LAYOUT_INLINE, LINK_LAYOUT_COMPACT)
+
+# Referencia a un objeto dentro de un array PDF ('12 0 R')
+PDF_REFERENCE = re.compile(r'\d+\s+\d+\s+R\b')
+# Partes de un enlace generado tal como las escribe PyMuPDF (ver xref_object)
+LINK_RECT = re.compile(r'/Rect\s*\[([^\]]*)\]')
+LINK_DESTINATION = re.compile(r'/D\s*\[[^\]]*\]')
+LINK_HIGHLIGHT = re.compile(r'/JS\s*\(highlight\\?\((?:\\.|[^\\)])*\)')
+# Acción compartida de un enlace compacto y su llamada a la tabla de destinos
+LINK_ACTION = re.compile(r'/A\s*(\d+)\s+\d+\s+R')
+TARGET_CALL = re.compile(r'highlightTarget\\?\((\d+)\\?\)')
+
+# Nombre del script de documento en el árbol /Names /JavaScript
+DOCUMENT_JS_NAME = 'highlight'
+# Nombre de la tabla de destinos de los enlaces compactos en el mismo árbol
+DOCUMENT_TARGETS_NAME = 'targets'
+# Función que define la tabla de destinos (identifica su script)
+TARGETS_FUNCTION = 'function highlightTarget('
+
+# Valores por defecto de la interfaz (claves de styles_config.json)
+DEFAULT_STYLES = {
+    'rect_color': 'Rojo',
+    'line_width': 3,
+    'line_style': 'Sólida',
+    'blink_speed': 'Normal',
+    'duration': 5,
+    'fill_style': 'Sin relleno',
+    'animation_type': 'Parpadeo',
+    'fill_color': 'Mismo que borde',
+    'rect_margin': 0
+}
+
+def build_javascript_code(styles):
+    """
+    Genera el código JavaScript de resaltado a partir de la configuración de
+    estilos (mismas claves que styles_config.json)
+    """
+    styles = dict(DEFAULT_STYLES, **(styles or {}))
+
+    color = HIGHLIGHT_COLORS.get(styles['rect_color'], 'color.red')
+    line_width = styles['line_width']
+    blink_speed = BLINK_SPEEDS.get(styles['blink_speed'], 500)
+    duration = styles['duration'] * 1000
+
+    fill_style = styles['fill_style']
+    if styles['fill_color'] == 'Mismo que borde':
+        fill_color = color
+    else:
+        fill_color = FILL_COLORS.get(styles['fill_color'], 'color.red')
+    animation_type = styles['animation_type']
+    margin = styles['rect_margin']
+
+    # Configurar el estilo de relleno
+    fill_code = ""
+    if fill_style == 'Semitransparente':
+        fill_code = f"f.fillColor = {fill_color};"
+    elif fill_style == 'Sólido':
+        fill_code = f"f.fillColor = {fill_color};"
+
+    # Aplicar margen a las coordenadas
+    margin_code = ""
+    if margin != 0:
+        margin_code = f"""
+    coordinates[0] -= {margin};
+    coordinates[1] -= {margin};
+    coordinates[2] += {margin};
+    coordinates[3] += {margin};"""
+
+    # Configurar el estilo de línea (para JavaScript de Acrobat es limitado)
+    line_style = styles['line_style']
+    line_style_code = ""
+    if line_style == 'Discontinua':
+        line_style_code = "f.borderStyle = border.d;"  # Dashed
+    elif line_style == 'Punteada':
+        line_style_code = "f.borderStyle = border.d;"  # Similar a dashed
+
+    # Generar código de animación según el tipo
+    if animation_type == 'Sin animación' or blink_speed == 0:
+        blinker_code = "// Sin animación"
+        interval_code = ""
+    elif animation_type == 'Fade In/Out':
+        blinker_code = """var f = getField('Target');
+    if (f != null) {
+        var oldDirty = dirty;
+        // Fade effect simulado con visibilidad
+        if (interval.counter++%2) { f.hidden=false; }
+        else { f.hidden = true; }
+        dirty = oldDirty;
+    }"""
+        interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
+    elif animation_type == 'Pulso':
+        blinker_code = """var f = getField('Target');
+    if (f != null) {
+        var oldDirty = dirty;
+        // Efecto pulso
+        if (interval.counter++%2) { f.hidden=false; }
+        else { f.hidden = true; }
+        dirty = oldDirty;
+    }"""
+        interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
+    else:  # Parpadeo normal
+        blinker_code = """var f = getField('Target');
+    if (f != null) {
+        var oldDirty = dirty;
+        if (interval.counter++%2) { f.hidden=false; }
+        else { f.hidden = true; }
+        dirty = oldDirty;
+    }"""
+        interval_code = f"interval = app.setInterval('blinker()', {blink_speed});\n    interval.counter = 0;"
+
+    return f"""
+function finish() {{
+    app.clearInterval(interval);
+    var oldDirty = dirty;
+    removeField('Target');
+    dirty = oldDirty;
+}}
+
+function blinker() {{
+    {blinker_code}
+}}
+
+function highlight(page, coordinates) {{
+    var f = getField('Target');
+    if (f != null) {{
+        app.clearTimeOut(timer);
+        finish();
+    }}{margin_code}
+    var oldDirty = dirty;
+    var f = addField('Target', 'button', page, coordinates);
+    f.lineWidth = {line_width};
+    f.strokeColor = {color};
+    {fill_code}
+    {line_style_code}
+    dirty = oldDirty;
+    {interval_code}
+    timer = app.setTimeOut('finish()', {duration});
+}}
+"""
+
+
+def get_page_sizes(doc):
+    """(ancho, alto) de cada página de un documento de PyMuPDF"""
+    return [(page.rect.width, page.rect.height) for page in doc]
+
+
+def target_page_numbers(references, num_pages):
+    """Páginas destino (índice desde 0) a las que apuntan las referencias"""
+    pages = set()
+    for reference in references:
+        try:
+            target_page_num = int(reference[1]) - 1
+        except ValueError:
+            continue
+        if 0 <= target_page_num < num_pages:
+            pages.add(target_page_num)
+    return sorted(pages)
+
+
+def resolve_page_grids(doc, references, profiles):
+    """Cuadrícula de cada página destino según su plantilla (None sin perfiles)"""
+    if profiles is None:
+        return None
+    return profiles.page_grids(doc, target_page_numbers(references, len(doc)))
+
+
+def compute_link_table(page_sizes, references, grid, page_grids=None):
+    """
+    Calcula los enlaces de un PDF: rectángulo de origen y cuadrante destino,
+    ya convertidos a coordenadas PDF estándar (origen abajo a la izquierda).
+
+    Args:
+        page_sizes: (ancho, alto) de cada página (ver get_page_sizes)
+        references: Tuplas (full, page, column, row, pdf_page, x0, y0, x1, y1)
+            (ver ReferenceStore.link_sources)
+        grid: Modelo de la cuadrícula (ver grid_model.GridModel)
+        page_grids: {página: GridModel} opcional con la cuadrícula de la
+            plantilla de cada página destino (ver grid_profiles); las páginas
+            que no están usan grid
+
+    Returns:
+        Lista de diccionarios con los datos de cada enlace
+    """
+    links = []
+
+    for full, page, column, row, source_page_num, x0, y0, x1, y1 in references:
+        # Convertir coordenadas de PyMuPDF a coordenadas PDF estándar
+        page_height = page_sizes[source_page_num][1]
+        pdf_y0 = page_height - y1
+        pdf_y1 = page_height - y0
+
+        # Página destino (donde debe ir al hacer clic)
+        try:
+            target_page_num = int(page) - 1
+        except ValueError:
+            continue
+
+        # Verificar que la página destino existe
+        if target_page_num < 0 or target_page_num >= len(page_sizes):
+            continue
+
+        links.append({
+            'full': full,
+            'page': page,
+            'column': column,
+            'row': row,
+            'pdf_page': source_page_num,
+            'coordinates': [x0, pdf_y0, x1, pdf_y1],
+            'target_page': target_page_num,
+            'target_coordinates': None
+        })
+
+    # Coordenadas de destino basadas en columna y fila, todas de una vez
+    target_coordinates = compute_target_coordinates(
+        page_sizes,
+        [link['target_page'] for link in links],
+        [link['column'] for link in links],
+        [link['row'] for link in links],
+        grid, page_grids
+    )
+    for link, target_pdf_coords in zip(links, target_coordinates):
+        link['target_coordinates'] = target_pdf_coords
+
+    return links
+
+
+def compute_target_coordinates(page_sizes, target_pages, columns, rows, grid, page_grids=None):
+    """
+    Cuadrante destino de muchos enlaces a la vez con NumPy (ver
+    grid_model.GridModel.cell_rects), en coordenadas PDF estándar.
+
+    Args:
+        page_sizes: (ancho, alto) de cada página (ver get_page_sizes)
+        target_pages: Página destino de cada enlace (índice desde 0)
+        columns, rows: Columna y fila de cada enlace
+        grid: Modelo de la cuadrícula
+        page_grids: {página: GridModel} opcional (ver compute_link_table)
+
+    Returns:
+        Lista de [x0, y0, x1, y1] por enlace
+    """
+    if not target_pages:
+        return []
+    sizes = np.asarray(page_sizes, dtype=float).reshape(-1, 2)
+    pages = np.asarray(target_pages, dtype=np.intp)
+    columns = np.asarray(columns, dtype=str)
+    rows = np.asarray(rows, dtype=str)
+    widths = sizes[pages, 0]
+    heights = sizes[pages, 1]
+
+    # Enlaces agrupados por la cuadrícula de su página destino
+    unique_pages, page_inverse = np.unique(pages, return_inverse=True)
+    grids = [grid]
+    grid_numbers = np.zeros(len(unique_pages), dtype=np.intp)
+    if page_grids:
+        for index, page_num in enumerate(unique_pages.tolist()):
+            page_grid = page_grids.get(page_num, grid)
+            if page_grid not in grids:
+                grids.append(page_grid)
+            grid_numbers[index] = grids.index(page_grid)
+    link_grids = grid_numbers[page_inverse.ravel()]
+
+    coordinates = np.empty((len(pages), 4))
+    for number, target_grid in enumerate(grids):
+        selected = link_grids == number
+        if not selected.any():
+            continue
+        rects = target_grid.cell_rects(widths[selected], heights[selected], columns[selected], rows[selected])
+        # Convertir a coordenadas PDF estándar (origen abajo a la izquierda)
+        target_heights = heights[selected]
+        coordinates[selected] = np.column_stack([
+            rects[:, 0],
+            target_heights - rects[:, 3],
+            rects[:, 2],
+            target_heights - rects[:, 1]
+        ])
+    return coordinates.tolist()
+
+
+def goto_highlight_action(writer, target_page, target_coords, js_code):
+    """Acción GoTo a la página destino (del writer de PyPDF2) seguida del JavaScript js_code"""
+    # Crear acción JavaScript
+    js_action = DictionaryObject({
+        NameObject("/S"): NameObject("/JavaScript"),
+        NameObject("/JS"): createStringObject(js_code)
+    })
+
+    # Crear acción GoTo para ir a la página destino
+    goto_action = DictionaryObject({
+        NameObject("/S"): NameObject("/GoTo"),
+        NameObject("/D"): ArrayObject([
+            writer.pages[target_page].indirect_reference,
+            NameObject("/XYZ"),
+            NumberObject(int(target_coords[0])),
+            NumberObject(int(target_coords[3])),
+            NumberObject(0)
+        ])
+    })
+
+    # Encadenar acciones: GoTo primero, luego JavaScript
+    goto_action[NameObject("/Next")] = js_action
+    return goto_action
+
+
+def write_interactive_pdf(pdf_path, output_path, links, javascript_code, layout=LINK_LAYOUT_INLINE):
+    """Escribe una copia del PDF con el JavaScript de documento y los enlaces"""
+    # Usar PyPDF2 para crear el PDF con JavaScript
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+
+    # Copiar todas las páginas manteniendo todo el contenido original
+    for page in reader.pages:
+        writer.add_page(page)
+
+    # Añadir JavaScript a nivel de documento con los estilos configurados
+    writer.add_js(javascript_code)
+
+    if layout == LINK_LAYOUT_COMPACT:
+        # Una acción compartida por destino y la tabla de destinos
+        link_targets, targets = compact_targets(links)
+        target_actions = [
+            writer._add_object(goto_highlight_action(writer, target_page, target_coords,
+                                                     f"highlightTarget({index});"))
+            for index, (target_page, target_coords) in enumerate(targets)
+        ]
+        writer.add_js(build_targets_javascript(targets))
+
+    # Añadir nuevos enlaces invisibles con JavaScript Y GoTo para cada referencia
+    for link_num, ref_data in enumerate(links):
+        try:
+            page_num = ref_data['pdf_page']
+            coords = ref_data['coordinates']
+            target_page = ref_data['target_page']
+            target_coords = ref_data['target_coordinates']
+
+            # Obtener la página del writer
+            page = writer.pages[page_num]
+
+            if layout == LINK_LAYOUT_COMPACT:
+                goto_action = target_actions[link_targets[link_num]]
+            else:
+                # JavaScript: solo ejecutar highlight (la navegación la hace GoTo)
+                goto_action = goto_highlight_action(writer, target_page, target_coords,
+                                                    f"highlight({target_page}, {target_coords});")
+
+            # Crear enlace invisible con acción combinada
+            link_annotation = DictionaryObject()
+            link_annotation.update({
+                NameObject("/Type"): NameObject("/Annot"),
+                NameObject("/Subtype"): NameObject("/Link"),
+                NameObject("/Rect"): ArrayObject([
+                    NumberObject(coords[0]),
+                    NumberObject(coords[1]),
+                    NumberObject(coords[2]),
+                    NumberObject(coords[3])
+                ]),
+                NameObject("/Border"): ArrayObject([
+                    NumberObject(0), NumberObject(0), NumberObject(0)
+                ]),
+                NameObject("/A"): goto_action,
+                NameObject("/H"): NameObject("/N")
+            })
+
+            # Añadir la anotación a la página
+            if "/Annots" in page:
+                page["/Annots"].append(link_annotation)
+            else:
+                page[NameObject("/Annots")] = ArrayObject([link_annotation])
+
+        except Exception as ref_error:
+            print(f"Error procesando referencia {ref_data.get('full', 'unknown')}: {ref_error}")
+            continue
+
+    # Guardar el PDF final
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+def pdf_number(value):
+    """Número en formato PDF (sin notación científica)"""
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def get_annots_array(doc, page_xref):
+    """Contenido del array /Annots de una página (sin corchetes), directo o indirecto"""
+    kind, value = doc.xref_get_key(page_xref, 'Annots')
+    if kind == 'xref':
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    elif kind != 'array':
+        return ''
+    return value.strip()[1:-1].strip()
+
+
+def compact_targets(links):
+    """
+    Destinos distintos de los enlaces, para la forma compacta. Los enlaces a
+    la misma página, columna y fila comparten destino.
+
+    Returns:
+        (índice del destino de cada enlace, [(página, coordenadas)] de cada destino)
+    """
+    indices = {}
+    targets = []
+    link_targets = []
+    for ref_data in links:
+        key = (ref_data['target_page'], ref_data['column'], ref_data['row'])
+        index = indices.get(key)
+        if index is None:
+            index = indices[key] = len(targets)
+            targets.append((ref_data['target_page'], ref_data['target_coordinates']))
+        link_targets.append(index)
+    return link_targets, targets
+
+
+def build_targets_javascript(targets):
+    """
+    Tabla de destinos de los enlaces compactos como JavaScript de documento:
+    highlightTarget(índice) resalta el destino con highlight (ver
+    build_javascript_code).
+    """
+    rows = ','.join(
+        f"[{target_page},{','.join(pdf_number(value) for value in target_coords)}]"
+        for target_page, target_coords in targets
+    )
+    return f"""var targets = [{rows}];
+
+{TARGETS_FUNCTION}index) {{
+    var target = targets[index];
+    highlight(target[0], target.slice(1));
+}}
+"""
+
+
+def compact_action(page_xref, target_coords, index):
+    """Acción compartida de un destino compacto: GoTo a la página y highlightTarget(índice)"""
+    return (f'<</S/GoTo/D[{page_xref} 0 R/XYZ {int(target_coords[0])} {int(target_coords[3])} 0]'
+            f'/Next<</S/JavaScript/JS(highlightTarget({index});)>>>>')
+
+
+def add_links_incremental(doc, links, javascript_code, layout=LINK_LAYOUT_INLINE):
+    """
+    Añade al documento (abierto con PyMuPDF) el JavaScript de documento y
+    los enlaces invisibles GoTo + JavaScript, como objetos nuevos listos para
+    guardarse con una actualización incremental.
+
+    Con layout LINK_LAYOUT_COMPACT cada destino distinto se escribe una sola
+    vez (ver compact_targets) y los enlaces apuntan a su acción compartida.
+    """
+    page_xrefs = [doc.page_xref(page_num) for page_num in range(len(doc))]
+
+    targets_code = None
+    if layout == LINK_LAYOUT_COMPACT:
+        link_targets, targets = compact_targets(links)
+        target_actions = []
+        for index, (target_page, target_coords) in enumerate(targets):
+            action_xref = doc.get_new_xref()
+            doc.update_object(action_xref, compact_action(page_xrefs[target_page], target_coords, index))
+            target_actions.append(action_xref)
+        targets_code = build_targets_javascript(targets)
+
+    # Enlaces nuevos agrupados por página
+    page_annots = {}
+    for link_num, ref_data in enumerate(links):
+        try:
+            page_num = ref_data['pdf_page']
+            coords = ref_data['coordinates']
+            target_page = ref_data['target_page']
+            target_coords = ref_data['target_coordinates']
+            rect = ' '.join(pdf_number(value) for value in coords)
+
+            if layout == LINK_LAYOUT_COMPACT:
+                action = f' {target_actions[link_targets[link_num]]} 0 R'
+            else:
+                # JavaScript: solo ejecutar highlight (la navegación la hace GoTo).
+                # Solo tiene dígitos y paréntesis equilibrados, así que se puede
+                # escribir como cadena literal sin escapar (fitz.get_pdf_str es lento)
+                js_code = f"(highlight({target_page}, {target_coords});)"
+                action = (f'<</S/GoTo/D[{page_xrefs[target_page]} 0 R/XYZ {int(target_coords[0])} {int(target_coords[3])} 0]'
+                          f'/Next<</S/JavaScript/JS{js_code}>>>>')
+
+            # Enlace invisible: GoTo a la página destino, seguido del JavaScript
+            annot_xref = doc.get_new_xref()
+            doc.update_object(annot_xref, f'<</Type/Annot/Subtype/Link/Rect[{rect}]/Border[0 0 0]/H/N/A{action}>>')
+            page_annots.setdefault(page_num, []).append(f'{annot_xref} 0 R')
+        except Exception as ref_error:
+            print(f"Error procesando referencia {ref_data.get('full', 'unknown')}: {ref_error}")
+            continue
+
+    # Una sola modificación por página: anotaciones existentes + nuevas
+    for page_num, annot_refs in page_annots.items():
+        page_xref = page_xrefs[page_num]
+        existing = get_annots_array(doc, page_xref)
+        doc.xref_set_key(page_xref, 'Annots', f"[{' '.join(filter(None, [existing] + annot_refs))}]")
+
+    # JavaScript a nivel de documento (sustituye al de una generación anterior)
+    set_document_javascript(doc, javascript_code, targets_code)
+
+
+def set_document_javascript(doc, javascript_code, targets_code=None):
+    """
+    Pone javascript_code como único script del árbol /Names /JavaScript del
+    documento (abierto con PyMuPDF), seguido de la tabla de destinos de los
+    enlaces compactos si se indica, como objetos nuevos listos para
+    guardarse con una actualización incremental.
+    """
+    js_xref = doc.get_new_xref()
+    doc.update_object(js_xref, f'<</Type/Action/S/JavaScript/JS{fitz.get_pdf_str(javascript_code)}>>')
+    names = [f'{fitz.get_pdf_str(DOCUMENT_JS_NAME)} {js_xref} 0 R']
+    if targets_code:
+        # La tabla puede ser grande: se guarda como stream comprimido
+        stream_xref = doc.get_new_xref()
+        doc.update_object(stream_xref, '<<>>')
+        doc.update_stream(stream_xref, targets_code.encode('latin-1'))
+        targets_xref = doc.get_new_xref()
+        doc.update_object(targets_xref, f'<</Type/Action/S/JavaScript/JS {stream_xref} 0 R>>')
+        names.append(f'{fitz.get_pdf_str(DOCUMENT_TARGETS_NAME)} {targets_xref} 0 R')
+    js_tree = f"<</Names[{' '.join(names)}]>>"
+    catalog = doc.pdf_catalog()
+    kind, value = doc.xref_get_key(catalog, 'Names')
+    if kind == 'xref':
+        doc.xref_set_key(int(value.split()[0]), 'JavaScript', js_tree)
+    else:
+        doc.xref_set_key(catalog, 'Names/JavaScript', js_tree)
+
+
+def document_javascript(doc):
+    """Códigos del árbol /Names /JavaScript del documento (abierto con PyMuPDF), en orden"""
+    kind, names = doc.xref_get_key(doc.pdf_catalog(), 'Names/JavaScript/Names')
+    if kind != 'array':
+        return []
+    codes = []
+    for reference in PDF_REFERENCE.finditer(names):
+        kind, code = doc.xref_get_key(int(reference.group(0).split()[0]), 'JS')
+        if kind == 'xref':
+            # Script largo guardado como stream
+            code = doc.xref_stream(int(code.split()[0])).decode('latin-1')
+        elif kind != 'string':
+            continue
+        codes.append(code)
+    return codes
+
+
+def generate_interactive_pdf(pdf_path, output_path, references, javascript_code, grid,
+                             backend=BACKEND_INCREMENTAL, profiles=None, page_sizes=None,
+                             layout=LINK_LAYOUT_INLINE):
+    """
+    Genera el PDF interactivo de un archivo.
+
+    Con el método incremental, si output_path no es el propio PDF primero se
+    copia el archivo y después se añaden los cambios al final de la copia.
+    Si el PDF no admite guardado incremental (cifrado, reparado al abrirlo...)
+    se usa el método completo con PyPDF2.
+
+    Con profiles (grid_profiles.GridProfiles) cada página destino usa la
+    cuadrícula de su plantilla; las plantillas nuevas quedan en
+    profiles.new_profiles.
+
+    page_sizes: (ancho, alto) de cada página si ya se conocen (ver
+    page_analysis.PageAnalysis.page_sizes); así no se vuelven a cargar todas
+    las páginas para leer su tamaño.
+
+    layout: Forma de guardar los destinos de los enlaces (ver LINK_LAYOUTS).
+
+    Returns:
+        Número de enlaces añadidos
+    """
+    overwrite = os.path.abspath(output_path) == os.path.abspath(pdf_path)
+
+    if backend == BACKEND_INCREMENTAL:
+        if not overwrite:
+            shutil.copyfile(pdf_path, output_path)
+        doc = fitz.open(output_path)
+        try:
+            if doc.can_save_incrementally():
+                page_grids = resolve_page_grids(doc, references, profiles)
+                links = compute_link_table(page_sizes or get_page_sizes(doc), references, grid, page_grids)
+                add_links_incremental(doc, links, javascript_code, layout)
+                doc.saveIncr()
+                return len(links)
+        except Exception:
+            doc.close()
+            if not overwrite:
+                # No dejar una copia sin enlaces
+                os.remove(output_path)
+            raise
+        doc.close()
+        print(f'{os.path.basename(pdf_path)} no admite guardado incremental, se reescribe completo')
+
+    # Abrir con PyMuPDF solo para obtener dimensiones de página (y plantillas)
+    page_grids = None
+    if page_sizes is None or profiles is not None:
+        temp_doc = fitz.open(pdf_path)
+        try:
+            page_sizes = page_sizes or get_page_sizes(temp_doc)
+            page_grids = resolve_page_grids(temp_doc, references, profiles)
+        finally:
+            temp_doc.close()
+    links = compute_link_table(page_sizes, references, grid, page_grids)
+
+    current_output = pdf_path + '.tmp' if overwrite else output_path
+    write_interactive_pdf(pdf_path, current_output, links, javascript_code, layout)
+
+    # Si estamos sobrescribiendo, reemplazar el archivo original
+    if overwrite:
+        shutil.move(current_output, output_path)
+
+    return len(links)
+
+
+def links_by_page(links):
+    """Enlaces agrupados por página de origen, en el orden en que se escriben"""
+    pages = {}
+    for ref_data in links:
+        pages.setdefault(ref_data['pdf_page'], []).append(ref_data)
+    return pages
+
+
+def pdf_dict_end(content, pos):
+    """Posición siguiente al diccionario PDF que empieza en pos (<<...>>)"""
+    depth = 0
+    while pos < len(content):
+        if content.startswith('<<', pos):
+            depth += 1
+            pos += 2
+        elif content.startswith('>>', pos):
+            depth -= 1
+            pos += 2
+            if depth == 0:
+                return pos
+        elif content[pos] == '(':
+            # Cadena literal: puede tener paréntesis anidados y escapados
+            level = 0
+            while pos < len(content):
+                char = content[pos]
+                if char == '\\':
+                    pos += 1
+                elif char == '(':
+                    level += 1
+                elif char == ')':
+                    level -= 1
+                    if level == 0:
+                        break
+                pos += 1
+            pos += 1
+        elif content[pos] == '<':
+            # Cadena hexadecimal
+            pos = content.find('>', pos) + 1 or len(content)
+        else:
+            pos += 1
+    return pos
+
+
+def split_pdf_array(content):
+    """Elementos de un array /Annots: referencias ('12 0 R') y diccionarios directos"""
+    items = []
+    pos = 0
+    while pos < len(content):
+        reference = PDF_REFERENCE.match(content, pos)
+        if reference is not None:
+            items.append(reference.group(0))
+            pos = reference.end()
+        elif content.startswith('<<', pos):
+            end = pdf_dict_end(content, pos)
+            items.append(content[pos:end])
+            pos = end
+        else:
+            pos += 1
+    return items
+
+
+def generated_links(doc, page_xref):
+    """
+    Anotaciones de la página escritas por la generación (GoTo seguido del
+    JavaScript de highlight), en orden, como (xref, objeto). Las que están
+    directas en /Annots (método PyPDF2, ver write_interactive_pdf) se
+    convierten antes en objetos propios para poder modificarlas.
+    """
+    items = split_pdf_array(get_annots_array(doc, page_xref))
+    if any(item.startswith('<<') for item in items):
+        for index, item in enumerate(items):
+            if item.startswith('<<'):
+                xref = doc.get_new_xref()
+                doc.update_object(xref, item)
+                items[index] = f'{xref} 0 R'
+        doc.xref_set_key(page_xref, 'Annots', f"[{' '.join(items)}]")
+
+    annotations = []
+    for item in items:
+        xref = int(item.split()[0])
+        annotation = doc.xref_object(xref, compressed=True)
+        if LINK_HIGHLIGHT.search(annotation) and LINK_DESTINATION.search(annotation):
+            annotations.append((xref, annotation))
+    return annotations
+
+
+def same_rect(annotation, coords):
+    """True si el /Rect del enlace escrito corresponde a sus coordenadas (PyPDF2 los guarda como enteros)"""
+    rect = LINK_RECT.search(annotation)
+    try:
+        values = [float(value) for value in rect.group(1).split()]
+    except (AttributeError, ValueError):
+        return False
+    return len(values) == 4 and all(abs(value - coord) < 1 for value, coord in zip(values, coords))
+
+
+def retarget_links(doc, links):
+    """
+    Cambia el destino (/D) y el JavaScript de highlight de los enlaces ya
+    generados en el documento (abierto con PyMuPDF), sin tocar el resto.
+
+    Raises:
+        ValueError si los enlaces del PDF no corresponden a las referencias
+    """
+    page_xrefs = [doc.page_xref(page_num) for page_num in range(len(doc))]
+    patches = []
+    for page_num, page_links in links_by_page(links).items():
+        # Los de la última generación son los últimos de la página
+        annotations = generated_links(doc, page_xrefs[page_num])[-len(page_links):]
+        if len(annotations) < len(page_links) or not all(
+            same_rect(annotation, ref_data['coordinates'])
+            for (_, annotation), ref_data in zip(annotations, page_links)
+        ):
+            raise ValueError(f'Los enlaces de la página {page_num + 1} no corresponden a las referencias '
+                             'detectadas; genera de nuevo el PDF interactivo')
+        patches.extend(zip(annotations, page_links))
+
+    # Un solo update_object por enlace (xref_set_key con rutas es mucho más lento)
+    for (xref, annotation), ref_data in patches:
+        target_page = ref_data['target_page']
+        target_coords = ref_data['target_coordinates']
+        destination = f'/D[{page_xrefs[target_page]} 0 R/XYZ {int(target_coords[0])} {int(target_coords[3])} 0]'
+        # Mismo JavaScript que add_links_incremental (cadena literal sin escapar)
+        highlight = f"/JS(highlight({target_page}, {target_coords});)"
+        annotation = LINK_DESTINATION.sub(lambda _: destination, annotation, count=1)
+        annotation = LINK_HIGHLIGHT.sub(lambda _: highlight, annotation, count=1)
+        doc.update_object(xref, annotation)
+
+
+def retarget_compact_links(doc, links, codes):
+    """
+    Cambia los destinos de los enlaces compactos ya generados en el documento
+    (abierto con PyMuPDF): las acciones compartidas de cada destino y la
+    tabla de destinos. codes es el JavaScript de documento del PDF (ver
+    document_javascript); el de highlight se mantiene.
+
+    Raises:
+        ValueError si los enlaces del PDF no corresponden a las referencias
+    """
+    page_xrefs = [doc.page_xref(page_num) for page_num in range(len(doc))]
+    link_targets, targets = compact_targets(links)
+    action_indices = {}   # xref de la acción -> índice de su destino (None si no es compacta)
+    target_actions = {}   # índice del destino -> xref de su acción
+
+    pages = {}
+    for ref_data, index in zip(links, link_targets):
+        pages.setdefault(ref_data['pdf_page'], []).append((ref_data, index))
+    for page_num, page_links in pages.items():
+        annotations = []
+        for item in split_pdf_array(get_annots_array(doc, page_xrefs[page_num])):
+            annotation = item if item.startswith('<<') else doc.xref_object(int(item.split()[0]), compressed=True)
+            action = LINK_ACTION.search(annotation)
+            if action is None:
+                continue
+            action_xref = int(action.group(1))
+            if action_xref not in action_indices:
+                call = TARGET_CALL.search(doc.xref_object(action_xref, compressed=True))
+                action_indices[action_xref] = int(call.group(1)) if call else None
+            if action_indices[action_xref] is not None:
+                annotations.append((annotation, action_xref))
+
+        # Los de la última generación son los últimos de la página
+        annotations = annotations[-len(page_links):]
+        if len(annotations) < len(page_links) or not all(
+            same_rect(annotation, ref_data['coordinates']) and action_indices[action_xref] == index
+            for (annotation, action_xref), (ref_data, index) in zip(annotations, page_links)
+        ):
+            raise ValueError(f'Los enlaces de la página {page_num + 1} no corresponden a las referencias '
+                             'detectadas; genera de nuevo el PDF interactivo')
+        for (_, action_xref), (_, index) in zip(annotations, page_links):
+            target_actions[index] = action_xref
+
+    # Una acción por destino, compartida por todos sus enlaces
+    for index, (target_page, target_coords) in enumerate(targets):
+        doc.update_object(target_actions[index], compact_action(page_xrefs[target_page], target_coords, index))
+    highlight_code = next(code for code in codes if TARGETS_FUNCTION not in code)
+    set_document_javascript(doc, highlight_code, build_targets_javascript(targets))
+
+
+def retarget_interactive_pdf(output_path, references, grid, profiles=None, page_sizes=None):
+    """
+    Actualiza los destinos de los enlaces de un PDF interactivo ya generado
+    tras cambiar la cuadrícula, sin volver a detectar ni a generar.
+
+    Solo cambian el destino y el JavaScript de highlight de cada enlace (con
+    los enlaces compactos, las acciones compartidas y la tabla de destinos);
+    el contenido, los rectángulos de origen y el estilo del resaltado se
+    mantienen. Los cambios se guardan con una actualización incremental (si
+    el PDF no la admite, se reescribe con PyMuPDF).
+
+    Args:
+        output_path: PDF interactivo generado con las mismas referencias
+        references: Referencias de ReferenceStore.link_sources del PDF original
+        grid, profiles, page_sizes: Como en generate_interactive_pdf
+
+    Returns:
+        Número de enlaces actualizados
+
+    Raises:
+        ValueError si los enlaces del PDF no corresponden a las referencias
+        (por ejemplo, tras volver a detectar con otro patrón)
+    """
+    if not os.path.exists(output_path):
+        raise FileNotFoundError(f'No existe {os.path.basename(output_path)}; genera primero el PDF interactivo')
+    temp_output = output_path + '.tmp'
+    doc = fitz.open(output_path)
+    try:
+        page_grids = resolve_page_grids(doc, references, profiles)
+        links = compute_link_table(page_sizes or get_page_sizes(doc), references, grid, page_grids)
+        codes = document_javascript(doc)
+        if any(TARGETS_FUNCTION in code for code in codes):
+            retarget_compact_links(doc, links, codes)
+        else:
+            retarget_links(doc, links)
+        if not links:
+            return 0
+        if doc.can_save_incrementally():
+            doc.saveIncr()
+            return len(links)
+        doc.save(temp_output)
+    finally:
+        doc.close()
+
+    shutil.move(temp_output, output_path)
+    return len(links)
+
+
+def restyle_interactive_pdf(output_path, javascript_code):
+    """
+    Cambia el estilo del resaltado de un PDF interactivo ya generado
+    sustituyendo solo su JavaScript de documento (ver set_document_javascript)
+    con una actualización incremental; el contenido, los enlaces y la tabla
+    de destinos de los enlaces compactos no cambian.
+
+    Returns:
+        False si el PDF no tiene el JavaScript de resaltado (no es un PDF
+        interactivo generado) y no se ha modificado
+
+    Raises:
+        Las excepciones de fitz.open si el PDF no se puede abrir
+    """
+    temp_output = output_path + '.tmp'
+    doc = fitz.open(output_path)
+    try:
+        codes = document_javascript(doc)
+        if not any('function highlight(' in code for code in codes):
+            return False
+        targets = [code for code in codes if TARGETS_FUNCTION in code]
+        if codes == [javascript_code] + targets:
+            # Ya tiene este estilo
+            return True
+        set_document_javascript(doc, javascript_code, targets[0] if targets else None)
+        if doc.can_save_incrementally():
+            doc.saveIncr()
+            return True
+        doc.save(temp_output)
+    finally:
+        doc.close()
+
+    shutil.move(temp_output, output_path)
+    return True
+
+
+def interactive_output_path(pdf_path, output_dir=None):
+    """Ruta de salida por defecto: <nombre>_interactivo.pdf en output_dir (o junto al PDF)"""
+    base_name = os.path.basename(pdf_path).replace('.pdf', '_interactivo.pdf')
+    return os.path.join(output_dir or os.path.dirname(pdf_path), base_name)
+
+
+def run_generation_job(pdf_path, output_path, references, javascript_code, grid, backend,
+                       profiles=None, page_sizes=None, retarget=False, layout=LINK_LAYOUT_INLINE):
+    """
+    Genera un PDF y devuelve su resultado sin lanzar excepciones. Se ejecuta
+    en un proceso del pool, así que solo recibe datos serializables.
+
+    Con retarget solo se actualizan los destinos de los enlaces del PDF ya
+    generado en output_path (ver retarget_interactive_pdf).
+
+    Returns:
+        {'pdf', 'output', 'links', 'error', 'seconds', 'new_profiles'};
+        'output' es None y 'error' contiene el mensaje si el PDF no se pudo
+        generar
+    """
+    start_time = time.perf_counter()
+    result = {'pdf': pdf_path, 'output': None, 'links': 0, 'error': None}
+    try:
+        if retarget:
+            result['links'] = retarget_interactive_pdf(output_path, references, grid, profiles, page_sizes)
+        else:
+            result['links'] = generate_interactive_pdf(
+                pdf_path, output_path, references, javascript_code, grid, backend, profiles, page_sizes, layout
+            )
+        result['output'] = output_path
+    except Exception as e:
+        print(f"Error al procesar {pdf_path}: {e}\n{traceback.format_exc()}")
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+    result['new_profiles'] = profiles.new_profiles if profiles is not None else {}
+    return result
+
+
+def run_restyle_job(output_path, javascript_code):
+    """
+    Cambia el estilo de un PDF interactivo (ver restyle_interactive_pdf) y
+    devuelve su resultado sin lanzar excepciones.
+
+    Returns:
+        {'pdf', 'output', 'links', 'error', 'seconds', 'skipped'}; 'skipped'
+        es True si el PDF no es un PDF interactivo generado
+    """
+    start_time = time.perf_counter()
+    result = {'pdf': output_path, 'output': None, 'links': 0, 'error': None, 'skipped': False}
+    try:
+        if restyle_interactive_pdf(output_path, javascript_code):
+            result['output'] = output_path
+        else:
+            result['skipped'] = True
+    except Exception as e:
+        print(f"Error al procesar {output_path}: {e}")
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def iter_job_results(run_job, jobs, workers=0, cancel_event=None):
+    """
+    Ejecuta run_job(*job) para cada trabajo, en el propio hilo o en un pool
+    de procesos, y devuelve los resultados según van terminando. El primer
+    argumento de cada trabajo es el PDF al que se atribuyen los errores de
+    un proceso que termina de forma anómala.
+    """
+    workers = min(resolve_worker_count(workers), len(jobs))
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    if workers <= 1:
+        # Un solo proceso: ejecutar en el propio hilo sin crear el pool
+        for job in jobs:
+            if cancelled():
+                return
+            yield run_job(*job)
+        return
+
+    # 'spawn' evita heredar por fork el estado de Qt y de los hilos del proceso padre
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_pool_worker) as executor:
+        futures = {executor.submit(run_job, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            if cancelled():
+                for pending in futures:
+                    pending.cancel()
+                return
+            try:
+                yield future.result()
+            except Exception as e:
+                # El proceso terminó de forma anómala (sin devolver resultado)
+                pdf_path = futures[future]
+                print(f"Error al procesar {pdf_path}: {e}")
+                yield {'pdf': pdf_path, 'output': None, 'links': 0,
+                       'error': str(e) or type(e).__name__, 'seconds': None}
+
+
+def iter_restyle_pdfs(pdf_paths, javascript_code, workers=0, cancel_event=None):
+    """
+    Cambia el estilo del resaltado de un lote de PDFs interactivos ya
+    generados y devuelve el resultado de cada uno (ver run_restyle_job)
+    según van terminando. Los PDFs que no son interactivos se omiten.
+
+    Args:
+        pdf_paths: PDFs interactivos (p. ej. todos los de una carpeta)
+        javascript_code: JavaScript de documento nuevo (ver build_javascript_code)
+        workers: Número de procesos (0 = uno por núcleo)
+        cancel_event: threading.Event opcional; los PDFs pendientes no se cambian
+    """
+    jobs = [(pdf_path, javascript_code) for pdf_path in pdf_paths]
+    for result in iter_job_results(run_restyle_job, jobs, workers, cancel_event):
+        result.setdefault('skipped', False)
+        yield result
+
+
+def iter_generate_pdfs(jobs, javascript_code, grid, backend=BACKEND_INCREMENTAL,
+                       workers=0, cancel_event=None, profiles=None, page_sizes=None, retarget=False,
+                       layout=LINK_LAYOUT_INLINE):
+    """
+    Genera los PDFs interactivos de un lote, un trabajo por PDF, y devuelve
+    el resultado de cada uno (ver run_generation_job) según van terminando.
+
+    Args:
+        jobs: Lista de (pdf_path, output_path, referencias), con las referencias
+            de ReferenceStore.link_sources
+        javascript_code: JavaScript de documento (ver build_javascript_code)
+        grid: Modelo de la cuadrícula (ver grid_model.GridModel)
+        backend: Forma de escribir los enlaces (ver GENERATION_BACKENDS)
+        workers: Número de procesos (0 = uno por núcleo)
+        cancel_event: threading.Event opcional; los PDFs pendientes no se generan
+        profiles: Perfiles de cuadrícula por plantilla (ver grid_profiles); lo
+            que detecte cada proceso se incorpora a este objeto, que el
+            llamador puede guardar al terminar
+        page_sizes: {pdf_path: (ancho, alto) de cada página} opcional con los
+            tamaños ya conocidos (ver page_analysis.PageAnalysis.page_sizes)
+        retarget: Solo actualizar los destinos de los enlaces de los PDFs ya
+            generados en output_path (ver retarget_interactive_pdf)
+        layout: Forma de guardar los destinos de los enlaces (ver LINK_LAYOUTS);
+            al actualizar los destinos se mantiene la de cada PDF
+    """
+    page_sizes = page_sizes or {}
+    generation_jobs = [
+        (pdf_path, output_path, references, javascript_code, grid, backend, profiles,
+         page_sizes.get(pdf_path), retarget, layout)
+        for pdf_path, output_path, references in jobs
+    ]
+    for result in iter_job_results(run_generation_job, generation_jobs, workers, cancel_event):
+        # Las plantillas detectadas en el proceso no forman parte del resultado
+        new_profiles = result.pop('new_profiles', None)
+        if profiles is not None:
+            profiles.merge(new_profiles)
+        yield result
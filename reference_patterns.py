@@ -0,0 +1,184 @@
+"""
+Patrones de referencia predefinidos y conversión de patrones personalizados.
+
+No depende de Qt: lo usan tanto la interfaz como el modo por lotes (batch.py).
+"""
+import re
+
+from pattern_compiler import compile_reference_styles
+from regex_guard import GuardedReferencePattern
+
+
+# Patrones de referencias predefinidos
+# Formato: (nombre, patrón_regex, ejemplo, descripción de grupos)
+REFERENCE_PATTERNS = {
+    'Estilo /1.0-A': {
+        'pattern': r'/\s*(\d+)[.\s]+(\d+|[A-Za-z]+)\s*[-/]\s*([A-Za-z0-9]+)',
+        'example': '/1.0-A, /10.5-Z, /3.12-AB',
+        'groups': ('página', 'columna', 'fila'),
+        'order': 'página.columna-fila'
+    },
+    'Estilo 25-A.0': {
+        'pattern': r'(\d+)\s*[-]\s*([A-Za-z]+)[.\s]+(\d+)',
+        'example': '25-A.0, 10-B.5, 3-C.12',
+        'groups': ('página', 'fila', 'columna'),
+        'order': 'página-fila.columna'
+    },
+    'Estilo A1/25': {
+        'pattern': r'([A-Za-z]+)(\d+)\s*[/]\s*(\d+)',
+        'example': 'A1/25, B5/10, C12/3',
+        'groups': ('fila', 'columna', 'página'),
+        'order': 'fila+columna/página'
+    },
+    'Estilo (1-A-0)': {
+        'pattern': r'\(\s*(\d+)\s*[-]\s*([A-Za-z]+)\s*[-]\s*(\d+)\s*\)',
+        'example': '(1-A-0), (10-B-5), (3-C-12)',
+        'groups': ('página', 'fila', 'columna'),
+        'order': '(página-fila-columna)'
+    },
+    'Personalizado': {
+        'pattern': '',
+        'example': 'Define tu propio patrón regex',
+        'groups': ('grupo1', 'grupo2', 'grupo3'),
+        'order': 'personalizado'
+    }
+}
+
+CUSTOM_PATTERN_NAME = 'Personalizado'
+DEFAULT_PATTERN_NAME = 'Estilo /1.0-A'
+DEFAULT_GROUPS_ORDER = ('página', 'columna', 'fila')
+
+# Placeholders de los patrones simples
+PAGE_PLACEHOLDER = r'\{P\}|\{PAG\}|\{PAGINA\}'
+COLUMN_PLACEHOLDER = r'\{C\}|\{COL\}|\{COLUMNA\}'
+ROW_PLACEHOLDER = r'\{F\}|\{FILA\}'
+
+
+def convert_simple_pattern_to_regex(simple_pattern):
+    """
+    Convierte un patrón simple con placeholders a regex.
+
+    Placeholders soportados:
+    - {P} = Página (número)
+    - {C} = Columna (número)
+    - {F} = Fila (letra A-Z)
+
+    Ejemplo: /{P}.{C}-{F} → \\/(\\d+)\\.(\\d+)-([A-Z])
+
+    Returns:
+        (regex, ejemplo, usa_placeholders)
+    """
+    # Detectar si usa placeholders simples
+    has_placeholders = any(p in simple_pattern.upper() for p in ['{P}', '{C}', '{F}', '{PAG}', '{COL}', '{FILA}'])
+
+    if has_placeholders:
+        # Convertir a regex
+        regex = simple_pattern
+
+        # Escapar caracteres especiales de regex primero (excepto los placeholders)
+        special_chars = ['\\', '.', '^', '$', '*', '+', '?', '[', ']', '(', ')', '|']
+        for char in special_chars:
+            # No escapar si está dentro de un placeholder
+            regex = regex.replace(char, '\\' + char)
+
+        # Reemplazar placeholders por grupos de captura
+        # Orden de grupos según aparición
+        regex = re.sub(PAGE_PLACEHOLDER, r'(\\d+)', regex, flags=re.IGNORECASE)
+        regex = re.sub(COLUMN_PLACEHOLDER, r'(\\d+)', regex, flags=re.IGNORECASE)
+        regex = re.sub(ROW_PLACEHOLDER, r'([A-Z])', regex, flags=re.IGNORECASE)
+
+        # Generar ejemplo
+        example = simple_pattern
+        example = re.sub(PAGE_PLACEHOLDER, '5', example, flags=re.IGNORECASE)
+        example = re.sub(COLUMN_PLACEHOLDER, '3', example, flags=re.IGNORECASE)
+        example = re.sub(ROW_PLACEHOLDER, 'A', example, flags=re.IGNORECASE)
+
+        return regex, example, True
+    else:
+        # Asumir que es un regex directo
+        return simple_pattern, simple_pattern, False
+
+
+def custom_pattern_groups_order(custom_pattern):
+    """Orden de los grupos de un patrón personalizado según la posición de sus placeholders"""
+    pattern_upper = custom_pattern.upper()
+
+    # Buscar la primera ocurrencia de cada placeholder
+    p_match = re.search(PAGE_PLACEHOLDER, pattern_upper)
+    c_match = re.search(COLUMN_PLACEHOLDER, pattern_upper)
+    f_match = re.search(ROW_PLACEHOLDER, pattern_upper)
+
+    # Ordenar por posición
+    placeholders = []
+    if p_match:
+        placeholders.append((p_match.start(), 'página'))
+    if c_match:
+        placeholders.append((c_match.start(), 'columna'))
+    if f_match:
+        placeholders.append((f_match.start(), 'fila'))
+
+    placeholders.sort(key=lambda x: x[0])
+    groups = tuple(p[1] for p in placeholders)
+
+    return groups if groups else DEFAULT_GROUPS_ORDER
+
+
+def resolve_pattern(pattern_name, custom_pattern=''):
+    """
+    Devuelve (regex, orden de los grupos) para un patrón predefinido o el
+    personalizado. El regex es None si el personalizado está vacío.
+    """
+    if pattern_name == CUSTOM_PATTERN_NAME:
+        if not custom_pattern:
+            return None, DEFAULT_GROUPS_ORDER
+        # Convertir patrón simple a regex si usa placeholders
+        regex, _, _ = convert_simple_pattern_to_regex(custom_pattern)
+        return regex, custom_pattern_groups_order(custom_pattern)
+
+    pattern_info = REFERENCE_PATTERNS.get(pattern_name, {})
+    return pattern_info.get('pattern', ''), pattern_info.get('groups', DEFAULT_GROUPS_ORDER)
+
+
+def resolve_patterns(pattern_names, custom_pattern=''):
+    """
+    Estilos elegidos como [(nombre, regex, orden de los grupos)], sin repetir
+    y sin el personalizado si está vacío.
+    """
+    styles = []
+    for pattern_name in dict.fromkeys(pattern_names):
+        regex, groups_order = resolve_pattern(pattern_name, custom_pattern)
+        if regex:
+            styles.append((pattern_name, regex, groups_order))
+    return styles
+
+
+def uses_raw_regex(pattern_names, custom_pattern=''):
+    """True si entre los estilos está un personalizado escrito como regex (sin placeholders)"""
+    if CUSTOM_PATTERN_NAME not in pattern_names or not custom_pattern:
+        return False
+    return not convert_simple_pattern_to_regex(custom_pattern)[2]
+
+
+def detection_pattern(pattern_names, custom_pattern='', time_budget=None):
+    """
+    Patrón para el motor de detección con uno o varios estilos (ver
+    pattern_compiler.compile_reference_styles). Con varios estilos el texto
+    de cada página se recorre una sola vez.
+
+    Con time_budget, si hay un regex personalizado escrito a mano, las
+    búsquedas se hacen en un proceso vigilado con ese tiempo límite por
+    página (ver regex_guard).
+
+    Returns:
+        (patrón compilado o None si no hay ninguno, orden de los grupos)
+
+    Raises:
+        re.error si algún patrón no es válido
+    """
+    styles = resolve_patterns(pattern_names, custom_pattern)
+    if not styles:
+        return None, DEFAULT_GROUPS_ORDER
+    pattern, groups_order = compile_reference_styles(styles)
+    if time_budget and uses_raw_regex(pattern_names, custom_pattern):
+        pattern = GuardedReferencePattern(pattern, time_budget)
+    return pattern, groups_order
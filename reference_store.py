@@ -0,0 +1,218 @@
+"""
+Almacén compacto de referencias detectadas.
+
+En lugar de un diccionario por referencia (con la ruta y el nombre del PDF y
+el texto de contexto repetidos en cada una, y guardado dos veces), las
+referencias se guardan por columnas: listas de textos internados para los
+valores que se repiten mucho ('1', 'A', '/3.2-C'...) y arrays de números para
+el resto. Los PDFs se identifican por un índice y el contexto se guarda como
+desplazamientos en el texto de la página, que solo se convierten en texto
+al mostrarlos.
+
+Las referencias de cada PDF ocupan un tramo contiguo de filas, en el orden
+en que se añadieron los PDFs y, dentro de cada uno, por página.
+
+Cada PDF guarda además con qué se detectó (firma del archivo, patrón y zonas
+de extracción), de modo que una nueva detección solo analiza los PDFs
+añadidos o modificados y quitar un PDF solo elimina su tramo.
+"""
+import os
+import sys
+from array import array
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+import fitz  # PyMuPDF para leer PDFs
+
+from detection_engine import build_page_char_map
+
+
+# Páginas cuyo texto se mantiene en memoria para mostrar contextos
+PAGE_TEXT_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=PAGE_TEXT_CACHE_SIZE)
+def load_page_text(pdf_path, page_num, regions=None):
+    """Texto de una página, el mismo sobre el que se calcularon los desplazamientos"""
+    doc = fitz.open(pdf_path)
+    try:
+        return build_page_char_map(doc[page_num], regions)[0]
+    finally:
+        doc.close()
+
+
+class ReferenceStore:
+    """
+    Referencias de todos los PDFs, guardadas por columnas.
+
+    Cada fila de página que llega del motor de detección es una tupla
+    (full, page, column, row, x0, y0, x1, y1, instance, context_start, context_end).
+
+    Con page_analysis (ver page_analysis.PageAnalysis) los textos de los
+    contextos se comparten con la detección y el muestreo de estilos.
+    """
+
+    def __init__(self, page_analysis=None):
+        self.page_analysis = page_analysis
+        self.clear()
+
+    def clear(self):
+        """Elimina todas las referencias y PDFs"""
+        self.pdf_paths = []          # pdf_id -> ruta
+        self.pdf_names = []          # pdf_id -> nombre del archivo
+        self.pdf_ids = {}            # ruta -> pdf_id
+        self.text_regions = None     # zonas de extracción de la detección (para los contextos)
+        self.ranges = OrderedDict()  # pdf_id -> [primera fila, fila final)
+        self.detection_keys = {}     # pdf_id -> clave con la que se detectó (ver mark_detected)
+        self.full_counts = Counter()   # referencia -> filas (para las estadísticas)
+        self.page_counts = Counter()   # página destino -> filas
+
+        self.full = []
+        self.page = []
+        self.column = []
+        self.row = []
+        self.pdf_id = array('i')
+        self.pdf_page = array('i')
+        self.instance = array('i')
+        self.context_start = array('i')
+        self.context_end = array('i')
+        self.coords = array('d')     # x0, y0, x1, y1 de cada fila, seguidos
+
+    def __len__(self):
+        return len(self.full)
+
+    def add_pdf(self, pdf_path):
+        """Registra un PDF (sin referencias todavía) y devuelve su id"""
+        pdf_id = self.pdf_ids.get(pdf_path)
+        if pdf_id is None:
+            pdf_id = len(self.pdf_paths)
+            self.pdf_paths.append(pdf_path)
+            self.pdf_names.append(os.path.basename(pdf_path))
+            self.pdf_ids[pdf_path] = pdf_id
+        if pdf_id not in self.ranges:
+            self.ranges[pdf_id] = [len(self), len(self)]
+        return pdf_id
+
+    def add_page(self, pdf_path, page_num, page_rows):
+        """
+        Añade las referencias de una página. Las páginas de un PDF deben
+        llegar seguidas (así lo hace el motor de detección).
+        """
+        pdf_id = self.add_pdf(pdf_path)
+        if not page_rows:
+            return
+        if self.ranges[pdf_id][1] != len(self):
+            raise ValueError(f'Las referencias de {pdf_path} deben añadirse seguidas')
+
+        intern = sys.intern
+        for full, page, column, row, x0, y0, x1, y1, instance, ctx_start, ctx_end in page_rows:
+            self.full.append(intern(full))
+            self.page.append(intern(page))
+            self.column.append(intern(column))
+            self.row.append(intern(row))
+            self.pdf_id.append(pdf_id)
+            self.pdf_page.append(page_num)
+            self.instance.append(instance)
+            self.context_start.append(ctx_start)
+            self.context_end.append(ctx_end)
+            self.coords.extend((x0, y0, x1, y1))
+        self.ranges[pdf_id][1] = len(self)
+        self.full_counts.update(page_row[0] for page_row in page_rows)
+        self.page_counts.update(page_row[1] for page_row in page_rows)
+
+    def remove_pdf(self, pdf_path):
+        """Elimina un PDF y sus referencias"""
+        pdf_id = self.pdf_ids.get(pdf_path)
+        if pdf_id is None or pdf_id not in self.ranges:
+            return
+        start, end = self.ranges.pop(pdf_id)
+        self.detection_keys.pop(pdf_id, None)
+        count = end - start
+        if count:
+            self.full_counts -= Counter(self.full[start:end])
+            self.page_counts -= Counter(self.page[start:end])
+            for column in (self.full, self.page, self.column, self.row, self.pdf_id,
+                           self.pdf_page, self.instance, self.context_start, self.context_end):
+                del column[start:end]
+            del self.coords[start * 4:end * 4]
+            # Desplazar los tramos de los PDFs posteriores
+            for pdf_range in self.ranges.values():
+                if pdf_range[0] >= end:
+                    pdf_range[0] -= count
+                    pdf_range[1] -= count
+
+    def mark_detected(self, pdf_path, detection_key):
+        """
+        Anota que la detección de un PDF terminó con detection_key (firma del
+        archivo, patrón y zonas de extracción; ver is_current).
+        """
+        pdf_id = self.pdf_ids.get(pdf_path)
+        if pdf_id is not None and pdf_id in self.ranges:
+            self.detection_keys[pdf_id] = detection_key
+
+    def is_current(self, pdf_path, detection_key):
+        """True si las referencias del PDF ya están detectadas con la misma clave"""
+        pdf_id = self.pdf_ids.get(pdf_path)
+        return pdf_id is not None and self.detection_keys.get(pdf_id) == detection_key
+
+    def detected_pdfs(self):
+        """Rutas de los PDFs analizados, en orden"""
+        return [self.pdf_paths[pdf_id] for pdf_id in self.ranges]
+
+    def rows_for_pdf(self, pdf_path):
+        """Rango de filas de las referencias de un PDF"""
+        pdf_id = self.pdf_ids.get(pdf_path)
+        if pdf_id is None or pdf_id not in self.ranges:
+            return range(0)
+        return range(*self.ranges[pdf_id])
+
+    def link_sources(self, pdf_path):
+        """
+        Datos de las referencias de un PDF necesarios para generar los enlaces:
+        tuplas (full, page, column, row, pdf_page, x0, y0, x1, y1)
+        """
+        coords = self.coords
+        return [
+            (self.full[ref], self.page[ref], self.column[ref], self.row[ref],
+             self.pdf_page[ref], *coords[ref * 4:ref * 4 + 4])
+            for ref in self.rows_for_pdf(pdf_path)
+        ]
+
+    def pdf_path_of(self, index):
+        return self.pdf_paths[self.pdf_id[index]]
+
+    def pdf_name_of(self, index):
+        return self.pdf_names[self.pdf_id[index]]
+
+    def coordinates(self, index):
+        """[x0, y0, x1, y1] de la referencia en su página"""
+        return self.coords[index * 4:index * 4 + 4].tolist()
+
+    def context(self, index):
+        """Texto de contexto (30 caracteres antes y después), leído al mostrarlo"""
+        pdf_path, page_num, regions = self.pdf_path_of(index), self.pdf_page[index], self.text_regions
+        try:
+            if self.page_analysis is not None:
+                text = self.page_analysis.page_text(pdf_path, page_num, regions,
+                                                    lambda: load_page_text(pdf_path, page_num, regions))
+            else:
+                text = load_page_text(pdf_path, page_num, regions)
+        except Exception:
+            return ''
+        start, end = self.context_start[index], self.context_end[index]
+        return text[start:end].replace('\n', ' ').strip()
+
+    def to_dict(self, index):
+        """Diccionario con los datos de una referencia (para exportar)"""
+        return {
+            'full': self.full[index],
+            'page': self.page[index],
+            'column': self.column[index],
+            'row': self.row[index],
+            'context': self.context(index),
+            'pdf_page': self.pdf_page[index],
+            'coordinates': self.coordinates(index),
+            'instance': self.instance[index],
+            'pdf_path': self.pdf_path_of(index),
+            'pdf_name': self.pdf_name_of(index)
+        }
@@ -0,0 +1,215 @@
+"""
+Tiempo límite por página para los patrones regex personalizados.
+
+El módulo re de Python no se puede interrumpir: un patrón escrito a mano con
+retroceso catastrófico (por ejemplo '(\\w+\\s?)+$') puede tardar horas en una
+página grande y bloquear la detección. Los regex personalizados se ejecutan
+en un proceso aparte (uno por proceso de detección, reutilizado entre
+páginas); si una página supera el tiempo límite el proceso se mata, la página
+se informa como fallida y se sigue con la siguiente.
+
+Los estilos predefinidos y los patrones con placeholders ({P}, {C}, {F}) no
+lo necesitan y se ejecutan directamente.
+"""
+import os
+import time
+import multiprocessing
+
+from pattern_compiler import compile_reference_pattern
+
+
+# Tiempo máximo del patrón en una página (segundos)
+DEFAULT_PAGE_BUDGET = 2.0
+# Tiempo máximo de arranque del proceso vigilado (segundos)
+START_TIMEOUT = 60
+# Fracción del tiempo límite a partir de la cual la prueba previa avisa
+PREFLIGHT_WARN_FRACTION = 0.25
+# Repeticiones que disparan el retroceso catastrófico de los patrones mal escritos
+STRESS_RUNS = ('a' * 4000, '1' * 4000, 'A1 ' * 1500, '/1.' * 1500, ' ' * 4000)
+
+
+class PatternTimeout(Exception):
+    """El patrón superó el tiempo límite en una página"""
+
+    def __init__(self, budget):
+        super().__init__(f'el patrón superó el tiempo límite ({budget:g} s)')
+        self.budget = budget
+
+
+def guard_loop(conn, pattern):
+    """Bucle del proceso vigilado: recibe (texto, orden de los grupos) y devuelve las referencias"""
+    conn.send(True)   # Listo: el arranque no cuenta para el tiempo límite
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        text, groups_order = request
+        conn.send(list(pattern.iter_references(text, groups_order)))
+
+
+class RegexGuard:
+    """Proceso que ejecuta un patrón y que se mata si una página tarda demasiado"""
+
+    def __init__(self, pattern, budget=DEFAULT_PAGE_BUDGET):
+        self.pattern = pattern
+        self.budget = budget
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        # 'spawn' como el resto de procesos (ver detection_engine)
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=guard_loop, args=(child_conn, self.pattern), daemon=True)
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(START_TIMEOUT):
+            self.kill()
+            raise RuntimeError('No se pudo arrancar el proceso del patrón personalizado')
+        self.conn.recv()
+
+    def run(self, text, groups_order):
+        """
+        Referencias del texto (ver pattern_compiler.CompiledReferencePattern.iter_references).
+
+        Raises:
+            PatternTimeout si el patrón supera el tiempo límite
+        """
+        if self.process is None:
+            self.start()
+        self.conn.send((text, groups_order))
+        if not self.conn.poll(self.budget):
+            self.kill()
+            raise PatternTimeout(self.budget)
+        try:
+            return self.conn.recv()
+        except EOFError:
+            # El proceso ha terminado por su cuenta (por ejemplo, sin memoria)
+            self.kill()
+            raise
+
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1)
+        self.kill()
+
+
+# Proceso vigilado de este proceso: (patrón, tiempo límite) -> RegexGuard
+_guards = {}
+
+
+class GuardedReferencePattern:
+    """
+    Patrón compilado (ver pattern_compiler) cuyas búsquedas se hacen en un
+    RegexGuard. Se puede enviar a los procesos del pool: cada uno arranca su
+    propio proceso vigilado la primera vez que lo usa.
+    """
+
+    def __init__(self, pattern, budget=DEFAULT_PAGE_BUDGET):
+        self.inner = compile_reference_pattern(pattern)
+        self.pattern = self.inner.pattern
+        self.budget = budget
+
+    def may_match(self, text):
+        return self.inner.may_match(text)
+
+    def has_match(self, text):
+        # Solo el prefiltro de literales: el regex no se ejecuta en este proceso
+        return self.inner.may_match(text)
+
+    def iter_references(self, text, groups_order):
+        if not self.inner.may_match(text):
+            return iter(())
+        key = (self.pattern, self.budget)
+        guard = _guards.get(key)
+        if guard is None:
+            # Solo se mantiene el proceso del último patrón usado
+            close_guards()
+            guard = _guards[key] = RegexGuard(self.inner, self.budget)
+        return iter(guard.run(text, groups_order))
+
+    def cache_key(self, groups_order):
+        return self.inner.cache_key(groups_order)
+
+
+def close_guards():
+    """
+    Cierra el proceso vigilado de este proceso, si hay. Se llama al terminar
+    cada detección (ver detection_engine.iter_page_references) para no dejar
+    un proceso esperando hasta que se cierra la aplicación; los procesos del
+    pool cierran el suyo al terminar.
+    """
+    for guard in _guards.values():
+        guard.close()
+    _guards.clear()
+
+
+def stress_texts(pattern):
+    """
+    Textos de prueba: cada repetición de STRESS_RUNS seguida de los literales
+    del patrón (para que pase el prefiltro) y de un carácter que no encaja.
+    """
+    literals = ''.join(compile_reference_pattern(pattern).literals)
+    return [run + literals + '!' for run in STRESS_RUNS]
+
+
+def preflight_pattern(pattern, groups_order, texts, budget=DEFAULT_PAGE_BUDGET):
+    """
+    Prueba previa del patrón con textos de muestra (páginas reales y
+    stress_texts) antes de una detección completa.
+
+    Returns:
+        (segundos del texto más lento, índice de ese texto en texts,
+         True si superó el tiempo límite)
+    """
+    guard = RegexGuard(compile_reference_pattern(pattern), budget)
+    slowest = 0.0
+    slowest_index = None
+    try:
+        guard.start()
+        for index, text in enumerate(texts):
+            start = time.perf_counter()
+            try:
+                guard.run(text, groups_order)
+            except PatternTimeout:
+                return budget, index, True
+            elapsed = time.perf_counter() - start
+            if elapsed > slowest:
+                slowest, slowest_index = elapsed, index
+    finally:
+        guard.close()
+    return slowest, slowest_index, False
+
+
+def preflight_warning(result, samples, budget=DEFAULT_PAGE_BUDGET):
+    """
+    Aviso de la prueba previa, o None si el patrón es rápido.
+
+    Args:
+        result: Resultado de preflight_pattern
+        samples: (pdf_path, page_num, ...) de los primeros textos de la
+            prueba; el resto son los de stress_texts
+    """
+    slowest, index, timed_out = result
+    if not timed_out and slowest < budget * PREFLIGHT_WARN_FRACTION:
+        return None
+    if index < len(samples):
+        pdf_path, page_num = samples[index][:2]
+        where = f'la página {page_num + 1} de {os.path.basename(pdf_path)}'
+    else:
+        where = 'un texto de prueba repetitivo'
+    if timed_out:
+        return f'El patrón personalizado superó el tiempo límite ({budget:g} s por página) con {where}'
+    return f'El patrón personalizado tardó {slowest:.2f} s con {where}'
@@ -0,0 +1,148 @@
+"""
+Detección automática del estilo de referencia por muestreo de páginas.
+
+Elegir mal el estilo en el combo cuesta una detección completa para nada.
+Antes se analizan unas pocas páginas repartidas por los PDFs (solo el texto
+plano, sin las cajas de los caracteres) y se puntúa cada estilo de
+REFERENCE_PATTERNS por sus coincidencias válidas: la página existe en el
+PDF y la columna y la fila existen en la cuadrícula. La muestra está acotada
+en PDFs, páginas por PDF y tiempo, así que tarda menos de un segundo también
+con juegos de miles de planos.
+
+No depende de Qt: lo usan tanto la interfaz como el modo por lotes (batch.py).
+"""
+import os
+import time
+
+import fitz  # PyMuPDF para leer PDFs
+
+from detection_engine import page_textpage, plain_text_matches_char_map
+from pattern_compiler import compile_reference_pattern
+from reference_patterns import CUSTOM_PATTERN_NAME, REFERENCE_PATTERNS, resolve_patterns
+
+
+# PDFs de la lista que se muestrean (repartidos por toda la lista)
+SAMPLE_PDFS = 16
+# Páginas muestreadas de cada PDF (repartidas por todo el documento)
+SAMPLE_PAGES_PER_PDF = 8
+# Tiempo máximo del muestreo (segundos)
+SAMPLE_TIME_BUDGET = 0.8
+
+
+def spread(count, sample):
+    """Hasta sample índices de range(count) repartidos uniformemente"""
+    if count <= sample:
+        return list(range(count))
+    return sorted({int((i + 0.5) * count / sample) for i in range(sample)})
+
+
+def builtin_styles():
+    """Estilos predefinidos como [(nombre, regex, orden de los grupos)]"""
+    return resolve_patterns([name for name in REFERENCE_PATTERNS if name != CUSTOM_PATTERN_NAME])
+
+
+def reference_is_valid(page_ref, column_ref, row_ref, num_pages, grid):
+    """True si la referencia apunta a una página del PDF y a un cuadrante de la cuadrícula"""
+    try:
+        target_page = int(page_ref)
+    except (TypeError, ValueError):
+        return False
+    return 1 <= target_page <= num_pages and grid.contains_cell(column_ref, row_ref)
+
+
+def sample_page_texts(pdf_paths, regions=None, max_pdfs=SAMPLE_PDFS,
+                      pages_per_pdf=SAMPLE_PAGES_PER_PDF, time_budget=SAMPLE_TIME_BUDGET,
+                      analysis=None):
+    """
+    Texto plano de una muestra de páginas repartidas por los PDFs, acotada
+    en PDFs, páginas por PDF y tiempo.
+
+    Con analysis (ver page_analysis.PageAnalysis) los textos se comparten
+    entre muestreos (detección del estilo y prueba previa del patrón) y con
+    los contextos de las referencias.
+
+    Genera tuplas (pdf_path, page_num, páginas del PDF, texto).
+    """
+    if analysis is not None and not plain_text_matches_char_map(regions):
+        # El texto plano no sería el de los contextos
+        analysis = None
+    deadline = time.perf_counter() + time_budget
+    for pdf_index in spread(len(pdf_paths), max_pdfs):
+        if time.perf_counter() > deadline:
+            return
+        pdf_path = pdf_paths[pdf_index]
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception as e:
+            print(f'Error al abrir {pdf_path}: {e}')
+            continue
+        try:
+            num_pages = len(doc)
+            if analysis is not None:
+                analysis.note_document(pdf_path, doc)
+            for page_num in spread(num_pages, pages_per_pdf):
+                if time.perf_counter() > deadline:
+                    return
+                try:
+                    if analysis is not None:
+                        text = analysis.page_text(
+                            pdf_path, page_num, regions,
+                            lambda: page_textpage(doc[page_num], regions).extractText()
+                        )
+                    else:
+                        text = page_textpage(doc[page_num], regions).extractText()
+                except Exception as page_error:
+                    print(f'Error procesando página {page_num + 1} de {os.path.basename(pdf_path)}: {page_error}')
+                    continue
+                yield pdf_path, page_num, num_pages, text
+        finally:
+            doc.close()
+
+
+def score_styles(pdf_paths, grid, styles=None, regions=None, **sample_options):
+    """
+    Puntúa cada estilo con una muestra de páginas de los PDFs.
+
+    Args:
+        pdf_paths: PDFs del proyecto
+        grid: Cuadrícula con la que se validan columna y fila (ver grid_model.GridModel)
+        styles: [(nombre, regex, orden de los grupos)] (por defecto, los predefinidos)
+        regions: Zonas de extracción (ver text_regions.TextRegions; None = página entera)
+        sample_options: Límites de la muestra (ver sample_page_texts)
+
+    Returns:
+        (lista de {'name', 'matches', 'valid'} de mejor a peor, páginas muestreadas)
+    """
+    if styles is None:
+        styles = builtin_styles()
+    compiled = [(name, compile_reference_pattern(regex), groups_order) for name, regex, groups_order in styles]
+    scores = {name: {'name': name, 'matches': 0, 'valid': 0} for name, _, _ in compiled}
+    sampled = 0
+
+    for _, _, num_pages, text in sample_page_texts(pdf_paths, regions, **sample_options):
+        sampled += 1
+        for name, pattern, groups_order in compiled:
+            score = scores[name]
+            for _, _, page_ref, column_ref, row_ref in pattern.iter_references(text, groups_order):
+                score['matches'] += 1
+                if reference_is_valid(page_ref, column_ref, row_ref, num_pages, grid):
+                    score['valid'] += 1
+
+    # A igualdad de puntuación se mantiene el orden de los estilos
+    ranking = sorted(scores.values(), key=lambda score: (-score['valid'], -score['matches']))
+    return ranking, sampled
+
+
+def best_style(ranking):
+    """Nombre del estilo con más coincidencias válidas, o None si ninguno tiene"""
+    if ranking and ranking[0]['valid'] > 0:
+        return ranking[0]['name']
+    return None
+
+
+def format_ranking(ranking):
+    """Resumen de la puntuación para la barra de estado ('/1.0-A: 40/42, ...')"""
+    return ', '.join(
+        f"{score['name'].replace('Estilo ', '')}: {score['valid']}/{score['matches']}"
+        for score in ranking
+    )
@@ -0,0 +1,7 @@
+"""Configuración común de las pruebas: los módulos están en la raíz del repositorio"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Las pruebas de los modelos de Qt no necesitan pantalla
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
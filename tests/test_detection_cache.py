@@ -0,0 +1,73 @@
+"""Pruebas de la caché de detección por página"""
+import fitz
+import pytest
+
+import detection_cache
+import detection_engine
+from detection_cache import DetectionCache, page_content_hash
+from detection_engine import iter_page_references
+
+
+PATTERN = r'/\s*(\d+)[.\s]+(\d+|[A-Za-z]+)\s*[-/]\s*([A-Za-z0-9]+)'
+GROUPS = ('página', 'columna', 'fila')
+REFS = [('/1.0-A', '1', '0', 'A', 1.0, 2.0, 3.0, 4.0, 1, 0, 10)]
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    for text in ['Ver /1.0-A', 'Ver /1.0-A', 'Ver /2.3-B y /1.0-A']:
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 100), text, fontsize=11)
+    path = str(tmp_path / 'plano.pdf')
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_content_hash_depends_only_on_content(pdf_path):
+    doc = fitz.open(pdf_path)
+    hashes = [page_content_hash(doc, page) for page in doc]
+    doc.close()
+
+    assert hashes[0] == hashes[1]
+    assert hashes[2] != hashes[0]
+
+
+def test_lookup_needs_the_whole_key(tmp_path):
+    cache = DetectionCache(str(tmp_path / 'cache.sqlite'))
+    cache.store_many([('h1', REFS)], PATTERN, GROUPS)
+
+    assert cache.lookup('h1', PATTERN, GROUPS) == REFS
+    assert cache.lookup('h2', PATTERN, GROUPS) is None
+    assert cache.lookup('h1', PATTERN + '?', GROUPS) is None
+    assert cache.lookup('h1', PATTERN, ('página', 'fila', 'columna')) is None
+    cache.close()
+
+
+def test_other_version_is_discarded(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = DetectionCache(path)
+    cache.store_many([('h1', REFS)], PATTERN, GROUPS)
+    cache.close()
+
+    monkeypatch.setattr(detection_cache, 'CACHE_VERSION', detection_cache.CACHE_VERSION + 1)
+    cache = DetectionCache(path)
+    assert cache.lookup('h1', PATTERN, GROUPS) is None
+    assert cache.conn.execute('PRAGMA user_version').fetchone()[0] == detection_cache.CACHE_VERSION
+    cache.close()
+
+
+def test_unchanged_pages_come_from_the_cache(pdf_path, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'cache.sqlite')
+    page_counts = {pdf_path: 3}
+    first = list(iter_page_references(page_counts, PATTERN, GROUPS, workers=1, cache_path=cache_path))
+
+    def fail(*args, **kwargs):
+        raise AssertionError('página analizada de nuevo')
+
+    monkeypatch.setattr(detection_engine, 'scan_page_references', fail)
+    second = list(iter_page_references(page_counts, PATTERN, GROUPS, workers=1, cache_path=cache_path))
+
+    assert second == first
+    assert [len(refs) for _, _, refs in first] == [1, 1, 2]
@@ -0,0 +1,82 @@
+"""Pruebas del motor de detección"""
+import fitz
+import pytest
+
+from detection_engine import build_page_char_map, match_rect, pages_with_matches, scan_page_references
+from pattern_compiler import compile_reference_pattern
+
+
+PATTERN = r'/\s*(\d+)[.\s]+(\d+|[A-Za-z]+)\s*[-/]\s*([A-Za-z0-9]+)'
+
+
+@pytest.fixture
+def page():
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 100), 'Motor M1 /1.0-A', fontsize=11)
+    page.insert_text((300, 400), 'Ver /12.3-B y /1.0-A', fontsize=11)
+    yield page
+    doc.close()
+
+
+def test_char_map_matches_plain_text(page):
+    text, boxes = build_page_char_map(page)
+
+    assert text == page.get_text()
+    assert len(boxes) == len(text)
+    # Los saltos de línea añadidos no tienen caja
+    assert all((box is None) == (char == '\n') for char, box in zip(text, boxes))
+
+
+def test_match_rect_covers_match_offsets(page):
+    text, boxes = build_page_char_map(page)
+
+    start = text.index('/12.3-B')
+    rect = match_rect(boxes, start, start + len('/12.3-B'))
+
+    expected = page.search_for('/12.3-B')[0]
+    assert rect == pytest.approx([expected.x0, expected.y0, expected.x1, expected.y1], abs=0.5)
+    # Solo las cajas de los caracteres de la coincidencia
+    assert rect[0] >= 300 and rect[3] <= 410
+
+
+def test_match_rect_without_boxes():
+    assert match_rect([None, None], 0, 2) is None
+    assert match_rect([(1, 2, 3, 4)], 1, 1) is None
+
+
+def test_scan_page_references_offsets_and_instances(page):
+    text, _ = build_page_char_map(page)
+    refs = scan_page_references(page, PATTERN, ('página', 'columna', 'fila'))
+
+    # (full, page, column, row, x0, y0, x1, y1, instance, context_start, context_end)
+    assert [ref[:4] + ref[8:9] for ref in refs] == [
+        ('/1.0-A', '1', '0', 'A', 1),
+        ('/12.3-B', '12', '3', 'B', 1),
+        ('/1.0-A', '1', '0', 'A', 2),
+    ]
+    first, second = page.search_for('/1.0-A')
+    for ref, expected in zip([refs[0], refs[2]], [first, second]):
+        assert list(ref[4:8]) == pytest.approx([expected.x0, expected.y0, expected.x1, expected.y1], abs=0.5)
+    # El contexto son desplazamientos en el texto de la página
+    context_start, context_end = refs[1][9:11]
+    assert '/12.3-B' in text[context_start:context_end]
+
+
+def test_pages_with_matches_maps_each_match_to_its_page():
+    pattern = compile_reference_pattern(PATTERN)
+    texts = ['sin nada', '/1.0-A', '', 'x /2.3-B y /4.5-C', 'sin nada', 'fin /6.7-D']
+
+    assert pages_with_matches(pattern, texts, ('página', 'columna', 'fila')) == {1, 3, 5}
+    assert pages_with_matches(pattern, []) == set()
+
+
+def test_pages_with_matches_across_the_separator():
+    # [\s\S] atraviesa el separador: la coincidencia de la búsqueda conjunta
+    # empieza en una página y acaba en otra, y se comprueban por separado
+    pattern = compile_reference_pattern(r'(A)[\s\S]*?(B)')
+    texts = ['A', 'xx', 'AB', 'B', 'A y B']
+
+    assert pages_with_matches(pattern, texts) == {2, 4}
+    assert pages_with_matches(pattern, texts) == {index for index, text in enumerate(texts)
+                                                  if pattern.has_match(text)}
@@ -0,0 +1,73 @@
+"""Pruebas del modelo de la cuadrícula de destino"""
+import numpy as np
+import pytest
+
+from grid_model import DEFAULT_GRID, GridModel, grid_settings_from_config
+
+
+GRIDS = {
+    'manual': dict(DEFAULT_GRID, cols=12, rows=9, margin_left=3, margin_top=7, col_sizes='1,2,1.5'),
+    'exacta': dict(DEFAULT_GRID, column_positions=[20, 80.5, 140, 200, 260, 300],
+                   row_positions=[30, 90, 150, 210, 300]),
+    'etiquetas': dict(DEFAULT_GRID, column_positions=[20, 80, 140, 200], row_positions=[30, 90, 150],
+                      column_labels=['1', '2', '3'], row_labels=['A', 'B']),
+}
+
+PAGES = [(595.0, 842.0), (842.0, 595.0), (1190.5, 841.9)]
+
+# Nombres dentro y fuera de rango (se recortan al último cuadrante)
+COLUMNS = ['0', '1', '2', '3', '7', '11', '40']
+ROWS = ['A', 'B', 'C', 'H', 'Z', 'AB']
+
+
+def test_cell_rect_of_manual_and_exact_grids():
+    # 10 x 8 cuadrantes entre márgenes del 5 %: 90 x 90 puntos en una página de 1000 x 800
+    manual = GridModel(DEFAULT_GRID)
+    assert manual.cell_rect(1000, 800, '0', 'A') == pytest.approx([50, 40, 140, 130])
+    assert manual.cell_rect(1000, 800, '2', 'B') == pytest.approx([230, 130, 320, 220])
+    assert manual.cell_rect(1000, 800, '9', 'H') == pytest.approx([860, 670, 950, 760])
+
+    exact = GridModel(GRIDS['exacta'])
+    assert exact.cell_rect(595, 842, '1', 'B') == pytest.approx([80.5, 90, 140, 150])
+
+
+def test_cell_rect_uses_frame_labels():
+    # Columnas numeradas desde 1 en el marco: '1' es el primer cuadrante
+    grid = GridModel(GRIDS['etiquetas'])
+    assert grid.cell_rect(595, 842, '1', 'A') == [20, 30, 80, 90]
+    assert grid.cell_rect(595, 842, '3', 'B') == [140, 90, 200, 150]
+
+
+@pytest.mark.parametrize('name', GRIDS)
+def test_cell_rects_match_cell_rect(name):
+    grid = GridModel(GRIDS[name])
+    cells = [(width, height, column, row)
+             for width, height in PAGES for column in COLUMNS for row in ROWS]
+    widths, heights, columns, rows = zip(*cells)
+
+    rects = grid.cell_rects(widths, heights, columns, rows)
+
+    assert rects.shape == (len(cells), 4)
+    for rect, cell in zip(rects, cells):
+        assert rect.tolist() == pytest.approx(grid.cell_rect(*cell))
+
+
+@pytest.mark.parametrize('name', GRIDS)
+def test_cell_rect_stays_inside_page(name):
+    grid = GridModel(GRIDS[name])
+    for width, height in PAGES:
+        for column in COLUMNS:
+            for row in ROWS:
+                x0, y0, x1, y1 = grid.cell_rect(width, height, column, row)
+                assert 0 <= x0 <= x1 <= width
+                assert 0 <= y0 <= y1 <= height
+
+
+def test_cell_rects_empty():
+    rects = GridModel(GRIDS['manual']).cell_rects([], [], [], [])
+    assert np.asarray(rects).reshape(-1, 4).shape == (0, 4)
+
+
+def test_config_needs_two_lines_of_each_kind():
+    assert not GridModel(grid_settings_from_config({'column_lines': [10, 20], 'row_lines': [5]})).exact
+    assert GridModel(grid_settings_from_config({'column_lines': [10, 20], 'row_lines': [5, 9]})).exact
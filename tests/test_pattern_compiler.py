@@ -0,0 +1,60 @@
+"""Pruebas de la búsqueda de varios estilos de referencia en una pasada"""
+import pytest
+
+from pattern_compiler import MultiReferencePattern, compile_reference_styles
+from reference_patterns import REFERENCE_PATTERNS
+
+
+def styles(*names):
+    return [(name, REFERENCE_PATTERNS[name]['pattern'], REFERENCE_PATTERNS[name]['groups'])
+            for name in names]
+
+
+ALL_STYLES = styles('Estilo /1.0-A', 'Estilo 25-A.0', 'Estilo A1/25')
+
+
+def separate(multi):
+    """El mismo patrón buscando cada estilo por separado (como si no se pudieran unir)"""
+    multi.regex = None
+    return multi
+
+
+@pytest.fixture(params=['alternancia', 'por separado'])
+def search(request):
+    def search(style_list, text):
+        multi = MultiReferencePattern(style_list)
+        if request.param == 'por separado':
+            separate(multi)
+        return [(text[start:end], page, column, row)
+                for start, end, page, column, row in multi.iter_references(text)]
+    return search
+
+
+def test_earlier_style_wins_over_overlapping_leftmost_match(search):
+    assert search(ALL_STYLES, 'Motor M0 /1.0-B') == [('/1.0-B', '1', '0', 'B')]
+
+
+def test_each_style_keeps_its_group_order(search):
+    text = 'ver /3.4-C, 12-D.5 y B5/10'
+    assert search(ALL_STYLES, text) == [
+        ('/3.4-C', '3', '4', 'C'),
+        ('12-D.5', '12', '5', 'D'),
+        ('B5/10', '10', '5', 'B'),
+    ]
+
+
+def test_longest_match_wins_at_same_position(search):
+    short = ('corto', r'(\d+)-(\d+)', ('página', 'columna'))
+    long = ('largo', r'(\d+)-(\d+)-([A-Z])', ('página', 'columna', 'fila'))
+    assert search([short, long], '4-2-C') == [('4-2-C', '4', '2', 'C')]
+    assert search([short, long], '4-2 C') == [('4-2', '4', '2', '')]
+
+
+def test_later_style_keeps_match_without_overlap(search):
+    assert search(ALL_STYLES, 'M0/1, /2.3-A') == [('M0/1', '1', '0', 'M'), ('/2.3-A', '2', '3', 'A')]
+
+
+def test_single_style_compiles_to_plain_pattern():
+    pattern, groups_order = compile_reference_styles(styles('Estilo /1.0-A'))
+    assert not isinstance(pattern, MultiReferencePattern)
+    assert groups_order == ('página', 'columna', 'fila')
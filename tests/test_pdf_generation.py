@@ -0,0 +1,220 @@
+"""Pruebas de la escritura de enlaces en los PDFs interactivos"""
+import re
+
+import fitz
+import pytest
+
+from grid_model import DEFAULT_GRID, GridModel
+from pdf_generation import (BACKEND_INCREMENTAL, BACKEND_REWRITE, LINK_ACTION, LINK_HIGHLIGHT, LINK_LAYOUT_COMPACT,
+                            add_links_incremental, compact_targets, document_javascript, generate_interactive_pdf,
+                            generated_links, get_annots_array, iter_restyle_pdfs, restyle_interactive_pdf,
+                            retarget_interactive_pdf, split_pdf_array)
+
+
+JAVASCRIPT = 'function highlight(page, rect) {}'
+RESTYLED_JAVASCRIPT = 'function highlight(page, rect) { /* rojo */ }'
+REFERENCES = [('/2.1-A', '2', '1', 'A', 0, 72.0, 97.0, 130.0, 112.0)]
+# Otra cuadrícula: el mismo cuadrante 1-A queda en otro sitio
+EDITED_GRID = dict(DEFAULT_GRID, cols=4, rows=3, margin_left=10, margin_top=2)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    for text in ['Ver /2.1-A', 'Destino']:
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 100), text, fontsize=11)
+    # Un enlace previo que se debe conservar
+    doc[0].insert_link({'kind': fitz.LINK_URI, 'from': fitz.Rect(10, 10, 50, 30), 'uri': 'https://example.com'})
+    path = str(tmp_path / 'plano.pdf')
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def link_targets(path):
+    """(rectángulo, página de destino, punto de destino, argumentos de highlight) de los enlaces generados"""
+    doc = fitz.open(path)
+    try:
+        highlights = [re.findall(r'-?\d+(?:\.\d+)?', LINK_HIGHLIGHT.search(annotation).group(0))
+                      for _, annotation in generated_links(doc, doc.page_xref(0))]
+        goto = [link for link in doc[0].get_links() if link['kind'] == fitz.LINK_GOTO]
+        return [(tuple(round(value) for value in link['from']), link['page'], tuple(link['to']), highlight)
+                for link, highlight in zip(goto, highlights)]
+    finally:
+        doc.close()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_add_links_incremental_writes_goto_and_highlight(pdf_path):
+    doc = fitz.open(pdf_path)
+    links = [{'full': '/2.1-A', 'pdf_page': 0, 'coordinates': [72, 730, 130, 745],
+              'target_page': 1, 'target_coordinates': [100.0, 600.0, 200.0, 700.0]}]
+    add_links_incremental(doc, links, JAVASCRIPT)
+
+    annots = doc.xref_get_key(doc.page_xref(0), 'Annots')[1]
+    annot_xrefs = [int(ref) for ref in annots.strip('[]').split()[::3]]
+    assert len(annot_xrefs) == 2
+    link_xref = annot_xrefs[-1]
+    assert doc.xref_get_key(link_xref, 'Rect')[1] == '[72 730 130 745]'
+    assert doc.xref_get_key(link_xref, 'A/D')[1] == f'[{doc.page_xref(1)} 0 R/XYZ 100 700 0]'
+    assert doc.xref_get_key(link_xref, 'A/Next/JS')[1] == 'highlight(1, [100.0, 600.0, 200.0, 700.0]);'
+    assert document_javascript(doc) == [JAVASCRIPT]
+    doc.close()
+
+
+def test_generation_appends_an_incremental_update(pdf_path, tmp_path):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+
+    links = generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID))
+
+    assert links == 1
+    with open(pdf_path, 'rb') as f:
+        original = f.read()
+    with open(output_path, 'rb') as f:
+        generated = f.read()
+    # El archivo original queda intacto al principio de la copia
+    assert generated.startswith(original) and len(generated) > len(original)
+
+    doc = fitz.open(output_path)
+    goto = [link for link in doc[0].get_links() if link['kind'] == fitz.LINK_GOTO]
+    assert [link['page'] for link in goto] == [1]
+    assert any(link['kind'] == fitz.LINK_URI for link in doc[0].get_links())
+    doc.close()
+
+
+@pytest.mark.parametrize('backend', [BACKEND_INCREMENTAL, BACKEND_REWRITE])
+def test_retarget_matches_generating_with_the_new_grid(pdf_path, tmp_path, backend):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    expected_path = str(tmp_path / 'esperado.pdf')
+    generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID), backend)
+    generate_interactive_pdf(pdf_path, expected_path, REFERENCES, JAVASCRIPT, GridModel(EDITED_GRID), backend)
+    before = link_targets(output_path)
+    with open(output_path, 'rb') as f:
+        generated = f.read()
+
+    links = retarget_interactive_pdf(output_path, REFERENCES, GridModel(EDITED_GRID))
+
+    assert links == 1
+    after = link_targets(output_path)
+    assert after == link_targets(expected_path)
+    assert after != before
+    # Mismo rectángulo de origen; los cambios se añaden al final del archivo
+    assert after[0][0] == before[0][0]
+    with open(output_path, 'rb') as f:
+        assert f.read().startswith(generated)
+    doc = fitz.open(output_path)
+    assert any(link['kind'] == fitz.LINK_URI for link in doc[0].get_links())
+    doc.close()
+
+
+def test_retarget_rejects_links_of_other_references(pdf_path, tmp_path):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID))
+    moved = [REFERENCES[0][:5] + (300.0, 97.0, 358.0, 112.0)]
+
+    with pytest.raises(ValueError):
+        retarget_interactive_pdf(output_path, moved, GridModel(EDITED_GRID))
+
+
+@pytest.mark.parametrize('backend', [BACKEND_INCREMENTAL, BACKEND_REWRITE])
+def test_restyle_swaps_only_the_document_script(pdf_path, tmp_path, backend):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID), backend)
+    links = link_targets(output_path)
+    generated = read(output_path)
+
+    assert restyle_interactive_pdf(output_path, RESTYLED_JAVASCRIPT)
+
+    doc = fitz.open(output_path)
+    assert document_javascript(doc) == [RESTYLED_JAVASCRIPT]
+    doc.close()
+    assert link_targets(output_path) == links
+    assert read(output_path).startswith(generated)
+
+
+def test_restyle_with_the_same_style_leaves_the_file(pdf_path, tmp_path):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID))
+    generated = read(output_path)
+
+    assert restyle_interactive_pdf(output_path, JAVASCRIPT)
+    assert read(output_path) == generated
+
+
+def test_restyle_skips_pdfs_that_are_not_interactive(pdf_path, tmp_path):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    generate_interactive_pdf(pdf_path, output_path, REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID))
+    original = read(pdf_path)
+
+    results = {result['pdf']: result
+               for result in iter_restyle_pdfs([pdf_path, output_path], RESTYLED_JAVASCRIPT, workers=1)}
+
+    assert results[pdf_path]['skipped'] and results[pdf_path]['output'] is None
+    assert read(pdf_path) == original
+    assert not results[output_path]['skipped'] and results[output_path]['output'] == output_path
+
+
+# Tres enlaces a dos cuadrantes distintos de la página 2
+COMPACT_REFERENCES = [
+    ('/2.1-A', '2', '1', 'A', 0, 72.0, 97.0, 130.0, 112.0),
+    ('/2.3-B', '2', '3', 'B', 0, 72.0, 197.0, 130.0, 212.0),
+    ('/2.1-A', '2', '1', 'A', 0, 72.0, 297.0, 130.0, 312.0),
+]
+
+
+def compact_state(path):
+    """(tabla de destinos, [(rectángulo, página de destino, punto de destino)], acciones de cada enlace)"""
+    doc = fitz.open(path)
+    try:
+        codes = document_javascript(doc)
+        goto = [(tuple(round(value) for value in link['from']), link['page'], tuple(link['to']))
+                for link in doc[0].get_links() if link['kind'] == fitz.LINK_GOTO]
+        # Las anotaciones de PyPDF2 van directas en /Annots
+        annotations = [item if item.startswith('<<') else doc.xref_object(int(item.split()[0]), compressed=True)
+                       for item in split_pdf_array(get_annots_array(doc, doc.page_xref(0)))]
+        actions = [int(action.group(1)) for action in map(LINK_ACTION.search, annotations) if action]
+        return codes[1:], goto, actions
+    finally:
+        doc.close()
+
+
+def test_compact_targets_share_equal_cells():
+    links = [{'target_page': 1, 'column': '1', 'row': 'A', 'target_coordinates': [1, 2, 3, 4]},
+             {'target_page': 1, 'column': '3', 'row': 'B', 'target_coordinates': [5, 6, 7, 8]},
+             {'target_page': 1, 'column': '1', 'row': 'A', 'target_coordinates': [1, 2, 3, 4]}]
+
+    assert compact_targets(links) == ([0, 1, 0], [(1, [1, 2, 3, 4]), (1, [5, 6, 7, 8])])
+
+
+@pytest.mark.parametrize('backend', [BACKEND_INCREMENTAL, BACKEND_REWRITE])
+def test_compact_generate_retarget_and_restyle(pdf_path, tmp_path, backend):
+    output_path = str(tmp_path / 'plano_interactivo.pdf')
+    expected_path = str(tmp_path / 'esperado.pdf')
+    generate_interactive_pdf(pdf_path, output_path, COMPACT_REFERENCES, JAVASCRIPT, GridModel(DEFAULT_GRID),
+                             backend, layout=LINK_LAYOUT_COMPACT)
+    generate_interactive_pdf(pdf_path, expected_path, COMPACT_REFERENCES, JAVASCRIPT, GridModel(EDITED_GRID),
+                             backend, layout=LINK_LAYOUT_COMPACT)
+
+    # Un destino por cuadrante en la tabla y una acción compartida por destino
+    targets, goto, actions = compact_state(output_path)
+    assert len(targets) == 1 and targets[0].count('[1,') == 2
+    assert [page for _, page, _ in goto] == [1, 1, 1]
+    assert actions[0] == actions[2] != actions[1]
+
+    assert retarget_interactive_pdf(output_path, COMPACT_REFERENCES, GridModel(EDITED_GRID)) == 3
+    retargeted = compact_state(output_path)
+    assert retargeted[:2] == compact_state(expected_path)[:2]
+    assert retargeted[0] != targets
+    assert [rect for rect, _, _ in retargeted[1]] == [rect for rect, _, _ in goto]
+
+    # El cambio de estilo conserva la tabla de destinos
+    assert restyle_interactive_pdf(output_path, RESTYLED_JAVASCRIPT)
+    doc = fitz.open(output_path)
+    assert document_javascript(doc) == [RESTYLED_JAVASCRIPT] + retargeted[0]
+    doc.close()
+    assert compact_state(output_path)[1] == retargeted[1]
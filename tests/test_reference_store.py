@@ -0,0 +1,75 @@
+"""Pruebas del almacén de referencias por columnas"""
+from collections import Counter
+
+import pytest
+
+from reference_store import ReferenceStore
+
+
+def page_rows(*pages, x=0.0):
+    """Filas de página como las del motor de detección para referencias /página.columna-fila"""
+    return [(f'/{page}.{column}-{row}', str(page), str(column), row, x, 1.0, x + 10.0, 11.0, 1, 0, 0)
+            for page, column, row in pages]
+
+
+def build():
+    store = ReferenceStore()
+    store.add_page('a.pdf', 0, page_rows((1, 0, 'A'), (2, 3, 'B')))
+    store.add_page('a.pdf', 1, page_rows((1, 0, 'A')))
+    store.add_page('b.pdf', 0, page_rows((5, 1, 'C'), x=50.0))
+    store.add_page('c.pdf', 2, page_rows((7, 2, 'D'), (1, 0, 'A'), x=80.0))
+    return store
+
+
+def test_pdfs_occupy_contiguous_rows():
+    store = build()
+    assert len(store) == 6
+    assert store.detected_pdfs() == ['a.pdf', 'b.pdf', 'c.pdf']
+    assert [store.rows_for_pdf(path) for path in store.detected_pdfs()] == [range(0, 3), range(3, 4), range(4, 6)]
+    assert store.link_sources('b.pdf') == [('/5.1-C', '5', '1', 'C', 0, 50.0, 1.0, 60.0, 11.0)]
+    assert store.full_counts['/1.0-A'] == 3
+
+
+def test_remove_pdf_shifts_later_pdfs():
+    store = build()
+    c_sources = store.link_sources('c.pdf')
+    store.mark_detected('a.pdf', 'clave')
+
+    store.remove_pdf('a.pdf')
+
+    assert len(store) == 3
+    assert store.detected_pdfs() == ['b.pdf', 'c.pdf']
+    assert store.rows_for_pdf('a.pdf') == range(0)
+    assert store.rows_for_pdf('c.pdf') == range(1, 3)
+    assert store.link_sources('c.pdf') == c_sources
+    assert [store.pdf_name_of(index) for index in range(len(store))] == ['b.pdf', 'c.pdf', 'c.pdf']
+    assert store.coordinates(1) == [80.0, 1.0, 90.0, 11.0]
+    assert store.full_counts == Counter({'/5.1-C': 1, '/7.2-D': 1, '/1.0-A': 1})
+    assert store.page_counts == Counter({'5': 1, '7': 1, '1': 1})
+    assert not store.is_current('a.pdf', 'clave')
+
+
+def test_removed_pdf_can_be_added_again_at_the_end():
+    store = build()
+    store.remove_pdf('b.pdf')
+    store.add_page('b.pdf', 0, page_rows((9, 9, 'Z')))
+
+    assert store.detected_pdfs() == ['a.pdf', 'c.pdf', 'b.pdf']
+    assert store.rows_for_pdf('b.pdf') == range(5, 6)
+    assert store.link_sources('b.pdf')[0][0] == '/9.9-Z'
+
+
+def test_remove_unknown_or_empty_pdf():
+    store = build()
+    store.remove_pdf('otro.pdf')
+    store.add_pdf('vacio.pdf')
+    store.remove_pdf('vacio.pdf')
+    store.remove_pdf('vacio.pdf')
+    assert len(store) == 6
+    assert store.detected_pdfs() == ['a.pdf', 'b.pdf', 'c.pdf']
+
+
+def test_pages_of_a_pdf_must_be_added_together():
+    store = build()
+    with pytest.raises(ValueError):
+        store.add_page('a.pdf', 5, page_rows((3, 3, 'C')))
@@ -0,0 +1,104 @@
+"""Pruebas del modelo de la tabla de referencias y de su proxy de ordenación"""
+import pytest
+
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QAbstractItemModelTester
+
+from main import ReferenceSortProxyModel, ReferenceTableModel
+from reference_store import ReferenceStore
+
+
+@pytest.fixture(scope='module', autouse=True)
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def page_rows(*pages):
+    """Filas de página como las del motor de detección para referencias /página.columna-fila"""
+    return [(f'/{page}.{column}-{row}', str(page), str(column), row, 0.0, 0.0, 10.0, 10.0, 1, 0, 0)
+            for page, column, row in pages]
+
+
+def build(show_pdf=False):
+    model = ReferenceTableModel(ReferenceStore())
+    model.refresh(show_pdf)
+    proxy = ReferenceSortProxyModel()
+    proxy.setSourceModel(model)
+    tester = QAbstractItemModelTester(proxy, QAbstractItemModelTester.FailureReportingMode.Fatal)
+    return model, proxy, tester
+
+
+def column_values(proxy, column):
+    return [proxy.index(row, column).data() for row in range(proxy.rowCount())]
+
+
+def test_unsorted_proxy_reports_added_rows():
+    model, proxy, _ = build()
+    inserted = []
+    proxy.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    model.add_page('a.pdf', 0, page_rows((3, 1, 'A'), (1, 2, 'B')))
+    model.add_page('a.pdf', 1, page_rows((2, 4, 'C')))
+
+    assert inserted == [(0, 1), (2, 2)]
+    assert proxy.rowCount() == 3
+    assert column_values(proxy, 0) == ['/3.1-A', '/1.2-B', '/2.4-C']
+
+
+def test_unsorted_proxy_reports_removed_rows():
+    model, proxy, _ = build()
+    model.add_page('a.pdf', 0, page_rows((3, 1, 'A')))
+    model.add_page('b.pdf', 0, page_rows((1, 2, 'B'), (2, 4, 'C')))
+    removed = []
+    proxy.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    model.remove_pdf('a.pdf')
+
+    assert removed == [(0, 0)]
+    assert column_values(proxy, 0) == ['/1.2-B', '/2.4-C']
+
+
+def test_sorted_proxy_follows_added_and_removed_pdfs():
+    model, proxy, _ = build()
+    page_column = ReferenceTableModel.FIELDS.index('page')
+    model.add_page('a.pdf', 0, page_rows((12, 1, 'A'), (3, 2, 'B')))
+    proxy.sort(page_column, Qt.AscendingOrder)
+    assert column_values(proxy, page_column) == ['3', '12']
+
+    model.add_page('b.pdf', 0, page_rows((7, 1, 'A'), (1, 1, 'A'), (20, 3, 'C')))
+    assert column_values(proxy, page_column) == ['1', '3', '7', '12', '20']
+
+    model.remove_pdf('a.pdf')
+    assert column_values(proxy, page_column) == ['1', '7', '20']
+    assert [proxy.mapToSource(proxy.index(row, 0)).row() for row in range(proxy.rowCount())] == [1, 0, 2]
+
+    model.remove_pdf('b.pdf')
+    assert proxy.rowCount() == 0
+
+
+def test_descending_sort_maps_both_ways():
+    model, proxy, _ = build(show_pdf=True)
+    model.add_page('a.pdf', 0, page_rows((2, 1, 'A'), (5, 1, 'A'), (1, 1, 'A')))
+    page_column = 1 + ReferenceTableModel.FIELDS.index('page')
+    proxy.sort(page_column, Qt.DescendingOrder)
+
+    assert column_values(proxy, page_column) == ['5', '2', '1']
+    for row in range(proxy.rowCount()):
+        source = proxy.mapToSource(proxy.index(row, 0))
+        assert proxy.mapFromSource(source).row() == row
+
+
+def test_hidden_contexts_do_not_read_the_page(monkeypatch):
+    model, proxy, _ = build()
+    model.add_page('a.pdf', 0, page_rows((3, 1, 'A'), (1, 2, 'B')))
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append((first.row(), last.row(), first.column())))
+
+    def fail(self, index):
+        raise AssertionError('contexto leído con PyMuPDF')
+    monkeypatch.setattr(ReferenceStore, 'context', fail)
+    model.set_show_contexts(False)
+
+    assert changed == [(0, 1, 4)]
+    assert column_values(proxy, 4) == ['[Pág PDF: 1]', '[Pág PDF: 1]']
@@ -0,0 +1,77 @@
+"""Pruebas del tiempo límite de los patrones regex personalizados"""
+import time
+
+import pytest
+
+from pattern_compiler import compile_reference_pattern
+from regex_guard import (GuardedReferencePattern, PatternTimeout, RegexGuard, _guards, close_guards,
+                         preflight_pattern, preflight_warning, stress_texts)
+
+
+PATTERN = r'/(\d+)\.(\d+)-([A-Z])'
+GROUPS = ['página', 'columna', 'fila']
+# Retroceso catastrófico: 2^n formas de repartir las 'a' antes de fallar en el '!'
+CATASTROPHIC = r'(a+)+$'
+BUDGET = 0.5
+
+
+def test_guard_returns_references():
+    guard = RegexGuard(compile_reference_pattern(PATTERN), BUDGET)
+    try:
+        assert guard.run('Ver /12.3-B y /1.0-A', GROUPS) == [(4, 11, '12', '3', 'B'), (14, 20, '1', '0', 'A')]
+    finally:
+        guard.close()
+    assert guard.process is None
+
+
+def test_catastrophic_pattern_times_out_and_is_killed():
+    guard = RegexGuard(compile_reference_pattern(CATASTROPHIC), BUDGET)
+    try:
+        guard.start()
+        process = guard.process
+        start = time.perf_counter()
+        with pytest.raises(PatternTimeout):
+            guard.run('a' * 40 + '!', ['página'])
+        assert time.perf_counter() - start < BUDGET + 5
+        assert not process.is_alive()
+        assert guard.process is None
+
+        # La página siguiente arranca un proceso nuevo
+        assert guard.run('aaa', ['página']) == [(0, 3, 'aaa', '', '')]
+    finally:
+        guard.close()
+
+
+def test_guarded_pattern_keeps_one_process_until_closed():
+    pattern = GuardedReferencePattern(PATTERN, BUDGET)
+    try:
+        assert list(pattern.iter_references('Ver /2.1-A', GROUPS)) == [(4, 10, '2', '1', 'A')]
+        process = _guards[(PATTERN, BUDGET)].process
+        assert list(pattern.iter_references('Ver /3.4-C', GROUPS)) == [(4, 10, '3', '4', 'C')]
+        assert _guards[(PATTERN, BUDGET)].process is process
+        # Sin los literales del patrón no se consulta al proceso vigilado
+        assert list(pattern.iter_references('sin referencias', GROUPS)) == []
+    finally:
+        close_guards()
+    assert not _guards
+    assert not process.is_alive()
+
+
+def test_preflight_detects_catastrophic_pattern():
+    result = preflight_pattern(CATASTROPHIC, ['página'], stress_texts(CATASTROPHIC), BUDGET)
+
+    assert result == (BUDGET, 0, True)
+    warning = preflight_warning(result, [], BUDGET)
+    assert 'superó el tiempo límite' in warning
+    assert 'texto de prueba repetitivo' in warning
+
+
+def test_preflight_accepts_fast_pattern():
+    samples = [('plano.pdf', 0, 'Ver /1.0-A')]
+    texts = [sample[2] for sample in samples] + stress_texts(PATTERN)
+
+    slowest, index, timed_out = preflight_pattern(PATTERN, GROUPS, texts, BUDGET)
+
+    assert not timed_out
+    assert slowest < BUDGET
+    assert preflight_warning((slowest, index, timed_out), samples, BUDGET) is None
@@ -0,0 +1,58 @@
+"""Pruebas de las zonas de extracción de texto"""
+import pytest
+
+from text_regions import TextRegions, text_regions_from_config
+
+
+AREA = (0.05, 0.05, 0.95, 0.95)
+
+
+@pytest.mark.parametrize('block, expected', [
+    # Franja inferior de todo el ancho: se recorta el área por arriba del cajetín
+    ((0.0, 0.8, 1.0, 1.0), (0.05, 0.05, 0.95, 0.8)),
+    # Franja superior
+    ((0.0, 0.0, 1.0, 0.2), (0.05, 0.2, 0.95, 0.95)),
+    # Franja derecha de todo el alto
+    ((0.7, 0.0, 1.0, 1.0), (0.05, 0.05, 0.7, 0.95)),
+    # Franja izquierda
+    ((0.0, 0.0, 0.3, 1.0), (0.3, 0.05, 0.95, 0.95)),
+])
+def test_full_width_or_height_block_cuts_area(block, expected):
+    assert TextRegions.cut_title_block(AREA, block) == (expected, None)
+
+
+@pytest.mark.parametrize('block', [
+    (0.0, 0.0, 1.0, 0.04),     # encima del área
+    (0.96, 0.0, 1.0, 1.0),     # a la derecha
+    (0.0, 0.95, 1.0, 1.0),     # tocando el borde inferior por fuera
+])
+def test_block_outside_area_is_ignored(block):
+    assert TextRegions.cut_title_block(AREA, block) == (AREA, None)
+
+
+@pytest.mark.parametrize('block', [
+    (0.7, 0.8, 1.0, 1.0),      # esquina inferior derecha (el cajetín habitual)
+    (0.3, 0.8, 0.6, 1.0),      # centrado abajo, sin llegar a los lados
+    (0.0, 0.4, 1.0, 0.6),      # franja de todo el ancho en medio del área
+    (0.0, 0.0, 1.0, 1.0),      # cubre toda el área
+])
+def test_partial_block_is_excluded(block):
+    assert TextRegions.cut_title_block(AREA, block) == (AREA, block)
+
+
+def test_regions_cut_or_exclude_title_block():
+    cut = TextRegions({'drawing_area': list(AREA), 'title_block': [0.0, 0.8, 1.0, 1.0]})
+    assert cut.reference_area == (0.05, 0.05, 0.95, 0.8)
+    assert cut.excluded is None
+
+    corner = TextRegions({'drawing_area': list(AREA), 'title_block': [0.7, 0.8, 1.0, 1.0]})
+    assert corner.reference_area == AREA
+    assert corner.excluded == (0.7, 0.8, 1.0, 1.0)
+    assert corner.cache_suffix() != cut.cache_suffix()
+
+
+def test_default_regions_use_whole_page():
+    regions = text_regions_from_config({})
+    assert regions.whole_page
+    assert regions.cache_suffix() == ''
+    assert regions == TextRegions({'title_block': 'no válido'})
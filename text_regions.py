@@ -0,0 +1,155 @@
+"""
+Zonas de la página para la extracción de texto.
+
+Extraer solo la zona necesaria es bastante más rápido en hojas con mucho
+texto (PyMuPDF no construye los caracteres que quedan fuera del recorte) y
+evita coincidencias falsas: las referencias se buscan en el área de dibujo
+sin el cajetín, y las etiquetas de la cuadrícula solo en las franjas del
+borde.
+
+Las zonas se configuran en styles_config.json ('text_regions') como
+fracciones de la página (x0, y0, x1, y1 entre 0 y 1, origen arriba a la
+izquierda), así que sirven para hojas de cualquier tamaño:
+
+    "text_regions": {
+        "drawing_area": [0.03, 0.05, 0.97, 0.9],
+        "title_block": [0.6, 0.9, 1.0, 1.0],
+        "label_strip": 0.1
+    }
+
+Sin configuración se usa la página entera, como antes.
+"""
+import fitz  # PyMuPDF para leer PDFs
+
+
+# Página entera, sin cajetín y franjas del 10 % para las etiquetas
+DEFAULT_TEXT_REGIONS = {
+    'drawing_area': [0.0, 0.0, 1.0, 1.0],
+    'title_block': [],
+    'label_strip': 0.1
+}
+
+
+def parse_fractions(value):
+    """Rectángulo (x0, y0, x1, y1) en fracciones de página, o None si no es válido"""
+    try:
+        x0, y0, x1, y1 = (min(max(float(v), 0.0), 1.0) for v in value)
+    except (TypeError, ValueError):
+        return None
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1, y1)
+
+
+def fraction_rect(page_rect, fractions):
+    """Convierte un rectángulo en fracciones al rectángulo de la página"""
+    x0, y0, x1, y1 = fractions
+    return fitz.Rect(
+        page_rect.x0 + page_rect.width * x0, page_rect.y0 + page_rect.height * y0,
+        page_rect.x0 + page_rect.width * x1, page_rect.y0 + page_rect.height * y1
+    )
+
+
+class TextRegions:
+    """
+    Zonas de extracción de texto (inmutable y serializable para el pool).
+
+    Se compara por su clave, que también forma parte de la clave de la caché
+    de detección: las mismas páginas con otras zonas dan otros resultados.
+    """
+
+    def __init__(self, regions=None):
+        regions = dict(DEFAULT_TEXT_REGIONS, **(regions or {}))
+        self.drawing_area = parse_fractions(regions['drawing_area']) or (0.0, 0.0, 1.0, 1.0)
+        self.title_block = parse_fractions(regions['title_block'])
+        try:
+            self.label_strip = min(max(float(regions['label_strip']), 0.01), 0.5)
+        except (TypeError, ValueError):
+            self.label_strip = DEFAULT_TEXT_REGIONS['label_strip']
+
+        # Si el cajetín ocupa todo el ancho (o alto) del área de dibujo y toca
+        # uno de sus bordes, basta con recortar el área; si no, se descartan
+        # los caracteres que caen dentro de él
+        self.reference_area = self.drawing_area
+        self.excluded = self.title_block
+        if self.title_block:
+            self.reference_area, self.excluded = self.cut_title_block(self.drawing_area, self.title_block)
+
+    @staticmethod
+    def cut_title_block(area, block):
+        """(área sin el cajetín, cajetín que queda por excluir o None)"""
+        ax0, ay0, ax1, ay1 = area
+        bx0, by0, bx1, by1 = block
+        if bx1 <= ax0 or bx0 >= ax1 or by1 <= ay0 or by0 >= ay1:
+            # El cajetín está fuera del área de dibujo
+            return area, None
+        if bx0 <= ax0 and bx1 >= ax1:
+            if by1 >= ay1 and by0 > ay0:
+                return (ax0, ay0, ax1, by0), None
+            if by0 <= ay0 and by1 < ay1:
+                return (ax0, by1, ax1, ay1), None
+        if by0 <= ay0 and by1 >= ay1:
+            if bx1 >= ax1 and bx0 > ax0:
+                return (ax0, ay0, bx0, ay1), None
+            if bx0 <= ax0 and bx1 < ax1:
+                return (bx1, ay0, ax1, ay1), None
+        return area, block
+
+    @property
+    def key(self):
+        return (self.reference_area, self.excluded, self.label_strip)
+
+    @property
+    def whole_page(self):
+        """True si las referencias se buscan en toda la página (sin recorte)"""
+        return self.reference_area == (0.0, 0.0, 1.0, 1.0) and self.excluded is None
+
+    def __eq__(self, other):
+        return isinstance(other, TextRegions) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def cache_suffix(self):
+        """Texto que se añade a la clave de la caché de detección ('' para la página entera)"""
+        if self.whole_page:
+            return ''
+        return '@' + ','.join(f'{value:g}' for value in self.reference_area + (self.excluded or ()))
+
+    def reference_clip(self, page):
+        """Rectángulo de la página donde se buscan referencias (None = página entera)"""
+        if self.reference_area == (0.0, 0.0, 1.0, 1.0):
+            return None
+        return fraction_rect(page.rect, self.reference_area)
+
+    def excluded_rect(self, page):
+        """Cajetín cuyos caracteres se descartan (None si ya lo excluye el recorte)"""
+        if self.excluded is None:
+            return None
+        return fraction_rect(page.rect, self.excluded)
+
+    def label_clips(self, page):
+        """Franjas superior y derecha del borde, donde están las etiquetas de la cuadrícula"""
+        rect = page.rect
+        return [
+            fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * self.label_strip),
+            fitz.Rect(rect.x1 - rect.width * self.label_strip, rect.y0, rect.x1, rect.y1)
+        ]
+
+    def label_words(self, page):
+        """Palabras de las franjas del borde (sin repetir las de la esquina común)"""
+        words = []
+        seen = set()
+        for clip in self.label_clips(page):
+            for word in page.get_text('words', clip=clip, flags=fitz.TEXTFLAGS_WORDS):
+                key = tuple(word[:5])
+                if key not in seen:
+                    seen.add(key)
+                    words.append(word)
+        return words
+
+
+def text_regions_from_config(config_data):
+    """Zonas de extracción a partir de styles_config.json"""
+    regions = config_data.get('text_regions')
+    return TextRegions(regions if isinstance(regions, dict) else None)